@@ -0,0 +1,137 @@
+"""Semantic cache of /chat answers, matched on question embeddings."""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+
+class _Entry:
+    __slots__ = ("entry_id", "question", "scope", "vector", "answer", "created_at", "hits", "last_hit_at")
+
+    def __init__(self, question: str, scope: tuple, vector: np.ndarray, answer: str):
+        self.entry_id = uuid.uuid4().hex
+        self.question = question
+        self.scope = scope
+        self.vector = vector
+        self.answer = answer
+        self.created_at = time.time()
+        self.hits = 0
+        self.last_hit_at: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.entry_id,
+            "question": self.question,
+            "hits": self.hits,
+            "created_at": self.created_at,
+            "last_hit_at": self.last_hit_at,
+        }
+
+
+class SemanticAnswerCache:
+    """
+    LRU cache of answers looked up by cosine similarity of the question.
+
+    A lookup returns the stored answer of the most similar cached question
+    if their similarity is at least `threshold`. Entries belong to a
+    scope (e.g. vector store version, prompt hash and top_k): only
+    questions asked under the same scope can match, so re-ingesting the
+    guidelines or changing the prompt misses automatically and stale
+    entries age out.
+
+    Args:
+        maxsize: Entries kept; the least recently used is evicted first.
+        threshold: Minimum cosine similarity for a hit.
+    """
+
+    def __init__(self, maxsize: int = 512, threshold: float = 0.95):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._matrices: dict[tuple, tuple[list[_Entry], np.ndarray]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _normalize(embedding) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else None
+
+    def _matrix(self, scope: tuple):
+        """Stacked vectors of one scope's entries, rebuilt after the scope changes."""
+        cached = self._matrices.get(scope)
+        if cached is None:
+            entries = [e for e in self._entries.values() if e.scope == scope]
+            matrix = np.stack([e.vector for e in entries]) if entries else np.empty((0, 0), np.float32)
+            cached = self._matrices[scope] = (entries, matrix)
+        return cached
+
+    def lookup(self, embedding, scope: tuple) -> Optional[tuple[str, dict]]:
+        """
+        The cached answer closest to `embedding` within `scope`.
+
+        Returns:
+            (answer, entry info with "similarity"), or None on a miss.
+        """
+        vector = self._normalize(embedding)
+        with self._lock:
+            best = None
+            if vector is not None:
+                entries, matrix = self._matrix(scope)
+                if entries and matrix.shape[1] == vector.shape[0]:
+                    scores = matrix @ vector
+                    i = int(np.argmax(scores))
+                    if scores[i] >= self.threshold:
+                        best = entries[i], float(scores[i])
+            if best is None:
+                self.misses += 1
+                return None
+            entry, similarity = best
+            self.hits += 1
+            entry.hits += 1
+            entry.last_hit_at = time.time()
+            self._entries.move_to_end(entry.entry_id)
+            return entry.answer, dict(entry.to_dict(), similarity=similarity)
+
+    def add(self, question: str, embedding, scope: tuple, answer: str):
+        vector = self._normalize(embedding)
+        if vector is None or self.maxsize <= 0:
+            return
+        entry = _Entry(question, scope, vector, answer)
+        with self._lock:
+            self._entries[entry.entry_id] = entry
+            self._matrices.pop(scope, None)
+            while len(self._entries) > self.maxsize:
+                _, evicted = self._entries.popitem(last=False)
+                self._matrices.pop(evicted.scope, None)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrices.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self, top: int = 10) -> dict:
+        """Counters plus the `top` most-hit entries."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            entries = sorted(self._entries.values(), key=lambda e: e.hits, reverse=True)[:top]
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "evictions": self.evictions,
+                "threshold": self.threshold,
+                "top_entries": [e.to_dict() for e in entries if e.hits],
+            }
@@ -1,22 +1,18 @@
 from google.adk.agents import Agent
-from vertexai.agent_engines import AdkApp
-import vertexai
-from app.config import GCP_PROJECT, GCP_REGION
-import os
-from app.tools.nice_guideline_tool import search_nice_ng12_guidelines
+import threading
+from app.tools.nice_guideline_tool import search_nice_ng12_guidelines, search_nice_ng12_guidelines_batch
 from app.tools.patient_data_tool import get_patient_data
+from app.tools.symptom_evidence_tool import get_symptom_evidence
 from app.prompts import load_system_prompt
 from pydantic import BaseModel
-from google.adk.apps.app import App
 from google.adk.plugins.logging_plugin import LoggingPlugin
 from app.vertexai_utils import init_vertexai
+from app.instrumentation import InstrumentationPlugin
 
 
 
 assess_prompt = load_system_prompt("ASSESSMENT_AGENT")
 
-init_vertexai()
-
 class AssessmentResponse(BaseModel):
     patient_id: str
     recommendation: str
@@ -29,12 +25,24 @@ assess_agent=Agent(
     model="gemini-2.5-flash-lite",
     instruction=assess_prompt,
     description="Agent to assess cancer risk based on NICE NG12 guidelines and patient data.",
-    tools=[search_nice_ng12_guidelines, get_patient_data],
+    tools=[get_symptom_evidence, search_nice_ng12_guidelines, search_nice_ng12_guidelines_batch, get_patient_data],
     output_schema=AssessmentResponse
 )
 
 
-assess_app=AdkApp(agent=assess_agent, plugins=[
-    LoggingPlugin()])
-   
+_assess_app = None
+_assess_app_lock = threading.Lock()
+
+
+def get_assess_app():
+    """Return the Vertex `AdkApp` for the assessment agent, initializing Vertex AI on first use."""
+    global _assess_app
+    if _assess_app is None:
+        with _assess_app_lock:
+            if _assess_app is None:
+                init_vertexai()
+                from vertexai.agent_engines import AdkApp  # slow to import
 
+                _assess_app = AdkApp(agent=assess_agent, plugins=[
+                    LoggingPlugin(), InstrumentationPlugin()])
+    return _assess_app
@@ -0,0 +1,83 @@
+"""Cache of finished /assess results, keyed on everything that shapes them."""
+
+import hashlib
+import json
+import logging
+import threading
+
+from app.cache import LRUCache, SQLiteCache
+
+logger = logging.getLogger(__name__)
+
+
+def record_fingerprint(record: dict) -> str:
+    """Content hash of a patient record, independent of key order."""
+    canonical = json.dumps(record, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class AssessmentCache:
+    """
+    TTL- and size-bounded cache of assessment JSON.
+
+    The key combines a content hash of the patient record, the vector
+    store version and a hash of the ASSESSMENT_AGENT prompt, so editing
+    the record, re-ingesting the guidelines or changing the prompt all
+    miss automatically; stale entries simply age out.
+
+    Args:
+        maxsize: Entries kept in memory (LRU eviction).
+        ttl: Seconds an entry stays valid.
+        path: Optional SQLite file so results survive restarts and are
+            shared between workers.
+        disk_maxsize: Rows kept in the SQLite file; the oldest writes are
+            evicted first and expired rows are purged on every write.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float | None = 86400, path=None, disk_maxsize: int = 10000):
+        self.ttl = ttl
+        self._memory = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._disk = SQLiteCache(path, table="assessments", max_rows=disk_maxsize) if path else None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(record: dict, store_version: str | None, prompt_hash: str) -> str:
+        raw = "\x00".join([record_fingerprint(record), store_version or "", prompt_hash])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        value = self._memory.get(key)
+        if value is None and self._disk is not None:
+            blob = self._disk.get(key)
+            if blob is not None:
+                value = blob.decode("utf-8")
+                self._memory.set(key, value)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value: str):
+        self._memory.set(key, value)
+        if self._disk is not None:
+            try:
+                self._disk.set(key, value.encode("utf-8"), ttl=self.ttl)
+            except Exception:
+                logger.warning("Unable to persist assessment to disk cache", exc_info=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "evictions": self._memory.evictions,
+                "disk_enabled": self._disk is not None,
+                "disk_evictions": self._disk.evictions if self._disk is not None else 0,
+            }
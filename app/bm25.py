@@ -0,0 +1,158 @@
+"""BM25 lexical index over the NG12 chunks, persisted next to the vector store."""
+
+import json
+import logging
+import math
+import os
+import re
+from pathlib import Path
+
+from app.text import normalize_text
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Words too common in the guideline to help ranking.
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have if in into is it of on or that the their "
+    "they this to was were which with who".split()
+)
+
+FORMAT_VERSION = 1
+
+
+def tokenize(text: str) -> list[str]:
+    """Lower-case word tokens with British spellings folded (haemoptysis -> hemoptysis)."""
+    return [t for t in _TOKEN_RE.findall(normalize_text(text)) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed set of chunks.
+
+    Postings are kept as term -> [[doc_index, term_frequency], ...], so a
+    query only touches the documents containing its terms. `query` returns
+    the same nested-list layout as `chromadb.Collection.query`, with BM25
+    scores under "scores" instead of distances.
+
+    Args:
+        ids: Chunk ids (the Chroma ids).
+        documents: Chunk texts.
+        metadatas: Chunk metadata dicts.
+        k1: Term-frequency saturation.
+        b: Document-length normalization.
+    """
+
+    def __init__(self, ids, documents, metadatas, k1: float = 1.5, b: float = 0.75):
+        self.ids = list(ids)
+        self.documents = list(documents)
+        self.metadatas = list(metadatas)
+        self.k1 = k1
+        self.b = b
+        self.postings: dict[str, list[list[int]]] = {}
+        self.doc_lengths: list[int] = []
+        for i, document in enumerate(self.documents):
+            counts: dict[str, int] = {}
+            tokens = tokenize(document or "")
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for term, tf in counts.items():
+                self.postings.setdefault(term, []).append([i, tf])
+            self.doc_lengths.append(len(tokens))
+        self._prepare()
+
+    def _prepare(self):
+        n = len(self.doc_lengths)
+        self.avg_length = sum(self.doc_lengths) / n if n else 0.0
+        self.idf = {
+            term: math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_collection(cls, collection) -> "BM25Index":
+        """Build the index from every chunk stored in a Chroma collection."""
+        data = collection.get(include=["documents", "metadatas"])
+        return cls(data["ids"], data["documents"], data["metadatas"])
+
+    def search(self, query: str, n_results: int) -> list[tuple[int, float]]:
+        """Return up to `n_results` (doc_index, score) pairs, best first."""
+        scores: dict[int, float] = {}
+        avg_length = self.avg_length or 1.0
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc, tf in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc] / avg_length)
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:max(0, n_results)]
+
+    def query(self, query_texts, n_results: int, include=("documents", "metadatas")) -> dict:
+        """Chroma-compatible query: returns ids, scores and the requested fields, one list per query."""
+        hits = [self.search(text, n_results) for text in query_texts]
+        results = {
+            "ids": [[self.ids[i] for i, _ in row] for row in hits],
+            "scores": [[score for _, score in row] for row in hits],
+        }
+        if "documents" in include:
+            results["documents"] = [[self.documents[i] for i, _ in row] for row in hits]
+        if "metadatas" in include:
+            results["metadatas"] = [[self.metadatas[i] for i, _ in row] for row in hits]
+        return results
+
+    def save(self, path):
+        """Write the index as JSON, atomically replacing any previous file."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {
+            "version": FORMAT_VERSION,
+            "k1": self.k1,
+            "b": self.b,
+            "ids": self.ids,
+            "documents": self.documents,
+            "metadatas": self.metadatas,
+            "doc_lengths": self.doc_lengths,
+            "postings": self.postings,
+        }
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path) -> "BM25Index":
+        with open(path, encoding="utf-8") as f:
+            payload = json.load(f)
+        if payload.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported BM25 index version in {path}")
+        index = cls.__new__(cls)
+        index.ids = payload["ids"]
+        index.documents = payload["documents"]
+        index.metadatas = payload["metadatas"]
+        index.k1 = payload["k1"]
+        index.b = payload["b"]
+        index.doc_lengths = payload["doc_lengths"]
+        index.postings = payload["postings"]
+        index._prepare()
+        logger.info("Loaded BM25 index with %d chunks from %s", len(index), path)
+        return index
+
+
+def reciprocal_rank_fusion(rankings, k: int = 60) -> list[tuple[str, float]]:
+    """
+    Fuse several best-first id rankings with reciprocal-rank fusion.
+
+    Each id scores sum(1 / (k + rank)) over the rankings it appears in.
+    Returns (id, score) pairs, best first; ties keep first-seen order.
+    """
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
@@ -0,0 +1,101 @@
+"""Paging, projection and serialization of /chat session history."""
+
+import base64
+import binascii
+from typing import Optional
+
+import orjson
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Fields a client may select with `fields=`; `text`, `tool_calls` and `tool_results` are derived from the content parts.
+HISTORY_FIELDS = ("id", "author", "timestamp", "invocation_id", "text", "tool_calls", "tool_results", "partial")
+COMPACT_FIELDS = ("id", "author", "timestamp", "text", "tool_calls", "tool_results")
+
+
+def parse_fields(fields: Optional[str]) -> Optional[tuple[str, ...]]:
+    """Split a comma-separated `fields` parameter; None means "whole events"."""
+    if not fields:
+        return None
+    selected = tuple(f.strip() for f in fields.split(",") if f.strip())
+    unknown = [f for f in selected if f not in HISTORY_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown history fields {unknown}, expected a subset of {list(HISTORY_FIELDS)}")
+    return selected
+
+
+def encode_cursor(event) -> str:
+    """Opaque cursor pointing just after `event`: its timestamp and id."""
+    raw = f"{event.timestamp!r}:{event.id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[float, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        timestamp, event_id = raw.split(":", 1)
+        return float(timestamp), event_id
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError("invalid cursor") from e
+
+
+def _parts(event) -> list:
+    return event.content.parts if event.content and event.content.parts else []
+
+
+def project_event(event, fields: tuple[str, ...], compact: bool = False) -> dict:
+    """
+    The selected fields of one event as plain JSON-ready values.
+
+    In compact mode tool calls and results keep only the tool name, never
+    their arguments or (often large) responses.
+    """
+    out = {}
+    for field in fields:
+        if field == "text":
+            out["text"] = "".join(part.text for part in _parts(event) if part.text and not part.thought)
+        elif field == "tool_calls":
+            calls = [part.function_call for part in _parts(event) if part.function_call]
+            out["tool_calls"] = [
+                {"name": c.name} if compact else {"name": c.name, "args": c.args or {}} for c in calls
+            ]
+        elif field == "tool_results":
+            results = [part.function_response for part in _parts(event) if part.function_response]
+            out["tool_results"] = [
+                {"name": r.name} if compact else {"name": r.name, "response": r.response} for r in results
+            ]
+        else:
+            out[field] = getattr(event, field)
+    return out
+
+
+def history_page(events: list, limit: int, fields: Optional[tuple], compact: bool):
+    """
+    Serialize one page of history.
+
+    Args:
+        events: Up to `limit + 1` events following the request's cursor,
+            oldest first; an extra event only signals that more remain.
+        limit: Page size.
+        fields: Fields to project (see `HISTORY_FIELDS`), or None for whole events.
+        compact: Drop tool arguments and responses.
+
+    Whole events are rendered by pydantic straight to JSON and embedded as
+    `orjson.Fragment`s, so they are never turned into intermediate dicts.
+
+    Returns:
+        (items, next_cursor); next_cursor is None on the last page.
+    """
+    if compact and fields is None:
+        fields = COMPACT_FIELDS
+    page = events[:limit]
+    if fields is None:
+        items = [orjson.Fragment(event.model_dump_json(exclude_none=True)) for event in page]
+    else:
+        items = [project_event(event, fields, compact) for event in page]
+    return items, encode_cursor(page[-1]) if len(events) > limit and page else None
+
+
+def dumps(body: dict) -> bytes:
+    return orjson.dumps(body, default=str)
@@ -9,8 +9,102 @@ load_dotenv(APP_DIR / ".env")
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 DATA_DIR = BASE_DIR / "data"
-VECTOR_STORE_DIR = BASE_DIR / "vector_store" / "chroma"
 EMBEDDING_MODEL_NAME = "gemini-embedding-001"
 
-GCP_PROJECT = os.environ["GOOGLE_CLOUD_PROJECT"]
+# Embedding backend: "vertex" (Vertex AI) or "hashing" (offline, deterministic hashing vectorizer).
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "vertex")
+HASHING_EMBEDDING_DIM = int(os.getenv("HASHING_EMBEDDING_DIM", "512"))
+
+# Stores built by a non-default provider get their own files, since vector spaces cannot be mixed.
+_STORE_SUFFIX = "" if EMBEDDING_PROVIDER == "vertex" else f"_{EMBEDDING_PROVIDER}"
+VECTOR_STORE_DIR = Path(
+    os.getenv("VECTOR_STORE_DIR", str(BASE_DIR / "vector_store" / f"chroma{_STORE_SUFFIX}"))
+)
+VECTOR_COLLECTION_NAME = "ng12"
+
+# BM25 lexical index written by ingestion next to the Chroma store.
+BM25_INDEX_PATH = os.getenv("BM25_INDEX_PATH", str(VECTOR_STORE_DIR.parent / f"bm25_ng12{_STORE_SUFFIX}.json"))
+
+# Symptom -> guideline evidence index written by ingestion, used by the assessment agent's
+# get_symptom_evidence tool, and the number of chunks it keeps per symptom.
+SYMPTOM_INDEX_PATH = os.getenv(
+    "SYMPTOM_INDEX_PATH", str(VECTOR_STORE_DIR.parent / f"symptom_index_ng12{_STORE_SUFFIX}.json")
+)
+SYMPTOM_INDEX_TOP_N = int(os.getenv("SYMPTOM_INDEX_TOP_N", "8"))
+
+# Vector search engine for guideline retrieval: "chroma" (HNSW), "numpy" (in-process exact search)
+# or "snapshot" (exact search over the memory-mapped snapshot, shared by all workers on a host).
+RETRIEVAL_ENGINE = os.getenv("RETRIEVAL_ENGINE", "chroma")
+
+# Memory-mapped vector snapshot exported at the end of ingestion, and how its vectors are stored:
+# "float32", or quantized to "float16" (half the size) or "int8" (a quarter).
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", str(VECTOR_STORE_DIR.parent / f"snapshot_ng12{_STORE_SUFFIX}"))
+SNAPSHOT_DTYPE = os.getenv("SNAPSHOT_DTYPE", "float32")
+
+# Query-embedding cache: in-memory LRU size and on-disk tier (set the path to "" to disable).
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "1024"))
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH", str(VECTOR_STORE_DIR.parent / "embedding_cache.sqlite3")
+)
+
+# Patient records: JSON array or NDJSON (defaults to app/tools/patients.json).
+PATIENT_DATA_PATH = os.getenv("PATIENT_DATA_PATH", "")
+PATIENT_STORE_CHECK_INTERVAL = float(os.getenv("PATIENT_STORE_CHECK_INTERVAL", "1.0"))
+
+# Upper bound on patients assessed concurrently by /assess/batch.
+ASSESS_BATCH_MAX_CONCURRENCY = int(os.getenv("ASSESS_BATCH_MAX_CONCURRENCY", "4"))
+
+# Decide clear-cut /assess cases with the deterministic NG12 rules before calling the agent.
+PRESCREEN_ENABLED = os.getenv("PRESCREEN_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Cache of finished agent assessments (set the path to persist entries in SQLite).
+ASSESSMENT_CACHE_SIZE = int(os.getenv("ASSESSMENT_CACHE_SIZE", "1024"))
+ASSESSMENT_CACHE_TTL = float(os.getenv("ASSESSMENT_CACHE_TTL", "86400"))
+ASSESSMENT_CACHE_PATH = os.getenv("ASSESSMENT_CACHE_PATH", "")
+ASSESSMENT_CACHE_DISK_SIZE = int(os.getenv("ASSESSMENT_CACHE_DISK_SIZE", "10000"))
+
+# Semantic cache of /chat answers: a first message whose embedding is at least
+# ANSWER_CACHE_THRESHOLD cosine-similar to an earlier question gets its answer (0 size = off).
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+
+# Ingestion embedding stage: concurrent batches, request rate cap (0 = unlimited), retries
+# and the directory where finished batches are checkpointed so interrupted runs resume.
+INGEST_EMBED_WORKERS = int(os.getenv("INGEST_EMBED_WORKERS", "4"))
+INGEST_EMBED_RPS = float(os.getenv("INGEST_EMBED_RPS", "0"))
+INGEST_EMBED_MAX_RETRIES = int(os.getenv("INGEST_EMBED_MAX_RETRIES", "5"))
+INGEST_CHECKPOINT_DIR = os.getenv(
+    "INGEST_CHECKPOINT_DIR", str(VECTOR_STORE_DIR.parent / f"ingest_checkpoint{_STORE_SUFFIX}")
+)
+
+# Request traces: trace every request (otherwise only those sent with "X-Trace: 1"),
+# how many finished traces /traces keeps, and an optional directory to write them to as JSON.
+TRACE_ALL_REQUESTS = os.getenv("TRACE_ALL_REQUESTS", "false").lower() in ("1", "true", "yes")
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "100"))
+TRACE_EXPORT_DIR = os.getenv("TRACE_EXPORT_DIR", "")
+
+# /chat session store: "memory" or "sqlite" (SESSION_DB_PATH; survives restarts and is shared
+# by workers on one host). Sessions are evicted least-recently-written first once either cap
+# is exceeded, or after SESSION_IDLE_TTL seconds without a new message (0 disables a limit).
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", str(VECTOR_STORE_DIR.parent / "sessions.sqlite3"))
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "1000"))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "3600"))
+
+# Context packing for guideline search results: merge overlapping or adjacent chunks,
+# then keep the passages most relevant to the query within CONTEXT_TOKEN_BUDGET tokens
+# (per query for batch searches; 0 = merge only).
+CONTEXT_PACKING = os.getenv("CONTEXT_PACKING", "true").lower() in ("1", "true", "yes")
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+
+# Warm up Vertex AI, the agents, the vector store and the indexes in the background at
+# startup; /ready reports 503 until it has finished. When off, they load on first use.
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+# Seconds before failed warm-up steps are retried in the background (doubling up to a minute);
+# the replica becomes ready once they succeed. 0 = do not retry.
+WARMUP_RETRY_INTERVAL = float(os.getenv("WARMUP_RETRY_INTERVAL", "5"))
+
+# Only needed once Vertex AI is used, so importing the app works without it (e.g. /health).
+GCP_PROJECT = os.getenv("GOOGLE_CLOUD_PROJECT", "")
 GCP_REGION = os.getenv("GCP_REGION", "us-central1")
@@ -0,0 +1,288 @@
+"""
+Packs retrieved guideline chunks into a token budget before they reach the agent.
+
+Windows overlap by ~100 tokens, a page's last window runs into the next
+page, and neighbouring hits often come from adjacent pages, so five
+results can carry several thousand tokens of repeated text.
+`pack_results` merges results whose page spans overlap or touch, then, if
+the text is still over budget, keeps the passages most relevant to the
+query. Tokens are counted with the cached cl100k_base encoder (or a
+chunk's stored `token_count`). Citation metadata (source, page, chunk_id)
+is never rewritten.
+"""
+
+import math
+import re
+from typing import Optional
+
+from app.bm25 import tokenize
+from app.tokenizer import count_tokens, get_encoding
+
+# A shared prefix/suffix shorter than this is not treated as chunk overlap.
+MIN_OVERLAP_CHARS = 40
+# Fewest tokens a result's top passage is cut down to when the budget is exhausted.
+MIN_PASSAGE_TOKENS = 32
+GAP = "\n…\n"
+
+_RECOMMENDATION_RE = re.compile(r"^\d+\.\d+\.\d+\b")
+_YEAR_MARKER_RE = re.compile(r"^\[\d{4}")
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z])")
+_CHUNK_INDEX_RE = re.compile(r"_(\d+)$")
+
+
+def result_tokens(result: dict) -> int:
+    """Tokens in a result's document: the stored `token_count` of an untouched chunk, else counted."""
+    meta = result.get("metadata") or {}
+    if isinstance(meta.get("token_count"), int) and "chunk_ids" not in meta:
+        return meta["token_count"]
+    return count_tokens(result.get("document") or "")
+
+
+def _overlap(first: str, second: str) -> int:
+    """Length of the longest suffix of `first` that is a prefix of `second` (0 if under MIN_OVERLAP_CHARS)."""
+    probe = second[:64]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return 0
+    pos = first.rfind(probe)
+    while pos != -1:
+        tail = first[pos:]
+        if second.startswith(tail):
+            return len(tail)
+        pos = first.rfind(probe, 0, pos)
+    return 0
+
+
+def _span(meta: dict) -> tuple[int, int]:
+    start = meta.get("page_start", meta.get("page")) or 0
+    return start, max(start, meta.get("page_end") or start)
+
+
+def _order(meta: dict, last: bool = False) -> Optional[tuple[int, int]]:
+    """
+    Document position of a (possibly merged) result's first or `last` chunk:
+    its page and the index in its chunk_id (None without a numbered chunk_id).
+    """
+    ids = meta.get("chunk_ids") or [meta.get("chunk_id")]
+    match = _CHUNK_INDEX_RE.search(str(ids[-1] if last else ids[0] or ""))
+    return (_span(meta)[1 if last else 0], int(match.group(1))) if match else None
+
+
+def _consecutive(first: dict, second: dict) -> bool:
+    a, b = _order(first, last=True), _order(second)
+    return a is not None and b is not None and b[1] == a[1] + 1 and 0 <= b[0] - a[0] <= 1
+
+
+def _combine(target: dict, result: dict) -> Optional[dict]:
+    """
+    Merge two results from the same source whose page spans overlap or touch
+    and that share text or are consecutive chunks; None if they are not
+    neighbours. Shared text appears once.
+    """
+    a_meta, b_meta = target["metadata"], result["metadata"]
+    if a_meta.get("source") != b_meta.get("source"):
+        return None
+    (a_start, a_end), (b_start, b_end) = _span(a_meta), _span(b_meta)
+    if b_start > a_end + 1 or a_start > b_end + 1:
+        return None
+
+    a_doc, b_doc = target["document"], result["document"]
+    if b_doc in a_doc:
+        text, first, second = a_doc, target, result
+    elif a_doc in b_doc:
+        text, first, second = b_doc, result, target
+    elif n := _overlap(a_doc, b_doc):
+        text, first, second = a_doc + b_doc[n:], target, result
+    elif n := _overlap(b_doc, a_doc):
+        text, first, second = b_doc + a_doc[n:], result, target
+    elif _consecutive(a_meta, b_meta) or _consecutive(b_meta, a_meta):
+        first, second = (target, result) if _consecutive(a_meta, b_meta) else (result, target)
+        # Whole-page chunks follow on directly; page windows (with "page_start")
+        # that share no text have a window missing between them.
+        gap = "page_start" in a_meta or "page_start" in b_meta
+        text = first["document"] + (GAP if gap else "\n") + second["document"]
+    else:
+        return None
+
+    ids = []
+    for meta in (first["metadata"], second["metadata"]):
+        for chunk_id in meta.get("chunk_ids") or [meta.get("chunk_id")]:
+            if chunk_id is not None and chunk_id not in ids:
+                ids.append(chunk_id)
+    combined = dict(first["metadata"])
+    combined["chunk_ids"] = ids
+    end = max(a_end, b_end)
+    if end > _span(combined)[0] or "page_end" in combined:
+        combined["page_end"] = end
+    return {"document": text, "metadata": combined}
+
+
+def merge_chunks(results: list[dict]) -> tuple[list[dict], int]:
+    """
+    Merge results from the same source whose page spans overlap or are
+    adjacent and that share text (window overlap, a window running into the
+    next page, a chunk contained in another) or are consecutive chunks.
+
+    Shared text appears once. The merged result takes the best rank of its parts; its metadata
+    is the text-first chunk's, plus "chunk_ids" listing every merged chunk
+    in text order and "page_end" when the span grows past its page.
+
+    Returns:
+        (results, number of chunks merged away)
+    """
+    merged: list[dict] = []
+    folded = 0
+    for result in results:
+        item = {"document": result["document"] or "", "metadata": result["metadata"] or {}}
+        position = len(merged)
+        i = 0
+        # A new result can bridge two earlier ones (pages 9 and 11, then 10).
+        while i < len(merged):
+            combined = _combine(merged[i], item)
+            if combined is None:
+                i += 1
+                continue
+            item = combined
+            del merged[i]
+            position = min(position, i)
+            folded += 1
+        merged.insert(min(position, len(merged)), item)
+    return merged, folded
+
+
+def split_passages(text: str) -> list[str]:
+    """
+    Split guideline text into passages: sentences, except that a
+    recommendation's bullet list stays with its lead-in sentence and a
+    trailing "[2015]"-style marker stays with the text it dates.
+    """
+    passages, current = [], []
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        if current and _RECOMMENDATION_RE.match(line):
+            passages.append("\n".join(current))
+            current = []
+        if _YEAR_MARKER_RE.match(line) and passages and not current:
+            passages[-1] += "\n" + line
+            continue
+        current.append(line)
+        if line.endswith((".", "!", "?", "]")):
+            passages.extend(_SENTENCE_SPLIT_RE.split("\n".join(current)))
+            current = []
+    if current:
+        passages.append("\n".join(current))
+    return passages
+
+
+def _relevance(passages: list[list[str]], query: str) -> list[list[float]]:
+    """Score each passage by the idf-weighted query terms it contains."""
+    query_terms = set(tokenize(query))
+    terms = [[set(tokenize(p)) & query_terms for p in result] for result in passages]
+    n = sum(len(result) for result in terms) or 1
+    df: dict[str, int] = {}
+    for result in terms:
+        for found in result:
+            for term in found:
+                df[term] = df.get(term, 0) + 1
+    idf = {term: math.log(1 + n / count) for term, count in df.items()}
+    return [[sum(idf[t] for t in found) for found in result] for result in terms]
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    encoding = get_encoding()
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens]).rstrip() + " …"
+
+
+def _caps(costs: list[int], budget: int) -> list[int]:
+    """Largest equal per-result cap (water-filling) so the capped costs fit `budget`."""
+    caps = list(costs)
+    if sum(costs) <= budget:
+        return caps
+    remaining, left = budget, len(costs)
+    for i in sorted(range(len(costs)), key=costs.__getitem__):
+        share = max(MIN_PASSAGE_TOKENS, remaining // left)
+        caps[i] = min(costs[i], share)
+        remaining -= caps[i]
+        left -= 1
+    return caps
+
+
+def trim_to_budget(results: list[dict], query: str, budget: int) -> list[dict]:
+    """
+    Keep the passages most relevant to `query` within `budget` tokens.
+
+    Every result keeps its top passage: the one with the most idf-weighted
+    query terms, or its leading passage when none matches. If those alone
+    exceed the budget, each is cut to an equal share (at least
+    MIN_PASSAGE_TOKENS). The remaining budget goes to other passages,
+    matching ones by score first, then leading ones in rank order. Kept
+    passages stay in document order, with "…" marking cuts.
+    """
+    passages = [split_passages(r["document"]) or [""] for r in results]
+    scores = _relevance(passages, query)
+    separator = count_tokens(GAP)
+    cost = [[count_tokens(p) + separator for p in result] for result in passages]
+    keep: list[dict[int, str]] = [{} for _ in results]
+
+    top = [max(range(len(s)), key=lambda j, s=s: (s[j], -j)) for s in scores]
+    caps = _caps([cost[i][j] for i, j in enumerate(top)], budget)
+    used = 0
+    for i, j in enumerate(top):
+        keep[i][j] = passages[i][j] if caps[i] >= cost[i][j] else _truncate(passages[i][j], caps[i] - separator)
+        used += caps[i]
+
+    candidates = sorted(
+        ((-score, i, j) for i, result_scores in enumerate(scores) for j, score in enumerate(result_scores) if score > 0)
+    ) + [(0, i, j) for i, result_scores in enumerate(scores) for j, score in enumerate(result_scores) if score <= 0]
+    for _, i, j in candidates:
+        if j not in keep[i] and used + cost[i][j] <= budget:
+            keep[i][j] = passages[i][j]
+            used += cost[i][j]
+
+    packed = []
+    for i, result in enumerate(results):
+        parts, previous = [], None
+        for j in sorted(keep[i]):
+            if previous is not None:
+                parts.append("\n" if j == previous + 1 else GAP)
+            parts.append(keep[i][j])
+            previous = j
+        if min(keep[i]) > 0:
+            parts.insert(0, GAP.lstrip("\n"))
+        if max(keep[i]) < len(passages[i]) - 1:
+            parts.append(GAP.rstrip("\n"))
+        packed.append({"document": "".join(parts), "metadata": result["metadata"]})
+    return packed
+
+
+def pack_results(results: list[dict], query: str, budget: Optional[int]) -> tuple[list[dict], dict]:
+    """
+    Merge neighbouring chunks and trim the results to `budget` tokens.
+
+    Args:
+        results: [{"document", "metadata"}, ...] in rank order.
+        query: The search query, used to rank passages when trimming.
+        budget: Token budget for all documents together; 0 or None only merges.
+
+    Returns:
+        (packed results, report) where report has "tokens_in", "tokens_out",
+        "tokens_saved", "chunks_merged" and the "encoding" that counted the
+        tokens ("cl100k_base", or "regex-fallback" when tiktoken is unavailable).
+    """
+    tokens_in = sum(result_tokens(r) for r in results)
+    packed, folded = merge_chunks(results)
+    tokens_out = sum(result_tokens(r) for r in packed)
+    if budget and tokens_out > budget:
+        packed = trim_to_budget(packed, query, budget)
+        tokens_out = sum(count_tokens(r["document"]) for r in packed)
+    return packed, {
+        "tokens_in": tokens_in,
+        "tokens_out": tokens_out,
+        "tokens_saved": tokens_in - tokens_out,
+        "chunks_merged": folded,
+        "encoding": get_encoding().name,
+    }
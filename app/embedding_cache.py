@@ -0,0 +1,116 @@
+"""Two-tier cache for query embeddings (in-memory LRU in front of SQLite)."""
+
+import hashlib
+import logging
+import threading
+from array import array
+from typing import Callable, Sequence
+
+from app.cache import LRUCache, SQLiteCache
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text: str) -> str:
+    """Case-fold and collapse whitespace so trivially different queries share an entry."""
+    return " ".join(text.casefold().split())
+
+
+class EmbeddingCache:
+    """
+    Cache of embedding vectors keyed on (model name, normalized text).
+
+    Lookups go to the in-memory LRU first, then to the optional on-disk
+    tier; only texts missing from both are sent to the embedding model,
+    in a single batched call. Disk hits are promoted into memory.
+
+    Args:
+        model_name: Embedding model identifier, part of every cache key.
+        maxsize: Number of vectors kept in the memory tier.
+        path: SQLite file for the persistent tier, or None to keep the
+            cache in memory only.
+    """
+
+    def __init__(self, model_name: str, maxsize: int = 1024, path=None):
+        self.model_name = model_name
+        self._memory = LRUCache(maxsize=maxsize)
+        self._disk = SQLiteCache(path, table="embeddings") if path else None
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def key(self, text: str) -> str:
+        raw = f"{self.model_name}\x00{normalize_query(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> list[float] | None:
+        key = self.key(text)
+        vector = self._memory.get(key)
+        if vector is not None:
+            self._count(memory_hits=1)
+            return vector
+        if self._disk is not None:
+            blob = self._disk.get(key)
+            if blob is not None:
+                vector = array("d", blob).tolist()
+                self._memory.set(key, vector)
+                self._count(disk_hits=1)
+                return vector
+        return None
+
+    def put(self, text: str, vector: Sequence[float]):
+        key = self.key(text)
+        vector = list(vector)
+        self._memory.set(key, vector)
+        if self._disk is not None:
+            try:
+                self._disk.set(key, array("d", vector).tobytes())
+            except Exception:
+                logger.warning("Unable to persist embedding to disk cache", exc_info=True)
+
+    def get_or_compute(
+        self,
+        texts: Sequence[str],
+        embed_fn: Callable[[list[str]], list[Sequence[float]]],
+    ) -> list[list[float]]:
+        """
+        Return one vector per text, calling `embed_fn` once for all cache misses.
+
+        Duplicate texts within the batch (after normalization) are embedded once.
+        """
+        vectors: list[list[float] | None] = [self.get(t) for t in texts]
+
+        pending: dict[str, list[int]] = {}
+        for i, (text, vector) in enumerate(zip(texts, vectors)):
+            if vector is None:
+                pending.setdefault(normalize_query(text), []).append(i)
+
+        if pending:
+            self._count(misses=len(pending))
+            first_texts = [texts[idxs[0]] for idxs in pending.values()]
+            computed = embed_fn(first_texts)
+            for text, idxs, vector in zip(first_texts, pending.values(), computed):
+                self.put(text, vector)
+                for i in idxs:
+                    vectors[i] = list(vector)
+
+        return vectors
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "model": self.model_name,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "disk_enabled": self._disk is not None,
+        }
+
+    def _count(self, memory_hits=0, disk_hits=0, misses=0):
+        with self._lock:
+            self.memory_hits += memory_hits
+            self.disk_hits += disk_hits
+            self.misses += misses
@@ -0,0 +1,136 @@
+"""Embedding providers used by ingestion and guideline retrieval."""
+
+import hashlib
+import logging
+import math
+import re
+import threading
+from abc import ABC, abstractmethod
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+class EmbeddingProvider(ABC):
+    """
+    Interface for turning texts into fixed-length vectors.
+
+    `model_id` identifies the vector space: it is part of every cache and
+    checkpoint key, so vectors from different providers are never mixed.
+    Subclasses must implement `model_id` and `embed`.
+    """
+
+    name = "base"
+
+    @property
+    @abstractmethod
+    def model_id(self) -> str:
+        """Identifier of the vector space, e.g. the model name and dimension."""
+
+    @abstractmethod
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        """Return one vector per text, in order."""
+
+    def warm_up(self):
+        """Load whatever `embed` needs (models, clients) ahead of the first call."""
+
+
+class VertexEmbeddingProvider(EmbeddingProvider):
+    """
+    Vertex AI `TextEmbeddingModel`, loaded on first use.
+
+    Args:
+        model_name: Vertex embedding model, e.g. "gemini-embedding-001".
+        model: Already loaded model to use instead of `from_pretrained`.
+    """
+
+    name = "vertex"
+
+    def __init__(self, model_name: str, model=None):
+        self.model_name = model_name
+        self._model = model
+        self._lock = threading.Lock()
+
+    @property
+    def model_id(self) -> str:
+        return self.model_name
+
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from vertexai.preview.language_models import TextEmbeddingModel
+
+                    self._model = TextEmbeddingModel.from_pretrained(self.model_name)
+        return self._model
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        return [e.values for e in self.model().get_embeddings(list(texts))]
+
+    def warm_up(self):
+        self.model()
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    Deterministic offline embedder based on the hashing trick.
+
+    Word unigrams and bigrams are hashed (blake2b, so results are stable
+    across processes) into `dimension` signed buckets, weighted by
+    1 + log(tf) and L2-normalized. It needs no credentials or network and
+    is meant for local runs, tests and throughput measurements; similarity
+    is lexical, not semantic.
+
+    Args:
+        dimension: Length of the output vectors.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dimension: int = 512):
+        if dimension <= 0:
+            raise ValueError("dimension must be positive")
+        self.dimension = dimension
+
+    @property
+    def model_id(self) -> str:
+        return f"hashing-{self.dimension}"
+
+    def _features(self, text: str) -> dict[str, int]:
+        words = _WORD_RE.findall(text.casefold())
+        counts: dict[str, int] = {}
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            counts[feature] = counts.get(feature, 0) + 1
+        return counts
+
+    def embed_one(self, text: str) -> list[float]:
+        vector = [0.0] * self.dimension
+        for feature, tf in self._features(text).items():
+            digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            sign = 1.0 if digest & 1 else -1.0
+            vector[(digest >> 1) % self.dimension] += sign * (1.0 + math.log(tf))
+        norm = math.sqrt(sum(v * v for v in vector))
+        return [v / norm for v in vector] if norm else vector
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed_one(text) for text in texts]
+
+
+PROVIDERS = ("vertex", "hashing")
+
+
+def create_embedding_provider(name: str, model_name: str, dimension: int = 512) -> EmbeddingProvider:
+    """
+    Build the provider selected by `EMBEDDING_PROVIDER`.
+
+    Args:
+        name: "vertex" or "hashing".
+        model_name: Vertex model name (ignored by the hashing provider).
+        dimension: Vector length for the hashing provider.
+    """
+    if name == "vertex":
+        return VertexEmbeddingProvider(model_name)
+    if name == "hashing":
+        return HashingEmbeddingProvider(dimension)
+    raise ValueError(f"Unknown embedding provider '{name}', expected one of {PROVIDERS}")
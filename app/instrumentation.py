@@ -0,0 +1,181 @@
+"""ADK plugin and ASGI middleware that feed `app.metrics`."""
+
+import logging
+import time
+from typing import Any, Optional
+
+from google.adk.plugins.base_plugin import BasePlugin
+from starlette.routing import Match
+
+from app.metrics import (
+    LLM_TOKENS,
+    REQUEST_SECONDS,
+    TTFB_SECONDS,
+    Trace,
+    TraceStore,
+    current_agent,
+    current_endpoint,
+    current_trace,
+    record_span,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class InstrumentationPlugin(BasePlugin):
+    """
+    Records one span per LLM turn and per tool call, tagged with the agent.
+
+    Token counts are taken from the model response's `usage_metadata` when
+    the model reports it. The agent name is also stored in
+    `current_agent`, so spans recorded inside tools (embedding calls,
+    vector queries, patient lookups) are attributed to the same agent.
+    """
+
+    def __init__(self, name: str = "instrumentation"):
+        super().__init__(name)
+        self._model_calls: dict[tuple, tuple[float, str]] = {}
+        self._tool_calls: dict[Any, float] = {}
+
+    @staticmethod
+    def _model_key(callback_context) -> tuple:
+        return (getattr(callback_context, "invocation_id", None), callback_context.agent_name)
+
+    @staticmethod
+    def _tool_key(tool_context) -> Any:
+        return getattr(tool_context, "function_call_id", None) or id(tool_context)
+
+    async def before_agent_callback(self, *, agent, callback_context) -> Optional[Any]:
+        current_agent.set(agent.name)
+        return None
+
+    async def before_model_callback(self, *, callback_context, llm_request) -> Optional[Any]:
+        current_agent.set(callback_context.agent_name)
+        model = getattr(llm_request, "model", None) or "unknown"
+        self._model_calls[self._model_key(callback_context)] = (time.perf_counter(), model)
+        return None
+
+    async def after_model_callback(self, *, callback_context, llm_response) -> Optional[Any]:
+        if getattr(llm_response, "partial", False):
+            return None  # streaming chunk; the turn ends with the final response
+        started = self._model_calls.pop(self._model_key(callback_context), None)
+        if started is None:
+            return None
+        start, model = started
+        attributes = {}
+        usage = getattr(llm_response, "usage_metadata", None)
+        for kind, field in (("prompt", "prompt_token_count"), ("completion", "candidates_token_count")):
+            tokens = getattr(usage, field, None) if usage is not None else None
+            if tokens:
+                attributes[f"{kind}_tokens"] = tokens
+                LLM_TOKENS.inc(
+                    tokens, kind=kind, endpoint=current_endpoint.get(), agent=callback_context.agent_name
+                )
+        record_span("llm_turn", model, start, time.perf_counter() - start, **attributes)
+        return None
+
+    async def on_model_error_callback(self, *, callback_context, llm_request, error) -> Optional[Any]:
+        started = self._model_calls.pop(self._model_key(callback_context), None)
+        if started is not None:
+            start, model = started
+            record_span("llm_turn", model, start, time.perf_counter() - start, status="error")
+        return None
+
+    async def before_tool_callback(self, *, tool, tool_args, tool_context) -> Optional[dict]:
+        current_agent.set(tool_context.agent_name)
+        self._tool_calls[self._tool_key(tool_context)] = time.perf_counter()
+        return None
+
+    async def after_tool_callback(self, *, tool, tool_args, tool_context, result) -> Optional[dict]:
+        start = self._tool_calls.pop(self._tool_key(tool_context), None)
+        if start is not None:
+            # The tools report failures as {"error": ...} instead of raising.
+            failed = isinstance(result, dict) and "error" in result
+            record_span("tool_call", tool.name, start, time.perf_counter() - start,
+                        status="error" if failed else "ok")
+        return None
+
+    async def on_tool_error_callback(self, *, tool, tool_args, tool_context, error) -> Optional[dict]:
+        start = self._tool_calls.pop(self._tool_key(tool_context), None)
+        if start is not None:
+            record_span("tool_call", tool.name, start, time.perf_counter() - start, status="error")
+        return None
+
+
+class MetricsMiddleware:
+    """
+    Times every HTTP request (including streamed bodies) and tags its stages with the endpoint.
+
+    Time to first byte is the delay until the first non-empty body chunk
+    is sent, which is what streaming endpoints improve.
+
+    A request is traced when it sends `X-Trace: 1` (or always, with
+    `trace_all`); its spans are then kept in `trace_store` and the
+    response carries an `X-Trace-Id` header for `GET /traces/{trace_id}`.
+
+    Args:
+        app: The ASGI app to wrap.
+        trace_store: Where finished traces are kept.
+        trace_all: Trace every request, not only those that ask for it.
+    """
+
+    def __init__(self, app, trace_store: TraceStore, trace_all: bool = False):
+        self.app = app
+        self.trace_store = trace_store
+        self.trace_all = trace_all
+
+    @staticmethod
+    def endpoint_of(scope) -> str:
+        """Route template (e.g. "/chat/{session_id}/history") so labels stay low-cardinality."""
+        app = scope.get("app")
+        for route in getattr(app, "routes", []):
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", scope["path"])
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        endpoint = self.endpoint_of(scope)
+        headers = dict(scope.get("headers") or [])
+        traced = self.trace_all or headers.get(b"x-trace", b"").lower() in (b"1", b"true")
+        trace = Trace(endpoint) if traced else None
+        status = 500
+        first_byte_sent = False
+
+        async def send_with_status(message):
+            nonlocal status, first_byte_sent
+            if message["type"] == "http.response.body" and message.get("body") and not first_byte_sent:
+                first_byte_sent = True
+                ttfb = time.perf_counter() - start
+                TTFB_SECONDS.observe(ttfb, endpoint=endpoint, method=scope["method"])
+                if trace is not None:
+                    trace.ttfb_s = ttfb
+            elif message["type"] == "http.response.start":
+                status = message["status"]
+                if trace is not None:
+                    message = dict(message)
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"x-trace-id", trace.trace_id.encode("ascii"))
+                    ]
+            await send(message)
+
+        endpoint_token = current_endpoint.set(endpoint)
+        trace_token = current_trace.set(trace)
+        agent_token = current_agent.set("none")
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - start, endpoint=endpoint, method=scope["method"], status=status
+            )
+            if trace is not None:
+                trace.finish(status)
+                self.trace_store.add(trace)
+            current_agent.reset(agent_token)
+            current_trace.reset(trace_token)
+            current_endpoint.reset(endpoint_token)
@@ -1,15 +1,74 @@
 
-from fastapi import FastAPI
-from fastapi.responses import StreamingResponse, FileResponse
-from pydantic import BaseModel
-from app.ng12_agent import ng12_app
+import time
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, Query, Request
+from fastapi.responses import StreamingResponse, FileResponse, PlainTextResponse, JSONResponse, Response
+from pydantic import BaseModel, Field
+from app.ng12_agent import ng12_app, NG12Response
 from google.genai import types
-from app.assess_agent import assess_app
-from google.adk.sessions import InMemorySessionService
+from app.assess_agent import get_assess_app, AssessmentResponse
 from google.adk.runners import Runner
+from google.adk.agents.run_config import RunConfig, StreamingMode
+from google.adk.sessions.base_session_service import GetSessionConfig
+from google.adk.events import Event
+from contextlib import asynccontextmanager
+from app.tools.nice_guideline_tool import (
+    GuidelineRetriever,
+    set_retriever,
+    get_retriever,
+    get_embedding_cache,
+    get_embedding_provider,
+    get_bm25_index,
+    get_search_flights,
+    embed_queries,
+)
+from app.tools.patient_data_tool import get_patient_store, get_patient_data
+from app.tools.symptom_evidence_tool import get_symptom_index
+from app.config import (
+    ASSESS_BATCH_MAX_CONCURRENCY,
+    PRESCREEN_ENABLED,
+    ASSESSMENT_CACHE_SIZE,
+    ASSESSMENT_CACHE_TTL,
+    ASSESSMENT_CACHE_PATH,
+    ASSESSMENT_CACHE_DISK_SIZE,
+    ANSWER_CACHE_SIZE,
+    ANSWER_CACHE_THRESHOLD,
+    TRACE_ALL_REQUESTS,
+    TRACE_BUFFER_SIZE,
+    TRACE_EXPORT_DIR,
+    WARMUP_ON_STARTUP,
+    WARMUP_RETRY_INTERVAL,
+    SESSION_STORE,
+    SESSION_DB_PATH,
+    SESSION_MAX_COUNT,
+    SESSION_MAX_BYTES,
+    SESSION_IDLE_TTL,
+)
+from app.instrumentation import MetricsMiddleware
+from app.metrics import REGISTRY, TraceStore
+from app.prescreen import PreScreener
+from app.session_store import create_session_service
+from app.chat_history import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    decode_cursor,
+    history_page,
+    parse_fields,
+    dumps as dump_history,
+)
+from app.answer_cache import SemanticAnswerCache
+from app.assessment_cache import AssessmentCache
+from app.prompts import prompt_hash
+from app.single_flight import AsyncStreamFlight
+from app.startup import StartupReport
+from app.vertexai_utils import init_vertexai
+from typing import Optional
+import asyncio
 import logging
 import json
-import json
+import threading
+import uuid
 
 from pathlib import Path
 
@@ -17,23 +76,120 @@ logger = logging.getLogger(__name__)
 if not logger.handlers:
     logging.basicConfig(level=logging.INFO)
 
+startup_report = StartupReport()
+
+ng12_session_service = create_session_service(
+    SESSION_STORE,
+    path=SESSION_DB_PATH,
+    max_sessions=SESSION_MAX_COUNT,
+    max_bytes=SESSION_MAX_BYTES,
+    idle_ttl=SESSION_IDLE_TTL,
+)
+
+# Built on first use (or by the warm-up); tests and benchmarks may assign stand-ins.
+runner: Optional[Runner] = None
+assess_app = None
+_runner_lock = threading.Lock()
+
+
+def get_runner() -> Runner:
+    """Return the ADK runner for /chat, initializing Vertex AI on first use."""
+    global runner
+    if runner is None:
+        with _runner_lock:
+            if runner is None:
+                init_vertexai()
+                runner = Runner(app=ng12_app, session_service=ng12_session_service)
+    return runner
+
+
+def current_assess_app():
+    """The assessment app to call: an assigned stand-in, else the lazily built AdkApp."""
+    return assess_app if assess_app is not None else get_assess_app()
+
+
+def warm_up_steps(retriever: GuidelineRetriever) -> dict:
+    """Heavy initializations run by the background warm-up, in order."""
+    return {
+        "vertexai": init_vertexai,
+        "vector_store": retriever.open,
+        "embedding_model": lambda: get_embedding_provider().warm_up(),
+        "bm25_index": get_bm25_index,
+        "symptom_index": get_symptom_index,
+        "patient_store": get_patient_store,
+        "ng12_runner": get_runner,
+        "assess_app": current_assess_app,
+    }
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    # One NG12 vector store handle shared by both agents via the search tool; opened lazily or by the warm-up.
+    retriever = GuidelineRetriever()
+    set_retriever(retriever)
+    app.state.retriever = retriever
+    warm_up = None
+    if WARMUP_ON_STARTUP:
+        warm_up = asyncio.create_task(
+            asyncio.to_thread(startup_report.warm_up, warm_up_steps(retriever), WARMUP_RETRY_INTERVAL)
+        )
+    else:
+        startup_report.disable_warm_up()
+    startup_report.record("lifespan", time.perf_counter() - started)
+    logger.info(
+        "Started in %.3fs (import %.3fs); warm-up %s",
+        startup_report.phases["lifespan"], startup_report.phases.get("import", 0.0),
+        "running in background" if warm_up else "disabled",
+    )
+    try:
+        yield
+    finally:
+        startup_report.stop_warm_up()
+        if warm_up is not None and not warm_up.done():
+            await asyncio.wait([warm_up], timeout=5)
+        retriever.close()
+        set_retriever(None)
 
 
 app = FastAPI(
     title="NG12 Cancer Risk Assessor",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
-ng12_session_service = InMemorySessionService() 
-runner = Runner(
-    app=ng12_app,
-    session_service=ng12_session_service 
+trace_store = TraceStore(maxsize=TRACE_BUFFER_SIZE, export_dir=TRACE_EXPORT_DIR or None)
+app.add_middleware(MetricsMiddleware, trace_store=trace_store, trace_all=TRACE_ALL_REQUESTS)
+
+prescreener = PreScreener()
+assessment_cache = AssessmentCache(
+    maxsize=ASSESSMENT_CACHE_SIZE,
+    ttl=ASSESSMENT_CACHE_TTL,
+    path=ASSESSMENT_CACHE_PATH or None,
+    disk_maxsize=ASSESSMENT_CACHE_DISK_SIZE,
 )
+# Identical /assess requests in flight share one agent run.
+assessment_flights = AsyncStreamFlight()
+answer_cache = SemanticAnswerCache(maxsize=ANSWER_CACHE_SIZE, threshold=ANSWER_CACHE_THRESHOLD)
 
 class AssessmentRequest(BaseModel):
     patient_id: str
     user_id: str
 
+class BatchAssessmentRequest(BaseModel):
+    patient_ids: list[str] = Field(min_length=1)
+    user_id: str
+    max_concurrency: Optional[int] = Field(default=None, ge=1)
+
+class BatchAssessmentLine(BaseModel):
+    """One NDJSON line of /assess/batch output."""
+    patient_id: str
+    status: str  # "ok", "error" or "cancelled"
+    elapsed_ms: float
+    path: Optional[str] = None  # "rules", "cache" or "agent"
+    assessment: Optional[AssessmentResponse] = None
+    error: Optional[str] = None
+
 class KnowledgeRequest(BaseModel):
     message: str
     session_id: str
@@ -48,29 +204,228 @@ def home():
 
 @app.get("/health")
 def health():
+    """Liveness: the process is up. Does not touch Vertex AI or the vector store."""
     return {"status": "ok"}
 
+@app.get("/ready")
+def ready():
+    """Readiness: 200 once the warm-up has finished (or is disabled), else 503, with startup timings."""
+    report = startup_report.to_dict()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+@app.get("/stats")
+def stats():
+    """Cache and store counters for checking hot-path behaviour."""
+    return {
+        "embedding_cache": get_embedding_cache().stats(),
+        "patient_store": get_patient_store().stats(),
+        "prescreen": prescreener.stats(),
+        "assessment_cache": assessment_cache.stats(),
+        "assessment_coalescing": assessment_flights.stats(),
+        "search_coalescing": get_search_flights().stats(),
+        "chat_sessions": ng12_session_service.stats(),
+        "answer_cache": answer_cache.stats(),
+    }
+
+@app.get("/metrics")
+def metrics():
+    """Request and per-stage latency histograms and LLM token counts in Prometheus text format."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/traces/{trace_id}")
+def get_trace(trace_id: str):
+    """JSON spans of a recent request that was sent with "X-Trace: 1"."""
+    trace = trace_store.get(trace_id)
+    if trace is None:
+        return {"error": "trace not found"}
+    return trace
+
+async def stream_assessment(patient_id: str, user_id: str):
+    """Yield the text parts the assessment agent produces for one patient."""
+    async for event in current_assess_app().async_stream_query(
+        user_id=user_id,
+        message=f"Assess patient with ID: {patient_id}"
+    ):
+        if "content" in event:
+            # content contains the text/json string
+            text_part = event["content"]["parts"][0].get("text", "")
+            if text_part:
+                yield text_part
+
+
+def prescreen_patient(patient: dict) -> Optional[AssessmentResponse]:
+    """Return a rule-engine assessment for clear-cut cases, or None to use the agent."""
+    if not PRESCREEN_ENABLED:
+        return None
+    try:
+        decision = prescreener.assess(patient)
+    except Exception as e:
+        logger.exception("Pre-screen failed for %s, falling back to agent: %s", patient, e)
+        return None
+    return AssessmentResponse(**decision) if decision else None
+
+
+def assessment_cache_key(patient: dict) -> Optional[str]:
+    """Key for caching the agent's assessment of `patient`, or None if it must not be cached."""
+    if not isinstance(patient, dict) or "error" in patient:
+        return None
+    try:
+        return AssessmentCache.key(
+            patient,
+            store_version=get_retriever().store_version(),
+            prompt_hash=prompt_hash("ASSESSMENT_AGENT"),
+        )
+    except Exception as e:
+        logger.warning("Unable to build assessment cache key: %s", e)
+        return None
+
+
+def remember_assessment(cache_key: Optional[str], text: str) -> Optional[AssessmentResponse]:
+    """Parse the agent's output and cache it if it is a valid AssessmentResponse."""
+    try:
+        assessment = AssessmentResponse.model_validate_json(text)
+    except Exception:
+        logger.warning("Agent output is not a valid AssessmentResponse; not caching it")
+        return None
+    if cache_key:
+        assessment_cache.set(cache_key, assessment.model_dump_json())
+    return assessment
+
+
+def assessment_parts(patient_id: str, user_id: str, cache_key: Optional[str]):
+    """
+    Agent output for one patient, shared with identical assessments already in flight.
+
+    Requests coalesce on the cache key (record, store version and prompt),
+    or on the patient id when there is none; the run uses the first
+    caller's `user_id`. The finished assessment is cached once, by the run.
+    """
+    async def run():
+        text_parts = []
+        async for text_part in stream_assessment(patient_id, user_id):
+            text_parts.append(text_part)
+            yield text_part
+        remember_assessment(cache_key, "".join(text_parts))
+
+    return assessment_flights.stream(("assess", cache_key or patient_id), run)
+
+
 @app.post("/assess")
 async def assess_patient(req: AssessmentRequest):
+    patient = await asyncio.to_thread(get_patient_data, req.patient_id)
+    decision = prescreen_patient(patient)
+    if decision is not None:
+        return StreamingResponse(
+            iter([decision.model_dump_json()]),
+            media_type="application/json",
+            headers={"X-Assessment-Path": "rules"},
+        )
+
+    cache_key = assessment_cache_key(patient)
+    cached = assessment_cache.get(cache_key) if cache_key else None
+    if cached is not None:
+        return StreamingResponse(
+            iter([cached]),
+            media_type="application/json",
+            headers={"X-Assessment-Path": "cache"},
+        )
+
     async def generate_response():
         try:
-            async for event in assess_app.async_stream_query(
-                user_id=req.user_id, 
-                message=f"Assess patient with ID: {req.patient_id}"
-            ):
-                if "content" in event:
-                    # content contains the text/json string
-                    text_part = event["content"]["parts"][0].get("text", "")
-                    if text_part:
-                        yield text_part # This is already a string, no dict error!
+            async for text_part in assessment_parts(req.patient_id, req.user_id, cache_key):
+                yield text_part # This is already a string, no dict error!
         except Exception as e:
             logger.exception("ERROR in assess_patient: %s", e)
             yield "Internal Error"
 
-    return StreamingResponse(generate_response(), media_type="application/json")
+    return StreamingResponse(
+        generate_response(),
+        media_type="application/json",
+        headers={"X-Assessment-Path": "agent"},
+    )
 
-@app.post("/chat")
-async def chat(req: KnowledgeRequest):
+
+# batch_id -> tasks still running for that /assess/batch request
+_assessment_batches: dict[str, list[asyncio.Task]] = {}
+
+
+async def _assess_for_batch(patient_id: str, user_id: str, semaphore: asyncio.Semaphore) -> BatchAssessmentLine:
+    """Assess one patient of a batch; failures and cancellation are reported, never raised."""
+    started = time.perf_counter()
+
+    def line(status, **kwargs):
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        return BatchAssessmentLine(patient_id=patient_id, status=status, elapsed_ms=elapsed_ms, **kwargs)
+
+    try:
+        async with semaphore:
+            started = time.perf_counter()
+            patient = await asyncio.to_thread(get_patient_data, patient_id)
+            decision = prescreen_patient(patient)
+            if decision is not None:
+                return line("ok", path="rules", assessment=decision)
+            cache_key = assessment_cache_key(patient)
+            cached = assessment_cache.get(cache_key) if cache_key else None
+            if cached is not None:
+                return line("ok", path="cache", assessment=AssessmentResponse.model_validate_json(cached))
+            text = "".join([part async for part in assessment_parts(patient_id, user_id, cache_key)])
+        assessment = AssessmentResponse.model_validate_json(text)
+        return line("ok", path="agent", assessment=assessment)
+    except asyncio.CancelledError:
+        return line("cancelled")
+    except Exception as e:
+        logger.exception("ERROR assessing %s in batch: %s", patient_id, e)
+        return line("error", error=f"{type(e).__name__}: {e}")
+
+
+@app.post("/assess/batch")
+async def assess_patients_batch(req: BatchAssessmentRequest):
+    """
+    Assess many patients concurrently, streaming one NDJSON line per patient
+    as soon as it finishes. The X-Batch-Id response header can be passed to
+    DELETE /assess/batch/{batch_id} to cancel the remaining work.
+    """
+    batch_id = uuid.uuid4().hex
+    limit = min(req.max_concurrency or ASSESS_BATCH_MAX_CONCURRENCY, ASSESS_BATCH_MAX_CONCURRENCY)
+    semaphore = asyncio.Semaphore(limit)
+    tasks = [
+        asyncio.create_task(_assess_for_batch(patient_id, req.user_id, semaphore))
+        for patient_id in req.patient_ids
+    ]
+    _assessment_batches[batch_id] = tasks
+    logger.info("Started assessment batch %s: %d patients, concurrency %d", batch_id, len(tasks), limit)
+
+    async def generate_lines():
+        try:
+            for finished in asyncio.as_completed(tasks):
+                result = await finished
+                yield result.model_dump_json() + "\n"
+        finally:
+            # Client went away or the batch is done: stop anything still running.
+            for task in tasks:
+                task.cancel()
+            _assessment_batches.pop(batch_id, None)
+
+    return StreamingResponse(
+        generate_lines(),
+        media_type="application/x-ndjson",
+        headers={"X-Batch-Id": batch_id},
+    )
+
+
+@app.delete("/assess/batch/{batch_id}")
+async def cancel_assessment_batch(batch_id: str):
+    """Cancel the patients of a running batch that have not finished yet."""
+    tasks = _assessment_batches.get(batch_id)
+    if tasks is None:
+        return {"error": "batch not found or already finished"}
+    pending = [task for task in tasks if not task.done()]
+    for task in pending:
+        task.cancel()
+    return {"status": "cancelled", "batch_id": batch_id, "cancelled": len(pending)}
+
+async def open_chat_session(req: KnowledgeRequest):
+    """Create (or reuse) the ADK session for `req` and build the agent message."""
     session_id = str(req.session_id)
     user_id = str(req.session_id) 
     
@@ -90,10 +445,82 @@ async def chat(req: KnowledgeRequest):
         role="user", 
         parts=[types.Part.from_text(text=f"answer this: {req.message} using top_n: {req.top_k} for session_id: {session_id}")]
     )
+    return session, user_id, formatted_message
+
+
+async def lookup_cached_answer(req: KnowledgeRequest, session):
+    """
+    Look up the semantic answer cache for the first message of a session.
+
+    Sessions with earlier turns skip the cache, since the conversation can
+    change the answer.
+
+    Returns:
+        (cache_slot, answer): `answer` is the cached NG12Response JSON for
+        this session, or None on a miss; `cache_slot` is the (question,
+        embedding, scope) to store the agent's answer under, or None when
+        the cache does not apply.
+    """
+    if answer_cache.maxsize <= 0 or session.events:
+        return None, None
+    try:
+        embedding = (await asyncio.to_thread(embed_queries, [req.message]))[0]
+        scope = (get_retriever().store_version(), prompt_hash("NG12_AGENT"), req.top_k)
+    except Exception as e:
+        logger.warning("Answer cache lookup skipped: %s", e)
+        return None, None
+    slot = (req.message, embedding, scope)
+    hit = answer_cache.lookup(embedding, scope)
+    if hit is None:
+        return slot, None
+    answer, entry = hit
+    logger.info("Answer cache hit for %r (similarity %.3f to %r)", req.message, entry["similarity"], entry["question"])
+    response = NG12Response.model_validate_json(answer).model_copy(update={"session_id": session.id})
+    return slot, response.model_dump_json()
+
+
+def remember_answer(cache_slot, text: str):
+    """Cache the agent's answer if it is a valid NG12Response with citations."""
+    if cache_slot is None:
+        return
+    try:
+        response = NG12Response.model_validate_json(text)
+    except Exception:
+        return
+    # An answer without citations may come from a failed search; do not serve it again.
+    if response.citations:
+        question, embedding, scope = cache_slot
+        answer_cache.add(question, embedding, scope, text)
+
+
+async def record_cached_turn(session, message: types.Content, answer: str):
+    """Append a cache-served question and answer to the session, so history and follow-ups see them."""
+    invocation_id = f"cache-{uuid.uuid4().hex}"
+    await ng12_session_service.append_event(
+        session, Event(invocation_id=invocation_id, author="user", content=message)
+    )
+    await ng12_session_service.append_event(
+        session,
+        Event(
+            invocation_id=invocation_id,
+            author=ng12_app.root_agent.name,
+            content=types.Content(role="model", parts=[types.Part.from_text(text=answer)]),
+        ),
+    )
+
+
+@app.post("/chat")
+async def chat(req: KnowledgeRequest):
+    session, user_id, formatted_message = await open_chat_session(req)
+
+    cache_slot, cached = await lookup_cached_answer(req, session)
+    if cached is not None:
+        await record_cached_turn(session, formatted_message, cached)
+        return StreamingResponse(cached, media_type="application/json", headers={"X-Answer-Cache": "hit"})
 
     text_parts = []
     try:
-        async for event in runner.run_async(
+        async for event in get_runner().run_async(
             session_id=session.id,
             user_id=user_id,
             new_message=formatted_message,
@@ -110,39 +537,150 @@ async def chat(req: KnowledgeRequest):
         )
 
     response_content = "".join(text_parts)
+    remember_answer(cache_slot, response_content)
     return StreamingResponse(response_content, media_type="application/json")
 
 
+def _final_response(text: str) -> dict:
+    try:
+        return {"type": "final", "response": NG12Response.model_validate_json(text).model_dump()}
+    except Exception:
+        logger.warning("Final /chat/stream text is not a valid NG12Response; sending it as text")
+        return {"type": "final", "text": text}
+
+
+async def chat_events(req: KnowledgeRequest):
+    """
+    Run the NG12 agent for one message and yield progress as it happens.
+
+    Yields dicts with a "type" of:
+        "text": a chunk of model output as the model streams it;
+        "tool_call": the agent called a tool ("name", "args");
+        "tool_result": a tool returned ("name", "status": "ok" or "error"; the payload is not forwarded);
+        "final": the parsed NG12Response ("response"), or the raw "text" if it does not parse;
+            answers served from the semantic answer cache arrive as a single
+            final event with "cached": true;
+        "error": the run failed.
+    """
+    session, user_id, formatted_message = await open_chat_session(req)
+    cache_slot, cached = await lookup_cached_answer(req, session)
+    if cached is not None:
+        await record_cached_turn(session, formatted_message, cached)
+        yield dict(_final_response(cached), cached=True)
+        return
+    streamed_text = False
+    try:
+        async for event in get_runner().run_async(
+            session_id=session.id,
+            user_id=user_id,
+            new_message=formatted_message,
+            run_config=RunConfig(streaming_mode=StreamingMode.SSE),
+        ):
+            for call in event.get_function_calls():
+                yield {"type": "tool_call", "name": call.name, "args": call.args or {}}
+            for response in event.get_function_responses():
+                failed = isinstance(response.response, dict) and "error" in response.response
+                yield {"type": "tool_result", "name": response.name, "status": "error" if failed else "ok"}
+            parts = event.content.parts if event.content and event.content.parts else []
+            text = "".join(part.text for part in parts if part.text)
+            if not text:
+                continue
+            if event.partial:
+                streamed_text = True
+                yield {"type": "text", "text": text}
+                continue
+            # The aggregated event that closes a model turn repeats the streamed chunks.
+            if not streamed_text:
+                yield {"type": "text", "text": text}
+            streamed_text = False
+            if event.is_final_response():
+                remember_answer(cache_slot, text)
+                yield _final_response(text)
+    except Exception as e:
+        logger.exception("ERROR in Runner: %s", e)
+        yield {"type": "error", "error": "Internal Error"}
+
+
+def _encode_sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+def _encode_ndjson(event: dict) -> str:
+    return json.dumps(event) + "\n"
+
+
+@app.post("/chat/stream")
+async def chat_stream(req: KnowledgeRequest, request: Request):
+    """
+    Like /chat, but streams partial text, tool progress and the final
+    NG12Response as they happen: Server-Sent Events when the client sends
+    `Accept: text/event-stream`, NDJSON (one event per line) otherwise.
+    """
+    if "text/event-stream" in request.headers.get("accept", ""):
+        encode, media_type = _encode_sse, "text/event-stream"
+    else:
+        encode, media_type = _encode_ndjson, "application/x-ndjson"
+
+    async def generate():
+        async for event in chat_events(req):
+            yield encode(event)
+
+    return StreamingResponse(
+        generate(),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/chat/{session_id}/history")
-async def get_chat_history(session_id: str):
-    """Return conversation history for the given session (best-effort)."""
+async def get_chat_history(
+    session_id: str,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    compact: bool = False,
+):
+    """
+    Return one page of conversation history for the given session, oldest first.
+
+    Pass the returned `next_cursor` as `cursor` to get the next page; it is
+    null on the last page. `fields` selects a subset of each event (e.g.
+    "author,text,timestamp") instead of the whole ADK event; `compact`
+    keeps only tool names, not tool arguments or responses. The session
+    state is included on the first page only.
+    """
     user_id = str(session_id)
     app_name = ng12_app.name
     try:
-        session = await ng12_session_service.get_session(app_name=app_name, user_id=user_id, session_id=session_id)
+        selected = parse_fields(fields)
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return {"error": str(e)}
+    try:
+        # One extra event tells whether another page follows.
+        events = await ng12_session_service.list_events(
+            app_name=app_name, user_id=user_id, session_id=session_id, after=after, limit=limit + 1
+        )
+        state = None
+        if events is not None and cursor is None:
+            session = await ng12_session_service.get_session(
+                app_name=app_name, user_id=user_id, session_id=session_id,
+                config=GetSessionConfig(num_recent_events=0),
+            )
+            state = session.state if session is not None else {}
     except Exception as e:
         logger.exception("Error fetching session %s: %s", session_id, e)
         return {"error": "session not found or session service error"}
+    if events is None:
+        # Never created, deleted, or evicted by the session store limits.
+        return {"error": "session not found or session service error"}
 
-    # Prefer the session events (ADK sessions store events)
     try:
-        events = getattr(session, "events", None)
-        if events:
-            serialized = []
-            for ev in events:
-                try:
-                    if hasattr(ev, "to_dict"):
-                        ev_dict = ev.to_dict()
-                    else:
-                        ev_dict = ev.__dict__
-                except Exception:
-                    ev_dict = str(ev)
-                serialized.append(ev_dict)
-
-            return {"session_id": session_id, "events": serialized, "state": getattr(session, "state", {})}
-
-        # No events — return session state if available
-        return {"session_id": session_id, "state": getattr(session, "state", {})}
+        items, next_cursor = history_page(events, limit, selected, compact)
+        body = {"session_id": session_id, "events": items, "next_cursor": next_cursor}
+        if cursor is None:
+            body["state"] = state
+        return Response(dump_history(body), media_type="application/json")
     except Exception as e:
         logger.exception("Unable to serialize session %s: %s", session_id, e)
         return {"error": "unable to retrieve session history"}
@@ -164,3 +702,4 @@ async def delete_chat_session(session_id: str):
     
 
 
+startup_report.record("import", time.perf_counter() - _import_started)
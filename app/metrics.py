@@ -0,0 +1,329 @@
+"""
+In-process metrics and request traces, exported in Prometheus text format.
+
+Stages of a request (embedding calls, vector queries, patient lookups, LLM
+turns, tool calls) are recorded with `span`/`record_span`. Each span is
+observed into a labelled histogram and, when the current request is being
+traced, appended to its `Trace` for JSON export.
+"""
+
+import json
+import logging
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+# Request-scoped tags; set by the HTTP middleware and the ADK plugin.
+current_endpoint: ContextVar[str] = ContextVar("current_endpoint", default="none")
+current_agent: ContextVar[str] = ContextVar("current_agent", default="none")
+current_trace: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic counter with a fixed set of label names."""
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0.0)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items]
+
+
+class Gauge(Counter):
+    """Value that is set rather than accumulated (e.g. a one-off duration)."""
+
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a fixed set of label names."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple, list] = {}  # key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels) -> int:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            return series[-1] if series else 0
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        lines = []
+        for key, series in items:
+            for bound, count in zip(self.buckets, series):
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [le])} {count}")
+            inf = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [inf])} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named collection of metrics rendered together for `/metrics`."""
+
+    def __init__(self):
+        self._metrics: "OrderedDict[str, Counter | Gauge | Histogram]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames=()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames=()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "ng12_http_request_duration_seconds",
+    "HTTP request latency including the streamed body.",
+    ("endpoint", "method", "status"),
+)
+TTFB_SECONDS = REGISTRY.histogram(
+    "ng12_http_time_to_first_byte_seconds",
+    "Time from receiving a request to sending the first byte of its response body.",
+    ("endpoint", "method"),
+)
+STAGE_SECONDS = REGISTRY.histogram(
+    "ng12_stage_duration_seconds",
+    "Latency of one request stage (embedding, vector_query, lexical_query, context_pack, symptom_lookup, patient_lookup, llm_turn, tool_call).",
+    ("stage", "name", "endpoint", "agent", "status"),
+)
+LLM_TOKENS = REGISTRY.counter(
+    "ng12_llm_tokens_total",
+    "Tokens reported by the model per LLM turn.",
+    ("kind", "endpoint", "agent"),
+)
+CONTEXT_TOKENS = REGISTRY.counter(
+    "ng12_context_tokens_total",
+    "Guideline-context tokens returned by search tools, before (retrieved) and after (packed) packing, "
+    "labelled with the encoding that counted them (cl100k_base, or regex-fallback word counts without tiktoken).",
+    ("stage", "encoding"),
+)
+SESSION_EVICTIONS = REGISTRY.counter(
+    "ng12_chat_session_evictions_total",
+    "Chat sessions evicted from the session store, by reason (idle, max_sessions, max_bytes).",
+    ("store", "reason"),
+)
+SESSION_COUNT = REGISTRY.gauge(
+    "ng12_chat_sessions",
+    "Chat sessions held by the session store.",
+    ("store",),
+)
+SESSION_BYTES = REGISTRY.gauge(
+    "ng12_chat_session_bytes",
+    "Approximate size of the stored chat sessions (state and event JSON).",
+    ("store",),
+)
+STARTUP_SECONDS = REGISTRY.gauge(
+    "ng12_startup_seconds",
+    "Time spent in each startup phase (import, lifespan, warmup) and warm-up step.",
+    ("phase",),
+)
+
+
+class Trace:
+    """Spans recorded for one traced request, exportable as JSON."""
+
+    def __init__(self, endpoint: str, trace_id: Optional[str] = None):
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.endpoint = endpoint
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.duration_s: Optional[float] = None
+        self.ttfb_s: Optional[float] = None
+        self.status: Optional[int] = None
+        self.spans: list[dict] = []
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, name: str, start: float, duration: float, status: str, attributes: dict):
+        span = {
+            "stage": stage,
+            "name": name,
+            "agent": current_agent.get(),
+            "start_ms": round((start - self._started) * 1000, 3),
+            "duration_ms": round(duration * 1000, 3),
+            "status": status,
+        }
+        if attributes:
+            span["attributes"] = attributes
+        with self._lock:
+            self.spans.append(span)
+
+    def finish(self, status: int):
+        self.status = status
+        self.duration_s = time.perf_counter() - self._started
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ms"])
+        return {
+            "trace_id": self.trace_id,
+            "endpoint": self.endpoint,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_s * 1000, 3) if self.duration_s is not None else None,
+            "ttfb_ms": round(self.ttfb_s * 1000, 3) if self.ttfb_s is not None else None,
+            "status": self.status,
+            "spans": spans,
+        }
+
+
+class TraceStore:
+    """
+    The most recent finished traces, optionally also written to disk.
+
+    Args:
+        maxsize: Traces kept in memory for `GET /traces/{trace_id}`.
+        export_dir: Directory to write `<trace_id>.json` files to, or None.
+    """
+
+    def __init__(self, maxsize: int = 100, export_dir=None):
+        self.maxsize = maxsize
+        self.export_dir = Path(export_dir) if export_dir else None
+        self._traces: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, trace: Trace):
+        data = trace.to_dict()
+        with self._lock:
+            self._traces[trace.trace_id] = data
+            while len(self._traces) > self.maxsize:
+                self._traces.popitem(last=False)
+        if self.export_dir is not None:
+            try:
+                self.export_dir.mkdir(parents=True, exist_ok=True)
+                (self.export_dir / f"{trace.trace_id}.json").write_text(json.dumps(data), encoding="utf-8")
+            except OSError:
+                logger.exception("Unable to export trace %s", trace.trace_id)
+
+    def get(self, trace_id: str) -> Optional[dict]:
+        with self._lock:
+            return self._traces.get(trace_id)
+
+
+def record_span(stage: str, name: str, start: float, duration: float, status: str = "ok", **attributes):
+    """Record a finished span that was timed elsewhere (e.g. across ADK callbacks)."""
+    STAGE_SECONDS.observe(
+        duration,
+        stage=stage,
+        name=name,
+        endpoint=current_endpoint.get(),
+        agent=current_agent.get(),
+        status=status,
+    )
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(stage, name, start, duration, status, attributes)
+
+
+@contextmanager
+def span(stage: str, name: str = "", **attributes):
+    """
+    Time the enclosed block as one stage of the current request.
+
+    Yields the attributes dict, so callers can attach values (e.g. result
+    counts) that are only known at the end of the block.
+    """
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield attributes
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        record_span(stage, name, start, time.perf_counter() - start, status, **attributes)
@@ -1,14 +1,11 @@
 from google.adk.agents import Agent
 from google.adk.apps.app import App, EventsCompactionConfig
-import vertexai
-from app.config import GCP_PROJECT, GCP_REGION
-import os
-from app.tools.nice_guideline_tool import search_nice_ng12_guidelines
+from app.tools.nice_guideline_tool import search_nice_ng12_guidelines, search_nice_ng12_guidelines_batch
 from app.prompts import load_system_prompt
 from pydantic import BaseModel
 from google.adk.plugins.logging_plugin import LoggingPlugin
 from typing import List
-from app.vertexai_utils import init_vertexai
+from app.instrumentation import InstrumentationPlugin
 
 rag_prompt = load_system_prompt("NG12_AGENT")
 
@@ -23,16 +20,13 @@ class NG12Response(BaseModel):
     answer: str
     citations: List[Citation] = []  # Empty array if no results found
 
-init_vertexai()
-
-
-
+# Only declarations here: Vertex AI is initialized by whoever first runs the app (see main.get_runner).
 ng12_agent = Agent(
     name="ng12_agent",
     model="gemini-2.5-flash-lite",
     instruction=rag_prompt,
     description="Agent to search NICE NG12 guidelines for relevant information.",
-    tools=[search_nice_ng12_guidelines],
+    tools=[search_nice_ng12_guidelines, search_nice_ng12_guidelines_batch],
     output_schema=NG12Response,
 )
 
@@ -42,6 +36,7 @@ ng12_app = App( name="ng12_agent_compacting_app",
         overlap_size=1,  # Keep 1 previous turn for context
     ), 
     plugins=[
-        LoggingPlugin()# adds logging capabilities for obervabilities
+        LoggingPlugin(),# adds logging capabilities for obervabilities
+        InstrumentationPlugin(),  # per-turn and per-tool latency and token metrics
     ])
 
@@ -0,0 +1,233 @@
+"""Indexed, hot-reloadable patient record store."""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Pulls the id out of an NDJSON line without parsing the whole record.
+_PATIENT_ID_RE = re.compile(rb'"patient_id"\s*:\s*"((?:[^"\\]|\\.)*)"')
+_READ_SIZE = 4096
+
+
+class _JsonSnapshot:
+    """Whole JSON array parsed once and indexed by patient_id."""
+
+    format = "json"
+
+    def __init__(self, path: Path, stat: os.stat_result):
+        self.mtime_ns = stat.st_mtime_ns
+        self.size = stat.st_size
+        with open(path, encoding="utf-8") as f:
+            records = json.load(f)
+        self._records = {r.get("patient_id"): r for r in records}
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def get(self, patient_id: str) -> dict | None:
+        return self._records.get(patient_id)
+
+    def iter_records(self):
+        yield from self._records.values()
+
+
+class _NdjsonSnapshot:
+    """
+    Byte-offset index over an NDJSON file; records are parsed on demand.
+
+    The snapshot keeps its own file handle open, so readers holding an old
+    snapshot keep reading the file it was built from even after the path
+    has been atomically replaced.
+    """
+
+    format = "ndjson"
+
+    def __init__(self, path: Path, stat: os.stat_result):
+        self.mtime_ns = stat.st_mtime_ns
+        self.size = stat.st_size
+        self._file = open(path, "rb")
+        self._read_lock = threading.Lock()
+        self._offsets: dict[str, int] = {}
+
+        offset = 0
+        for line in self._file:
+            patient_id = self._extract_id(line)
+            if patient_id is not None:
+                self._offsets[patient_id] = offset
+            offset += len(line)
+
+    @staticmethod
+    def _extract_id(line: bytes) -> str | None:
+        if not line.strip():
+            return None
+        match = _PATIENT_ID_RE.search(line)
+        if match:
+            raw = match.group(1)
+            return json.loads(b'"' + raw + b'"') if b"\\" in raw else raw.decode("utf-8")
+        return json.loads(line).get("patient_id")
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __del__(self):
+        file = getattr(self, "_file", None)
+        if file is not None:
+            file.close()
+
+    def _read_line(self, offset: int) -> bytes:
+        parts = []
+        while True:
+            if hasattr(os, "pread"):
+                block = os.pread(self._file.fileno(), _READ_SIZE, offset)
+            else:
+                with self._read_lock:
+                    self._file.seek(offset)
+                    block = self._file.read(_READ_SIZE)
+            end = block.find(b"\n")
+            if end != -1 or not block:
+                parts.append(block if end == -1 else block[:end])
+                return b"".join(parts)
+            parts.append(block)
+            offset += len(block)
+
+    def get(self, patient_id: str) -> dict | None:
+        offset = self._offsets.get(patient_id)
+        if offset is None:
+            return None
+        record = json.loads(self._read_line(offset))
+        if record.get("patient_id") != patient_id:
+            raise ValueError(f"Patient index is stale for {patient_id}")
+        return record
+
+    def iter_records(self):
+        for offset in self._offsets.values():
+            yield json.loads(self._read_line(offset))
+
+
+class PatientStore:
+    """
+    Patient records indexed by `patient_id` for O(1) lookup.
+
+    Accepts either a JSON array (like `patients.json`) or NDJSON with one
+    record per line; NDJSON files are indexed by byte offset and each
+    record is only parsed when it is requested. At most every
+    `check_interval` seconds a lookup stats the file, and if its mtime or
+    size changed a new index is built in a background thread and swapped
+    in atomically. Readers never wait on a reload: they keep using the
+    previous index until the new one is ready. Only the first load, and a
+    rebuild after an NDJSON file was rewritten in place (its offsets are
+    then wrong), happen on the calling thread.
+
+    Args:
+        path: JSON or NDJSON patient file.
+        check_interval: Minimum seconds between file change checks.
+    """
+
+    def __init__(self, path, check_interval: float = 1.0):
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self.reloads = 0
+        self._snapshot = None
+        self._last_check = 0.0
+        self._reload_lock = threading.Lock()
+        self._reload_thread: threading.Thread | None = None
+
+    def _build(self, stat: os.stat_result):
+        with open(self.path, "rb") as f:
+            head = f.read(64).lstrip()
+        snapshot_cls = _JsonSnapshot if head.startswith(b"[") else _NdjsonSnapshot
+        started = time.perf_counter()
+        snapshot = snapshot_cls(self.path, stat)
+        logger.info(
+            "Indexed %d patients from %s (%s) in %.1f ms",
+            len(snapshot), self.path, snapshot.format, (time.perf_counter() - started) * 1000,
+        )
+        return snapshot
+
+    def reload(self, force: bool = False, wait: bool = True):
+        """
+        Rebuild the index if the file changed (or unconditionally with `force`).
+
+        With `wait=False` and an index already loaded, the rebuild runs in a
+        background thread and the current index is returned straight away;
+        it is swapped out once the new one is ready.
+        """
+        current = self._snapshot
+        try:
+            stat = self.path.stat()
+        except OSError:
+            if current is None:
+                raise
+            logger.warning("Patient data file %s is missing, serving previous index", self.path)
+            return current
+        if not force and current is not None and (current.mtime_ns, current.size) == (stat.st_mtime_ns, stat.st_size):
+            return current
+        # Only the first load blocks; later reloads are skipped if one is already running.
+        if not self._reload_lock.acquire(blocking=current is None):
+            return current
+        if current is not None and not wait:
+            self._reload_thread = threading.Thread(
+                target=self._swap_and_release, args=(current, stat, force), name="patient-store-reload", daemon=True
+            )
+            self._reload_thread.start()
+            return current
+        return self._swap_and_release(current, stat, force)
+
+    def _swap_and_release(self, current, stat: os.stat_result, force: bool):
+        try:
+            if self._snapshot is not current and not force:
+                return self._snapshot
+            try:
+                self._snapshot = self._build(stat)
+            except (OSError, ValueError):
+                if current is None:
+                    raise
+                # Likely a half-written file; keep serving the previous index.
+                logger.exception("Unable to reload patient data from %s", self.path)
+                return current
+            self.reloads += 1
+            return self._snapshot
+        finally:
+            self._reload_lock.release()
+
+    def wait_for_reload(self, timeout: float | None = None):
+        """Block until a background reload started by a lookup has finished."""
+        thread = self._reload_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _current(self):
+        now = time.monotonic()
+        if self._snapshot is None or now - self._last_check >= self.check_interval:
+            self._last_check = now
+            return self.reload(wait=False)
+        return self._snapshot
+
+    def get(self, patient_id: str) -> dict | None:
+        """Return the record for `patient_id`, or None if it is not in the file."""
+        try:
+            return self._current().get(patient_id)
+        except ValueError:
+            # The file was rewritten in place under an NDJSON index; rebuild and retry once.
+            return self.reload(force=True).get(patient_id)
+
+    def iter_records(self):
+        yield from self._current().iter_records()
+
+    def __len__(self) -> int:
+        return len(self._current())
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "path": str(self.path),
+            "format": snapshot.format if snapshot else None,
+            "records": len(snapshot) if snapshot else 0,
+            "reloads": self.reloads,
+        }
@@ -0,0 +1,356 @@
+"""
+Deterministic NG12 pre-screen that decides clear-cut cases without the LLM.
+
+A small subset of NICE NG12 recommendations is compiled into predicates
+over the structured fields returned by `get_patient_data`. A patient that
+matches a referral/investigation rule, or clearly falls outside every
+rule, gets an `AssessmentResponse` straight from the engine; anything
+else returns None and is left to `assess_agent`.
+"""
+
+import logging
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from app.text import normalize_text
+
+logger = logging.getLogger(__name__)
+
+URGENT_REFERRAL = "urgent referral"
+URGENT_INVESTIGATION = "urgent investigation"
+# NG12 "Consider ..." recommendations: a referral left to clinical judgement.
+CONSIDER_REFERRAL = "consider referral"
+NO_URGENT_ACTION = "no urgent action"
+
+# Lower value wins when several rules match.
+_SEVERITY = {URGENT_REFERRAL: 0, URGENT_INVESTIGATION: 1, CONSIDER_REFERRAL: 2, NO_URGENT_ACTION: 3}
+
+# A symptom phrase is negated when one of these cues precedes it in the same clause
+# ("no haemoptysis", "denies chest pain", "cough but no fever").
+_NEGATION_CUE = r"(?:no|not|denies|denied|without|negative for|absence of|free of)"
+_NEGATED_CLAUSE_RE = re.compile(rf"\b{_NEGATION_CUE}\b(?:(?!\bbut\b)[^,;.])*$")
+_NEGATED_SYMPTOM_RE = re.compile(rf"{_NEGATION_CUE}\b")
+# A clause that attributes the symptom to a cause ("explained cough due to asthma")
+# no longer meets NG12's "unexplained" criteria.
+_EXPLAINED_RE = re.compile(
+    r"\b(?:explained|due to|secondary to|caused by|attributed to|attributable to|because of)\b"
+)
+_CLAUSE_BREAK_RE = re.compile(r"[,;.]")
+
+# Smoking history is only read from explicit phrases; anything else is unknown.
+_EVER_SMOKED_RE = re.compile(r"(?:(?:current|ex|former)[- ]?)?smoker")
+_NEVER_SMOKED_RE = re.compile(r"never(?:[- ]?smok(?:ed|er))?|non[- ]?smoker")
+
+# Symptom vocabulary: canonical term -> phrases that indicate it (after normalization).
+SYMPTOM_TERMS = {
+    "hemoptysis": ("hemoptysis", "coughing up blood"),
+    "cough": ("cough",),
+    "fatigue": ("fatigue", "tiredness"),
+    "shortness of breath": ("shortness of breath", "breathless", "dyspnea", "dyspnoea"),
+    "chest pain": ("chest pain",),
+    "weight loss": ("weight loss",),
+    "appetite loss": ("appetite loss", "loss of appetite"),
+    "dysphagia": ("dysphagia", "difficulty swallowing"),
+    "upper abdominal pain": ("upper abdominal pain",),
+    "reflux": ("reflux",),
+    "dyspepsia": ("dyspepsia", "indigestion"),
+    "iron-deficiency anemia": ("iron-deficiency anemia", "iron deficiency anemia"),
+    "breast lump": ("breast lump",),
+    "visible hematuria": ("visible hematuria",),
+    "hoarseness": ("hoarseness",),
+    "sore throat": ("sore throat",),
+    "runny nose": ("runny nose", "nasal congestion", "blocked nose"),
+    "fever": ("fever",),
+}
+
+LUNG_XRAY_SYMPTOMS = frozenset(
+    {"cough", "fatigue", "shortness of breath", "chest pain", "weight loss", "appetite loss"}
+)
+# Self-limiting symptoms that no NG12 recommendation acts on below age 40.
+MINOR_SYMPTOMS = frozenset({"cough", "sore throat", "runny nose", "fever"})
+
+
+def _negated(text: str, position: int) -> bool:
+    return _NEGATED_CLAUSE_RE.search(text, 0, position) is not None
+
+
+def _explained(text: str, start: int, end: int) -> bool:
+    breaks = [m.end() for m in _CLAUSE_BREAK_RE.finditer(text, 0, start)]
+    following = _CLAUSE_BREAK_RE.search(text, end)
+    clause = text[breaks[-1] if breaks else 0:following.start() if following else len(text)]
+    return _EXPLAINED_RE.search(clause) is not None
+
+
+def _smoking_status(value) -> Optional[bool]:
+    if not isinstance(value, str):
+        return None
+    text = normalize_text(value)
+    if _NEVER_SMOKED_RE.fullmatch(text):
+        return False
+    if _EVER_SMOKED_RE.fullmatch(text):
+        return True
+    return None
+
+
+def symptom_terms(symptoms) -> frozenset:
+    """
+    Map free-text symptoms to canonical terms; unknown symptoms map to themselves.
+
+    Negated mentions ("no haemoptysis") are skipped, as are unknown symptoms
+    that start with a negation cue. A mention attributed to a cause
+    ("explained cough due to asthma") does not map to its canonical term;
+    the symptom is kept verbatim so no rule treats it as a known symptom.
+    """
+    terms = set()
+    for symptom in symptoms or []:
+        text = normalize_text(str(symptom))
+        mentioned = explained = False
+        for term, phrases in SYMPTOM_TERMS.items():
+            for phrase in phrases:
+                for match in re.finditer(rf"\b{re.escape(phrase)}\b", text):
+                    mentioned = True
+                    if _negated(text, match.start()):
+                        continue
+                    if _explained(text, match.start(), match.end()):
+                        explained = True
+                    else:
+                        terms.add(term)
+        if explained or (not mentioned and not _NEGATED_SYMPTOM_RE.match(text)):
+            terms.add(text)
+    # "non-visible haematuria" must not count as visible haematuria.
+    if any("non-visible" in normalize_text(str(s)) for s in symptoms or []):
+        terms.discard("visible hematuria")
+    return frozenset(terms)
+
+
+@dataclass(frozen=True)
+class PatientFacts:
+    """Fields a rule may look at, derived once per patient record."""
+    patient_id: str
+    age: Optional[int]
+    gender: str
+    ever_smoked: Optional[bool]
+    symptoms: frozenset
+    duration_days: Optional[int]
+
+    @classmethod
+    def from_record(cls, record: dict) -> "PatientFacts":
+        age = record.get("age")
+        duration = record.get("symptom_duration_days")
+        return cls(
+            patient_id=str(record.get("patient_id", "")),
+            age=age if isinstance(age, int) else None,
+            gender=str(record.get("gender") or "").casefold(),
+            ever_smoked=_smoking_status(record.get("smoking_history")),
+            symptoms=symptom_terms(record.get("symptoms")),
+            duration_days=duration if isinstance(duration, int) else None,
+        )
+
+
+@dataclass(frozen=True)
+class Rule:
+    """
+    One NG12 recommendation expressed as a predicate.
+
+    `justification` is the guideline text quoted in the response and
+    `references` are the NG12 chunks it comes from.
+    """
+    name: str
+    recommendation: str
+    justification: str
+    references: tuple
+    predicate: Callable[[PatientFacts], bool] = field(compare=False)
+
+
+def _ref(page: int, chunk_id: str) -> dict:
+    return {"source": "NG12 PDF", "page": page, "chunk_id": chunk_id}
+
+
+def _aged(facts: PatientFacts, minimum: int) -> bool:
+    return facts.age is not None and facts.age >= minimum
+
+
+RULES: tuple[Rule, ...] = (
+    Rule(
+        name="lung_haemoptysis_40",
+        recommendation=URGENT_REFERRAL,
+        justification=(
+            "1.1.1 Refer people using a suspected cancer pathway referral for lung cancer if they "
+            "are aged 40 and over with unexplained haemoptysis. [2015]"
+        ),
+        references=(_ref(9, "ng12_0009_08"),),
+        predicate=lambda f: _aged(f, 40) and "hemoptysis" in f.symptoms,
+    ),
+    Rule(
+        name="oesophageal_dysphagia",
+        recommendation=URGENT_REFERRAL,
+        justification=(
+            "1.2.1 Refer people using a suspected cancer pathway referral for oesophageal cancer "
+            "if they have dysphagia. [2015, amended 2025]"
+        ),
+        references=(_ref(11, "ng12_0011_10"),),
+        predicate=lambda f: "dysphagia" in f.symptoms,
+    ),
+    Rule(
+        name="oesophageal_weight_loss_55",
+        recommendation=URGENT_REFERRAL,
+        justification=(
+            "1.2.1 Refer people using a suspected cancer pathway referral for oesophageal cancer "
+            "if they are aged 55 and over, with weight loss, and they have any of the following: "
+            "upper abdominal pain, reflux, dyspepsia. [2015, amended 2025]"
+        ),
+        references=(_ref(11, "ng12_0011_10"),),
+        predicate=lambda f: (
+            _aged(f, 55)
+            and "weight loss" in f.symptoms
+            and bool(f.symptoms & {"upper abdominal pain", "reflux", "dyspepsia"})
+        ),
+    ),
+    Rule(
+        name="breast_lump_30",
+        recommendation=URGENT_REFERRAL,
+        justification=(
+            "1.4.1 Refer people using a suspected cancer pathway referral for breast cancer if they "
+            "are aged 30 and over and have an unexplained breast lump with or without pain. [2015]"
+        ),
+        references=(_ref(16, "ng12_0016_15"),),
+        predicate=lambda f: _aged(f, 30) and "breast lump" in f.symptoms,
+    ),
+    Rule(
+        name="bladder_visible_haematuria_45",
+        recommendation=URGENT_REFERRAL,
+        justification=(
+            "1.6.4 Refer people using a suspected cancer pathway referral for bladder cancer if they "
+            "are aged 45 and over and have unexplained visible haematuria without urinary tract "
+            "infection. [2015]"
+        ),
+        references=(_ref(21, "ng12_0021_20"),),
+        predicate=lambda f: _aged(f, 45) and "visible hematuria" in f.symptoms,
+    ),
+    Rule(
+        name="laryngeal_hoarseness_45",
+        recommendation=CONSIDER_REFERRAL,
+        justification=(
+            "1.8.1 Consider a suspected cancer pathway referral for laryngeal cancer in people aged "
+            "45 and over with persistent unexplained hoarseness. [2015]"
+        ),
+        references=(_ref(24, "ng12_0024_23"),),
+        predicate=lambda f: _aged(f, 45) and "hoarseness" in f.symptoms,
+    ),
+    Rule(
+        name="lung_chest_xray_40",
+        recommendation=URGENT_INVESTIGATION,
+        justification=(
+            "1.1.2 Offer an urgent chest X-ray (to be done within 2 weeks) to assess for lung cancer "
+            "in people aged 40 and over if they have 2 or more of the following unexplained symptoms, "
+            "or if they have ever smoked and have 1 or more of the following unexplained symptoms: "
+            "cough, fatigue, shortness of breath, chest pain, weight loss, appetite loss. [2015]"
+        ),
+        references=(_ref(9, "ng12_0009_08"),),
+        predicate=lambda f: _aged(f, 40) and (
+            len(f.symptoms & LUNG_XRAY_SYMPTOMS) >= 2
+            or (f.ever_smoked is True and len(f.symptoms & LUNG_XRAY_SYMPTOMS) >= 1)
+        ),
+    ),
+    Rule(
+        name="colorectal_iron_deficiency_anaemia",
+        recommendation=URGENT_INVESTIGATION,
+        justification=(
+            "1.3.1 Offer quantitative faecal immunochemical testing (FIT) to guide referral for "
+            "suspected colorectal cancer in adults with iron-deficiency anaemia."
+        ),
+        references=(_ref(14, "ng12_0014_13"), _ref(15, "ng12_0015_14")),
+        predicate=lambda f: _aged(f, 18) and "iron-deficiency anemia" in f.symptoms,
+    ),
+    Rule(
+        name="minor_symptoms_under_40",
+        recommendation=NO_URGENT_ACTION,
+        justification=(
+            "No NG12 criteria met: the patient is under 40 with short-lived, self-limiting symptoms. "
+            "NG12 1.1.2 only offers a chest X-ray for cough in people aged 40 and over."
+        ),
+        references=(_ref(9, "ng12_0009_08"),),
+        predicate=lambda f: (
+            f.age is not None
+            and 18 <= f.age < 40
+            and f.duration_days is not None
+            and f.duration_days < 21
+            and bool(f.symptoms)
+            and f.symptoms <= MINOR_SYMPTOMS
+        ),
+    ),
+)
+
+
+class PreScreener:
+    """
+    Evaluates the compiled rules and counts how often each path is taken.
+
+    Args:
+        rules: Rules to evaluate; referral rules win over investigation
+            rules, which win over "no urgent action" rules.
+    """
+
+    def __init__(self, rules=RULES):
+        self.rules = tuple(sorted(rules, key=lambda r: _SEVERITY[r.recommendation]))
+        self._lock = threading.Lock()
+        self.paths = {"rules": 0, "agent": 0}
+        self.rule_hits: dict[str, int] = {}
+
+    def assess(self, record: dict) -> Optional[dict]:
+        """
+        Return an AssessmentResponse-shaped dict if the rules decide the case,
+        otherwise None (the case needs the LLM agent).
+        """
+        decision = self._decide(record)
+        with self._lock:
+            self.paths["rules" if decision else "agent"] += 1
+        return decision
+
+    def _decide(self, record: dict) -> Optional[dict]:
+        if not isinstance(record, dict) or "error" in record:
+            return None
+        if record.get("found") is False:
+            self._count_rule("patient_not_found")
+            return {
+                "patient_id": record.get("patient_id"),
+                "recommendation": NO_URGENT_ACTION,
+                "justification": "Patient record not found",
+                "references": [],
+            }
+
+        facts = PatientFacts.from_record(record)
+        matched = [rule for rule in self.rules if rule.predicate(facts)]
+        if not matched:
+            return None
+
+        recommendation = matched[0].recommendation
+        chosen = [rule for rule in matched if rule.recommendation == recommendation]
+        references = []
+        for rule in chosen:
+            self._count_rule(rule.name)
+            references.extend(ref for ref in rule.references if ref not in references)
+        logger.info("Pre-screen decided %s: %s (%s)", facts.patient_id, recommendation,
+                    ", ".join(rule.name for rule in chosen))
+        return {
+            "patient_id": facts.patient_id,
+            "recommendation": recommendation,
+            "justification": " ".join(rule.justification for rule in chosen),
+            "references": [dict(ref) for ref in references],
+        }
+
+    def _count_rule(self, name: str):
+        with self._lock:
+            self.rule_hits[name] = self.rule_hits.get(name, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = sum(self.paths.values())
+            return {
+                "rules": self.paths["rules"],
+                "agent": self.paths["agent"],
+                "rules_share": self.paths["rules"] / total if total else 0.0,
+                "rule_hits": dict(self.rule_hits),
+            }
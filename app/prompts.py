@@ -1,4 +1,5 @@
 from pathlib import Path
+import hashlib
 import re
 
 PROMPT_PATH = Path(__file__).parent / "PROMPTS.md"
@@ -21,4 +22,21 @@ def load_system_prompt(section: str) -> str:
     if not match:
         raise ValueError(f"Prompt section '{section}' not found in PROMPTS.md")
 
-    return match.group(1).strip()
\ No newline at end of file
+    return match.group(1).strip()
+
+
+_prompt_hashes: dict[str, tuple[int, str]] = {}
+
+def prompt_hash(section: str) -> str:
+    """
+    Return a SHA-256 of a prompt section, recomputed only when PROMPTS.md changes.
+
+    Used to invalidate cached agent results whenever the prompt is edited.
+    """
+    mtime_ns = PROMPT_PATH.stat().st_mtime_ns
+    cached = _prompt_hashes.get(section)
+    if cached is None or cached[0] != mtime_ns:
+        digest = hashlib.sha256(load_system_prompt(section).encode("utf-8")).hexdigest()
+        cached = (mtime_ns, digest)
+        _prompt_hashes[section] = cached
+    return cached[1]
@@ -0,0 +1,334 @@
+"""Bounded ADK session services for /chat: in-memory (LRU) or SQLite-backed."""
+
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Any, Optional
+
+from google.adk.events import Event
+from google.adk.sessions import InMemorySessionService
+from google.adk.sessions.sqlite_session_service import SqliteSessionService
+
+from app.metrics import SESSION_BYTES, SESSION_COUNT, SESSION_EVICTIONS
+
+logger = logging.getLogger(__name__)
+
+EVICTION_REASONS = ("idle", "max_sessions", "max_bytes")
+
+
+class _EvictionStats:
+    """Eviction counters shared by both services, mirrored into the Prometheus metrics."""
+
+    def __init__(self, store: str):
+        self.store = store
+        self.evictions = {reason: 0 for reason in EVICTION_REASONS}
+        self._stats_lock = threading.Lock()
+
+    def _count_eviction(self, reason: str, n: int = 1):
+        with self._stats_lock:
+            self.evictions[reason] += n
+        SESSION_EVICTIONS.inc(n, store=self.store, reason=reason)
+
+    def _report_usage(self, sessions: int, size: int):
+        SESSION_COUNT.set(sessions, store=self.store)
+        SESSION_BYTES.set(size, store=self.store)
+
+
+class BoundedInMemorySessionService(InMemorySessionService, _EvictionStats):
+    """
+    `InMemorySessionService` with caps on session count and total size.
+
+    Sessions are kept in least-recently-written order. After every write,
+    sessions idle for longer than `idle_ttl` are dropped, then the least
+    recently written ones until both caps hold again; the session being
+    written is never evicted. Sizes are the JSON length of each session's
+    initial state plus its events, tracked incrementally.
+
+    Args:
+        max_sessions: Most sessions kept (0 = unlimited).
+        max_bytes: Most bytes of session state and events kept (0 = unlimited).
+        idle_ttl: Seconds without a write before a session expires (0 = never).
+    """
+
+    def __init__(self, max_sessions: int = 1000, max_bytes: int = 64 * 1024 * 1024, idle_ttl: float = 3600):
+        InMemorySessionService.__init__(self)
+        _EvictionStats.__init__(self, "memory")
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        # (app_name, user_id, session_id) -> [bytes, last write (monotonic)], oldest first
+        self._usage: "OrderedDict[tuple, list]" = OrderedDict()
+        self._total_bytes = 0
+
+    async def create_session(self, *, app_name: str, user_id: str, state: Optional[dict[str, Any]] = None,
+                             session_id: Optional[str] = None):
+        session = await super().create_session(
+            app_name=app_name, user_id=user_id, state=state, session_id=session_id
+        )
+        key = (app_name, user_id, session.id)
+        self._touch(key, len(json.dumps(state or {}, default=str)))
+        self._enforce(keep=key)
+        return session
+
+    async def get_session(self, *, app_name: str, user_id: str, session_id: str, config=None):
+        key = (app_name, user_id, session_id)
+        entry = self._usage.get(key)
+        if entry is not None and self._expired(entry, time.monotonic()):
+            self._evict(key, "idle")
+        return await super().get_session(app_name=app_name, user_id=user_id, session_id=session_id, config=config)
+
+    async def append_event(self, session, event):
+        event = await super().append_event(session=session, event=event)
+        if not event.partial:
+            key = (session.app_name, session.user_id, session.id)
+            self._touch(key, len(event.model_dump_json(exclude_none=True)))
+            self._enforce(keep=key)
+        return event
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        await super().delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+        self._forget((app_name, user_id, session_id))
+
+    async def list_events(self, *, app_name: str, user_id: str, session_id: str,
+                          after: Optional[tuple[float, str]] = None, limit: int = 100) -> Optional[list]:
+        """
+        Up to `limit` events after the (timestamp, event id) position `after`, oldest first.
+
+        Reads the stored events in place (no copy of the whole session), so
+        the cost depends on `limit`, not on the length of the conversation.
+        Returns None if the session does not exist.
+        """
+        session = self.sessions.get(app_name, {}).get(user_id, {}).get(session_id)
+        if session is None:
+            return None
+        events = session.events
+        start = 0
+        if after is not None:
+            after_ts, after_id = after
+            start = bisect_left(events, after_ts, key=lambda e: e.timestamp)
+            # Step over events sharing the cursor's timestamp, up to and including the cursor's event.
+            while start < len(events) and events[start].timestamp == after_ts:
+                start += 1
+                if events[start - 1].id == after_id:
+                    break
+        return list(events[start:start + limit])
+
+    def _touch(self, key: tuple, added_bytes: int):
+        entry = self._usage.pop(key, None) or [0, 0.0]
+        entry[0] += added_bytes
+        entry[1] = time.monotonic()
+        self._usage[key] = entry
+        self._total_bytes += added_bytes
+
+    def _forget(self, key: tuple):
+        entry = self._usage.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry[0]
+        self._report_usage(len(self._usage), self._total_bytes)
+
+    def _evict(self, key: tuple, reason: str):
+        app_name, user_id, session_id = key
+        self._delete_session_impl(app_name=app_name, user_id=user_id, session_id=session_id)
+        self._forget(key)
+        self._count_eviction(reason)
+        logger.info("Evicted chat session %s (%s)", session_id, reason)
+
+    def _expired(self, entry: list, now: float) -> bool:
+        return bool(self.idle_ttl) and now - entry[1] > self.idle_ttl
+
+    def _enforce(self, keep: tuple):
+        now = time.monotonic()
+        while self._usage:
+            key, entry = next(iter(self._usage.items()))
+            if key == keep or not self._expired(entry, now):
+                break
+            self._evict(key, "idle")
+        for key in list(self._usage):
+            if key == keep:
+                continue
+            if self.max_sessions and len(self._usage) > self.max_sessions:
+                self._evict(key, "max_sessions")
+            elif self.max_bytes and self._total_bytes > self.max_bytes:
+                self._evict(key, "max_bytes")
+            else:
+                break
+        self._report_usage(len(self._usage), self._total_bytes)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            evictions = dict(self.evictions)
+        return {
+            "store": self.store,
+            "sessions": len(self._usage),
+            "bytes": self._total_bytes,
+            "max_sessions": self.max_sessions,
+            "max_bytes": self.max_bytes,
+            "idle_ttl": self.idle_ttl,
+            "evictions": evictions,
+        }
+
+
+class BoundedSqliteSessionService(SqliteSessionService, _EvictionStats):
+    """
+    ADK's `SqliteSessionService` with the same caps and eviction order.
+
+    Sessions survive restarts and are shared by every worker that points
+    at the same file. Limits are enforced in SQL against the stored
+    sessions' `update_time` (their last write), so they hold across
+    workers; sizes are the stored state plus event JSON. Enforcement runs
+    after creating a session and at most every `enforce_interval` seconds
+    after appending events, since it scans the events table.
+
+    Args:
+        path: SQLite database file.
+        max_sessions: Most sessions kept (0 = unlimited).
+        max_bytes: Most bytes of session state and events kept (0 = unlimited).
+        idle_ttl: Seconds without a write before a session expires (0 = never).
+        enforce_interval: Minimum seconds between enforcement passes triggered by events.
+    """
+
+    def __init__(self, path, max_sessions: int = 1000, max_bytes: int = 64 * 1024 * 1024,
+                 idle_ttl: float = 3600, enforce_interval: float = 1.0):
+        SqliteSessionService.__init__(self, str(path))
+        _EvictionStats.__init__(self, "sqlite")
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.enforce_interval = enforce_interval
+        self._last_enforced = 0.0
+        self._last_usage = (0, 0)
+
+    async def create_session(self, *, app_name: str, user_id: str, state: Optional[dict[str, Any]] = None,
+                             session_id: Optional[str] = None):
+        session = await super().create_session(
+            app_name=app_name, user_id=user_id, state=state, session_id=session_id
+        )
+        await self._enforce(app_name, keep=(user_id, session.id))
+        return session
+
+    async def get_session(self, *, app_name: str, user_id: str, session_id: str, config=None):
+        session = await super().get_session(app_name=app_name, user_id=user_id, session_id=session_id, config=config)
+        if session is not None and self.idle_ttl and time.time() - session.last_update_time > self.idle_ttl:
+            await super().delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+            self._count_eviction("idle")
+            return None
+        return session
+
+    async def list_events(self, *, app_name: str, user_id: str, session_id: str,
+                          after: Optional[tuple[float, str]] = None, limit: int = 100) -> Optional[list]:
+        """
+        Up to `limit` events after the (timestamp, event id) position `after`, oldest first.
+
+        Only the requested page is read and decoded. Returns None if the
+        session does not exist.
+        """
+        async with self._get_db_connection() as db:
+            async with db.execute(
+                "SELECT 1 FROM sessions WHERE app_name=? AND user_id=? AND id=?", (app_name, user_id, session_id)
+            ) as cursor:
+                if await cursor.fetchone() is None:
+                    return None
+            where = "app_name=? AND user_id=? AND session_id=?"
+            params: list = [app_name, user_id, session_id]
+            if after is not None:
+                after_ts, after_id = after
+                async with db.execute(
+                    f"SELECT rowid FROM events WHERE {where} AND id=?", (*params, after_id)
+                ) as cursor:
+                    row = await cursor.fetchone()
+                # Ties on the timestamp are ordered by rowid (append order), as ADK does.
+                where += " AND (timestamp>? OR (timestamp=? AND rowid>?))"
+                params += [after_ts, after_ts, row[0] if row else 2**63 - 1]
+            rows = await db.execute_fetchall(
+                f"SELECT event_data FROM events WHERE {where} ORDER BY timestamp, rowid LIMIT ?", (*params, limit)
+            )
+        return [Event.model_validate_json(row[0]) for row in rows]
+
+    async def append_event(self, session, event):
+        event = await super().append_event(session=session, event=event)
+        if not event.partial and time.monotonic() - self._last_enforced >= self.enforce_interval:
+            await self._enforce(session.app_name, keep=(session.user_id, session.id))
+        return event
+
+    async def _enforce(self, app_name: str, keep: tuple):
+        self._last_enforced = time.monotonic()
+        async with self._get_db_connection() as db:
+            if self.idle_ttl:
+                cursor = await db.execute(
+                    "DELETE FROM sessions WHERE app_name=? AND update_time<? AND NOT (user_id=? AND id=?)",
+                    (app_name, time.time() - self.idle_ttl, *keep),
+                )
+                if cursor.rowcount > 0:
+                    self._count_eviction("idle", cursor.rowcount)
+
+            # Oldest first: (user_id, id, bytes); events are removed with their session (ON DELETE CASCADE).
+            async with db.execute(
+                """
+                SELECT s.user_id, s.id, length(s.state) + coalesce(sum(length(e.event_data)), 0) AS size
+                FROM sessions s LEFT JOIN events e
+                  ON e.app_name = s.app_name AND e.user_id = s.user_id AND e.session_id = s.id
+                WHERE s.app_name=?
+                GROUP BY s.user_id, s.id
+                ORDER BY s.update_time
+                """,
+                (app_name,),
+            ) as cursor:
+                rows = [(row[0], row[1], row[2]) for row in await cursor.fetchall()]
+            count = len(rows)
+            total = sum(size for _, _, size in rows)
+            for user_id, session_id, size in rows:
+                if (user_id, session_id) == keep:
+                    continue
+                if self.max_sessions and count > self.max_sessions:
+                    reason = "max_sessions"
+                elif self.max_bytes and total > self.max_bytes:
+                    reason = "max_bytes"
+                else:
+                    break
+                await db.execute(
+                    "DELETE FROM sessions WHERE app_name=? AND user_id=? AND id=?",
+                    (app_name, user_id, session_id),
+                )
+                count -= 1
+                total -= size
+                self._count_eviction(reason)
+                logger.info("Evicted chat session %s (%s)", session_id, reason)
+            await db.commit()
+        self._last_usage = (count, total)
+        self._report_usage(count, total)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            evictions = dict(self.evictions)
+        sessions, size = self._last_usage
+        return {
+            "store": self.store,
+            "path": self._db_path,
+            "sessions": sessions,  # as of the last enforcement pass
+            "bytes": size,
+            "max_sessions": self.max_sessions,
+            "max_bytes": self.max_bytes,
+            "idle_ttl": self.idle_ttl,
+            "evictions": evictions,
+        }
+
+
+def create_session_service(kind: str, path=None, **limits):
+    """
+    Build the /chat session service selected by SESSION_STORE.
+
+    Args:
+        kind: "memory" or "sqlite".
+        path: SQLite file (required for "sqlite").
+        **limits: max_sessions, max_bytes and idle_ttl.
+    """
+    if kind == "memory":
+        return BoundedInMemorySessionService(**limits)
+    if kind == "sqlite":
+        if not path:
+            raise ValueError("SESSION_DB_PATH is required when SESSION_STORE=sqlite")
+        return BoundedSqliteSessionService(path, **limits)
+    raise ValueError(f"Unknown session store '{kind}', expected 'memory' or 'sqlite'")
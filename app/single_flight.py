@@ -0,0 +1,147 @@
+"""
+Single-flight coalescing: concurrent identical calls share one execution.
+
+A flight exists only while its call is running. Every caller that arrives
+meanwhile gets the same outcome, result or exception, and the next call
+after it finishes starts afresh, so a failure never sticks to the key.
+"""
+
+import asyncio
+import copy
+import threading
+from typing import Any, AsyncIterator, Callable, Hashable
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls of blocking functions by key (thread-safe).
+
+    Callers that join a running flight get a deep copy of the leader's
+    result, so none of them can mutate what another one receives.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Return `fn()`, or the result of an identical call already in flight."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+            else:
+                self.shared += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"executions": self.executions, "shared": self.shared, "in_flight": len(self._calls)}
+
+
+class _Stream:
+    def __init__(self):
+        self.parts: list = []
+        self.error: BaseException | None = None
+        self.finished = False
+        self.changed = asyncio.Condition()
+        self.subscribers = 0
+        self.task: asyncio.Task | None = None
+
+
+class AsyncStreamFlight:
+    """
+    Coalesce concurrent async streams by key within one event loop.
+
+    The first caller's stream runs as a background task; every caller,
+    including it, replays the parts produced so far and then follows the
+    new ones as they arrive, so all of them stream at the leader's pace. A
+    stream's exception is raised to each caller after its last part. The
+    task keeps running while any caller is still reading it (so one
+    client disconnecting does not cut off the others) and is cancelled
+    once the last one goes away.
+    """
+
+    def __init__(self):
+        self._streams: dict[Hashable, _Stream] = {}
+        self.executions = 0
+        self.shared = 0
+
+    def _forget(self, key: Hashable, stream: _Stream):
+        if self._streams.get(key) is stream:
+            del self._streams[key]
+
+    async def _run(self, key: Hashable, stream: _Stream, factory: Callable[[], AsyncIterator]):
+        try:
+            async for part in factory():
+                async with stream.changed:
+                    stream.parts.append(part)
+                    stream.changed.notify_all()
+        except BaseException as e:
+            stream.error = e
+        finally:
+            self._forget(key, stream)
+            async with stream.changed:
+                stream.finished = True
+                stream.changed.notify_all()
+
+    async def stream(self, key: Hashable, factory: Callable[[], AsyncIterator]) -> AsyncIterator:
+        """Yield the parts of `factory()`, shared with identical in-flight calls."""
+        stream = self._streams.get(key)
+        if stream is None:
+            stream = self._streams[key] = _Stream()
+            self.executions += 1
+            stream.task = asyncio.create_task(self._run(key, stream, factory))
+        else:
+            self.shared += 1
+
+        stream.subscribers += 1
+        sent = 0
+        try:
+            while True:
+                async with stream.changed:
+                    await stream.changed.wait_for(lambda: stream.finished or len(stream.parts) > sent)
+                    parts, finished = stream.parts[sent:], stream.finished
+                for part in parts:
+                    yield part
+                sent += len(parts)
+                if finished and sent == len(stream.parts):
+                    break
+        finally:
+            stream.subscribers -= 1
+            if not stream.subscribers and not stream.finished:
+                self._forget(key, stream)
+                stream.task.cancel()
+        if stream.error is not None:
+            raise stream.error
+
+    def stats(self) -> dict:
+        return {"executions": self.executions, "shared": self.shared, "in_flight": len(self._streams)}
@@ -0,0 +1,114 @@
+"""Startup timings and the optional background warm-up behind `/ready`."""
+
+import logging
+import threading
+import time
+from typing import Callable
+
+from app.metrics import STARTUP_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class StartupReport:
+    """
+    Records how long the app took to import and start, and runs the warm-up.
+
+    The warm-up loads the heavy clients (Vertex AI, agents, vector store,
+    indexes) one step at a time so the first request does not pay for
+    them. A failing step is logged and reported but does not stop the
+    others. Failed steps are retried in the background (and lazily on first
+    use); the steps are once-only initializers, so a retry after a request
+    has already initialized the client succeeds at once and a transient
+    error does not leave the replica unready.
+
+    Warm-up state is one of "disabled", "pending", "running", "retrying",
+    "done" or "failed"; the app is ready once it is "done" or "disabled".
+    """
+
+    def __init__(self):
+        self.phases: dict[str, float] = {}
+        self.steps: dict[str, dict] = {}
+        self.warmup = "pending"
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def record(self, phase: str, seconds: float):
+        with self._lock:
+            self.phases[phase] = round(seconds, 4)
+        STARTUP_SECONDS.set(seconds, phase=phase)
+
+    def disable_warm_up(self):
+        with self._lock:
+            self.warmup = "disabled"
+
+    def warm_up(self, steps: dict[str, Callable[[], object]], retry_interval: float = 0.0,
+                max_retry_interval: float = 60.0) -> bool:
+        """
+        Run each warm-up step in order and record its duration, then retry
+        failed steps until they succeed or `stop_warm_up` is called.
+
+        Args:
+            steps: step name -> zero-argument callable.
+            retry_interval: Seconds before the first retry, doubling up to
+                `max_retry_interval`; 0 disables retries.
+            max_retry_interval: Longest wait between retries.
+
+        Returns:
+            True if every step succeeded.
+        """
+        with self._lock:
+            self.warmup = "running"
+        started = time.perf_counter()
+        failed = self._run_steps(steps)
+        self.record("warmup", time.perf_counter() - started)
+        delay = retry_interval
+        while failed and retry_interval > 0:
+            with self._lock:
+                self.warmup = "retrying"
+            logger.warning("Warm-up steps %s failed; retrying in %.0fs", ", ".join(failed), delay)
+            if self._stop.wait(delay):
+                break
+            failed = self._run_steps({name: steps[name] for name in failed})
+            delay = min(delay * 2, max_retry_interval)
+        with self._lock:
+            self.warmup = "failed" if failed else "done"
+        logger.info("Warm-up %s after %.2fs", "failed" if failed else "finished", time.perf_counter() - started)
+        return not failed
+
+    def _run_steps(self, steps: dict[str, Callable[[], object]]) -> list[str]:
+        """Run `steps` in order, recording each outcome; returns the names of those that failed."""
+        failed = []
+        for name, step in steps.items():
+            step_started = time.perf_counter()
+            try:
+                step()
+                status = {"status": "ok"}
+            except Exception as e:
+                logger.exception("Warm-up step %s failed: %s", name, e)
+                status = {"status": "error", "error": f"{type(e).__name__}: {e}"}
+                failed.append(name)
+            seconds = time.perf_counter() - step_started
+            status["seconds"] = round(seconds, 4)
+            with self._lock:
+                status["attempts"] = self.steps.get(name, {}).get("attempts", 0) + 1
+                self.steps[name] = status
+            STARTUP_SECONDS.set(seconds, phase=f"warmup_{name}")
+        return failed
+
+    def stop_warm_up(self):
+        """Stop retrying failed warm-up steps (e.g. at shutdown)."""
+        self._stop.set()
+
+    @property
+    def ready(self) -> bool:
+        return self.warmup in ("done", "disabled")
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "ready": self.warmup in ("done", "disabled"),
+                "warmup": self.warmup,
+                "phases": dict(self.phases),
+                "steps": {name: dict(step) for name, step in self.steps.items()},
+            }
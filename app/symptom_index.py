@@ -0,0 +1,115 @@
+"""
+Precomputed symptom -> NG12 chunk evidence, built at ingestion time.
+
+The symptom vocabulary (the canonical terms of `app.prescreen` plus every
+symptom in the patient data) is small and repeats across patients, so its
+vector searches are run once, offline, with the whole vocabulary embedded
+in bulk. Assessments then get a patient's evidence from memory.
+"""
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Iterable, Optional
+
+from app.prescreen import SYMPTOM_TERMS, symptom_terms
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+# Texts per embedding request when embedding the vocabulary (the Vertex AI limit).
+EMBED_BATCH_SIZE = 250
+
+
+def symptom_vocabulary(patients: Iterable[dict] = ()) -> list[str]:
+    """Canonical symptom terms known to the pre-screen plus those found in `patients`, sorted."""
+    terms = set(SYMPTOM_TERMS)
+    for patient in patients:
+        terms |= symptom_terms(patient.get("symptoms"))
+    return sorted(terms)
+
+
+class SymptomEvidenceIndex:
+    """
+    Ranked NG12 chunks per normalized symptom term, with the chunks' text.
+
+    Args:
+        model_id: Embedding model the vocabulary was embedded with; an index
+            built with another model is not used.
+        evidence: term -> [{"chunk_id", "distance"}, ...], best first.
+        chunks: chunk_id -> {"document", "metadata"}.
+    """
+
+    def __init__(self, model_id: str, evidence: dict[str, list[dict]], chunks: dict[str, dict]):
+        self.model_id = model_id
+        self.evidence = evidence
+        self.chunks = chunks
+
+    def __len__(self) -> int:
+        return len(self.evidence)
+
+    def __contains__(self, term: str) -> bool:
+        return term in self.evidence
+
+    @classmethod
+    def build(cls, terms: list[str], provider, collection, n_results: int = 5) -> "SymptomEvidenceIndex":
+        """
+        Embed `terms` in bulk and run one multi-query vector search per batch.
+
+        Args:
+            terms: Normalized symptom terms (see `symptom_vocabulary`).
+            provider: `EmbeddingProvider` of the collection.
+            collection: The Chroma collection to search.
+            n_results: Chunks kept per term.
+        """
+        evidence, chunks = {}, {}
+        for start in range(0, len(terms), EMBED_BATCH_SIZE):
+            batch = terms[start:start + EMBED_BATCH_SIZE]
+            results = collection.query(
+                query_embeddings=provider.embed(batch),
+                n_results=n_results,
+                include=["documents", "metadatas", "distances"],
+            )
+            for term, ids, docs, metas, distances in zip(
+                batch, results["ids"], results["documents"], results["metadatas"], results["distances"]
+            ):
+                evidence[term] = [
+                    {"chunk_id": chunk_id, "distance": float(distance)}
+                    for chunk_id, distance in zip(ids, distances)
+                ]
+                for chunk_id, doc, meta in zip(ids, docs, metas):
+                    chunks[chunk_id] = {"document": doc, "metadata": meta}
+        return cls(provider.model_id, evidence, chunks)
+
+    def lookup(self, term: str, top_n: int) -> Optional[list[dict]]:
+        """Up to `top_n` {document, metadata} results for a normalized term, or None if unseen."""
+        ranked = self.evidence.get(term)
+        if ranked is None:
+            return None
+        return [self.chunks[hit["chunk_id"]] for hit in ranked[:top_n] if hit["chunk_id"] in self.chunks]
+
+    def save(self, path):
+        """Write the index as JSON, atomically replacing any previous file."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {
+            "version": FORMAT_VERSION,
+            "model_id": self.model_id,
+            "evidence": self.evidence,
+            "chunks": self.chunks,
+        }
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path) -> "SymptomEvidenceIndex":
+        with open(path, encoding="utf-8") as f:
+            payload = json.load(f)
+        if payload.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported symptom index version in {path}")
+        index = cls(payload["model_id"], payload["evidence"], payload["chunks"])
+        logger.info("Loaded symptom evidence for %d terms from %s", len(index), path)
+        return index
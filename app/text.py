@@ -0,0 +1,12 @@
+"""Text normalization shared by the lexical index and the pre-screen."""
+
+# British/American spelling variants folded before matching.
+SPELLING_VARIANTS = (("haem", "hem"), ("oesoph", "esoph"), ("anaem", "anem"), ("oedema", "edema"))
+
+
+def normalize_text(text: str) -> str:
+    """Case-fold, collapse whitespace and underscores, and fold British spellings to American."""
+    text = " ".join(text.casefold().replace("_", " ").split())
+    for british, american in SPELLING_VARIANTS:
+        text = text.replace(british, american)
+    return text
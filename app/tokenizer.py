@@ -0,0 +1,61 @@
+"""
+cl100k_base token counting shared by ingestion and context packing.
+
+tiktoken downloads the vocabulary on first use and caches it under
+`TIKTOKEN_CACHE_DIR`, so an offline host needs a pre-seeded cache
+directory. Without one, a whitespace tokenizer stands in and token counts
+become approximate, but chunking and packing keep working.
+"""
+
+import logging
+import re
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+ENCODING_NAME = "cl100k_base"  # compatible with Vertex models
+
+_WHITESPACE_TOKEN_RE = re.compile(r"\S+\s*|\s+")
+
+
+class RegexEncoding:
+    """Whitespace-token stand-in for a tiktoken `Encoding` (encode/decode/decode_with_offsets)."""
+
+    name = "regex-fallback"
+
+    def encode(self, text: str) -> list[str]:
+        return _WHITESPACE_TOKEN_RE.findall(text)
+
+    def decode(self, tokens) -> str:
+        return "".join(tokens)
+
+    def decode_with_offsets(self, tokens) -> tuple[str, list[int]]:
+        offsets, position = [], 0
+        for token in tokens:
+            offsets.append(position)
+            position += len(token)
+        return "".join(tokens), offsets
+
+
+def load_encoding(name: str = ENCODING_NAME):
+    """Load the tiktoken encoding `name`, or `RegexEncoding` if its vocabulary is unavailable."""
+    import tiktoken
+
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        logger.warning(
+            "Unable to load tiktoken encoding %s (%s); falling back to whitespace tokens. "
+            "Set TIKTOKEN_CACHE_DIR to a pre-seeded cache to use it offline.", name, e,
+        )
+        return RegexEncoding()
+
+
+@lru_cache(maxsize=None)
+def get_encoding(name: str = ENCODING_NAME):
+    """Return the encoding, loaded once per process."""
+    return load_encoding(name)
+
+
+def count_tokens(text: str) -> int:
+    return len(get_encoding().encode(text))
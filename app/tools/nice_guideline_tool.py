@@ -1,19 +1,328 @@
-import chromadb
 import logging
-from google.adk.agents import Agent
-from vertexai.agent_engines import AdkApp
+import threading
+from pathlib import Path
+from typing import Optional
 
-from app.config import VECTOR_STORE_DIR, GCP_REGION, EMBEDDING_MODEL_NAME
+from app.config import (
+    VECTOR_STORE_DIR,
+    GCP_REGION,
+    EMBEDDING_MODEL_NAME,
+    VECTOR_COLLECTION_NAME,
+    EMBEDDING_CACHE_SIZE,
+    EMBEDDING_CACHE_PATH,
+    RETRIEVAL_ENGINE,
+    SNAPSHOT_DIR,
+    BM25_INDEX_PATH,
+    EMBEDDING_PROVIDER,
+    HASHING_EMBEDDING_DIM,
+    CONTEXT_PACKING,
+    CONTEXT_TOKEN_BUDGET,
+)
+from app.bm25 import BM25Index, reciprocal_rank_fusion
+from app.context_packer import pack_results
+from app.embedding_cache import EmbeddingCache, normalize_query
+from app.embeddings import EmbeddingProvider, create_embedding_provider
+from app.metrics import CONTEXT_TOKENS, span
+from app.single_flight import SingleFlight
+from app.vector_index import NumpyVectorIndex
+from app.vector_snapshot import META_FILE, SnapshotVectorIndex
+from app.vertexai_utils import init_vertexai
 import os
-from vertexai.preview.language_models import TextEmbeddingModel
-from app.config import VECTOR_STORE_DIR, EMBEDDING_MODEL_NAME
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_TOP_N = 5
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+# Candidates taken from each ranking before reciprocal-rank fusion.
+HYBRID_CANDIDATES = 20
 
-embedding_model = TextEmbeddingModel.from_pretrained(EMBEDDING_MODEL_NAME)
 
-def search_nice_ng12_guidelines(query: str, top_n: int = 5) -> dict:
+class GuidelineRetriever:
+    """
+    Long-lived handle on the NG12 vector store.
+
+    The Chroma client and collection are opened once and reused for every
+    search. Before each query the store's SQLite files are stat'ed; if
+    ingestion has rewritten them since the collection was opened, the
+    handle is reopened so searches never run against a stale collection.
+
+    Args:
+        vector_store_dir: Directory of the persistent Chroma store.
+        collection_name: Name of the guideline collection.
+        engine: "chroma" to query the HNSW index, "numpy" to load the
+            whole collection into an in-process `NumpyVectorIndex`, or
+            "snapshot" to map the read-only snapshot in `snapshot_dir`
+            (Chroma is then never opened).
+        snapshot_dir: Directory of the snapshot written by ingestion.
+    """
+
+    ENGINES = ("chroma", "numpy", "snapshot")
+
+    def __init__(
+        self,
+        vector_store_dir=VECTOR_STORE_DIR,
+        collection_name: str = VECTOR_COLLECTION_NAME,
+        engine: str = RETRIEVAL_ENGINE,
+        snapshot_dir=SNAPSHOT_DIR,
+    ):
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown retrieval engine '{engine}', expected one of {self.ENGINES}")
+        self.vector_store_dir = Path(vector_store_dir)
+        self.collection_name = collection_name
+        self.engine = engine
+        self.snapshot_dir = Path(snapshot_dir)
+        self._lock = threading.Lock()
+        self._client = None
+        self._collection = None
+        self._index: NumpyVectorIndex | None = None
+        self._version = None
+
+    def store_version(self) -> str | None:
+        """Return a cheap fingerprint of the on-disk store, or None if it is missing."""
+        parts = []
+        if self.engine == "snapshot":
+            paths = [self.snapshot_dir / META_FILE]
+        else:
+            paths = [self.vector_store_dir / name for name in ("chroma.sqlite3", "chroma.sqlite3-wal")]
+        for path in paths:
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            parts.append(f"{st.st_mtime_ns}:{st.st_size}")
+        return "-".join(parts) or None
+
+    @property
+    def is_open(self) -> bool:
+        return self._collection is not None
+
+    def open(self):
+        """Open the client and collection if not already open. Returns the collection."""
+        with self._lock:
+            if self._collection is None:
+                self._open_locked()
+            return self._collection
+
+    def reload(self):
+        """Drop the current handles and reopen the collection."""
+        with self._lock:
+            self._close_locked()
+            self._open_locked()
+            return self._collection
+
+    def close(self):
+        with self._lock:
+            self._close_locked()
+
+    def collection(self):
+        """Return the open collection, reopening it if the store changed on disk."""
+        if self._collection is None:
+            return self.open()
+        if self.store_version() != self._version:
+            logger.info("NG12 vector store changed on disk, reopening collection")
+            return self.reload()
+        return self._collection
+
+    def query(self, query_embeddings, n_results: int, include=("documents", "metadatas")) -> dict:
+        """Run a vector query, reopening once if the collection handle went stale."""
+        with span("vector_query", self.engine, queries=len(query_embeddings), n_results=n_results):
+            try:
+                return self._query(query_embeddings, n_results, include)
+            except Exception:
+                logger.warning("NG12 query failed, reopening collection and retrying", exc_info=True)
+                self.reload()
+                return self._query(query_embeddings, n_results, include)
+
+    def _query(self, query_embeddings, n_results, include) -> dict:
+        collection = self.collection()
+        if self.engine in ("numpy", "snapshot"):
+            return self._index.query(query_embeddings, n_results=n_results, include=include)
+        return collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            include=list(include),
+        )
+
+    def _open_locked(self):
+        if self.engine == "snapshot":
+            # The snapshot also serves Chroma-style `get` calls, so it stands in for the collection.
+            self._index = self._collection = SnapshotVectorIndex(self.snapshot_dir)
+            self._version = self.store_version()
+            return
+
+        import chromadb  # slow to import; only needed once the store is opened
+
+        self._client = chromadb.PersistentClient(path=str(self.vector_store_dir))
+        self._collection = self._client.get_collection(self.collection_name)
+        if self.engine == "numpy":
+            self._index = NumpyVectorIndex.from_collection(self._collection)
+        # Opening the store may touch the SQLite file, so fingerprint it afterwards.
+        self._version = self.store_version()
+        logger.info("Opened NG12 collection '%s' from %s", self.collection_name, self.vector_store_dir)
+
+    def _close_locked(self):
+        if self._client is not None:
+            # Chroma caches one System per path; clear it so a rebuilt store is re-read.
+            clear_cache = getattr(self._client, "clear_system_cache", None)
+            if callable(clear_cache):
+                try:
+                    clear_cache()
+                except Exception:
+                    logger.debug("Unable to clear Chroma system cache", exc_info=True)
+        self._client = None
+        self._collection = None
+        self._index = None
+        self._version = None
+
+
+_retriever: GuidelineRetriever | None = None
+_retriever_lock = threading.Lock()
+
+_embedding_provider: EmbeddingProvider | None = None
+_embedding_provider_lock = threading.Lock()
+
+_embedding_cache: EmbeddingCache | None = None
+
+_bm25_index: BM25Index | None = None
+_bm25_version = None
+_bm25_lock = threading.Lock()
+
+# Identical searches running at the same time (e.g. from concurrent agent turns) share one execution.
+_search_flights = SingleFlight()
+
+
+def get_retriever() -> GuidelineRetriever:
+    """Return the process-wide retriever, creating it on first use."""
+    global _retriever
+    if _retriever is None:
+        with _retriever_lock:
+            if _retriever is None:
+                _retriever = GuidelineRetriever()
+    return _retriever
+
+
+def set_retriever(retriever: GuidelineRetriever | None):
+    """Install the retriever used by the search tool (called by the FastAPI lifespan)."""
+    global _retriever
+    with _retriever_lock:
+        _retriever = retriever
+
+
+def get_embedding_provider() -> EmbeddingProvider:
+    """Return the shared embedding provider selected by EMBEDDING_PROVIDER."""
+    global _embedding_provider
+    if _embedding_provider is None:
+        with _embedding_provider_lock:
+            if _embedding_provider is None:
+                if EMBEDDING_PROVIDER == "vertex":
+                    init_vertexai()
+                _embedding_provider = create_embedding_provider(
+                    EMBEDDING_PROVIDER, EMBEDDING_MODEL_NAME, dimension=HASHING_EMBEDDING_DIM
+                )
+    return _embedding_provider
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Return the shared query-embedding cache, creating it on first use."""
+    global _embedding_cache
+    if _embedding_cache is None:
+        model_id = get_embedding_provider().model_id
+        with _embedding_provider_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache(
+                    model_id,
+                    maxsize=EMBEDDING_CACHE_SIZE,
+                    path=EMBEDDING_CACHE_PATH or None,
+                )
+    return _embedding_cache
+
+
+def get_bm25_index() -> BM25Index:
+    """
+    Return the lexical index, reloading it when ingestion rewrites the file.
+
+    If no index has been written yet it is built in memory from the Chroma
+    collection (documents only, so still no embedding call).
+    """
+    global _bm25_index, _bm25_version
+    path = Path(BM25_INDEX_PATH)
+    try:
+        st = path.stat()
+        version = (str(path), st.st_mtime_ns, st.st_size)
+    except OSError:
+        version = None
+    if _bm25_index is not None and version == _bm25_version:
+        return _bm25_index
+    with _bm25_lock:
+        if _bm25_index is None or version != _bm25_version:
+            if version is not None:
+                _bm25_index = BM25Index.load(path)
+            else:
+                logger.warning("No BM25 index at %s, building it from the vector store", path)
+                _bm25_index = BM25Index.from_collection(get_retriever().collection())
+            _bm25_version = version
+        return _bm25_index
+
+
+def get_search_flights() -> SingleFlight:
+    """Return the coalescer shared by concurrent identical guideline searches."""
+    return _search_flights
+
+
+def lexical_query(queries: list[str], n_results: int) -> dict:
+    """BM25 query against the lexical index, recorded as a `lexical_query` span."""
+    with span("lexical_query", "bm25", queries=len(queries), n_results=n_results):
+        return get_bm25_index().query(queries, n_results=n_results)
+
+
+def _hybrid_query(query: str, query_embedding, top_n: int) -> dict:
+    """Fuse vector and BM25 rankings for one query with reciprocal-rank fusion."""
+    candidates = max(top_n, HYBRID_CANDIDATES)
+    vector = get_retriever().query(query_embeddings=[query_embedding], n_results=candidates)
+    lexical = lexical_query([query], n_results=candidates)
+
+    chunks = {}
+    for results in (lexical, vector):
+        for chunk_id, doc, meta in zip(results["ids"][0], results["documents"][0], results["metadatas"][0]):
+            chunks[chunk_id] = (doc, meta)
+    fused = reciprocal_rank_fusion([vector["ids"][0], lexical["ids"][0]])[:top_n]
+    return {
+        "ids": [[chunk_id for chunk_id, _ in fused]],
+        "documents": [[chunks[chunk_id][0] for chunk_id, _ in fused]],
+        "metadatas": [[chunks[chunk_id][1] for chunk_id, _ in fused]],
+    }
+
+
+def embed_queries(queries: list[str]) -> list[list[float]]:
+    """Embed `queries`, only calling the embedding provider for texts not already cached."""
+    provider = get_embedding_provider()
+
+    def embed(texts):
+        with span("embedding", provider.model_id, texts=len(texts)):
+            return provider.embed(texts)
+
+    return get_embedding_cache().get_or_compute(queries, embed)
+
+
+def pack_context(results: list[dict], query: str, budget: int = CONTEXT_TOKEN_BUDGET) -> list[dict]:
+    """
+    Merge and trim search results before they are returned to the agent (see `app.context_packer`).
+
+    Tokens in and out are counted in `CONTEXT_TOKENS` and the savings of
+    each call are attached to a "context_pack" span.
+    """
+    if not CONTEXT_PACKING or not results:
+        return results
+    with span("context_pack", "ng12") as attributes:
+        packed, report = pack_results(results, query, budget)
+        attributes.update(report)
+    CONTEXT_TOKENS.inc(report["tokens_in"], stage="retrieved", encoding=report["encoding"])
+    CONTEXT_TOKENS.inc(report["tokens_out"], stage="packed", encoding=report["encoding"])
+    logger.debug("Packed context for %r: %s", query, report)
+    return packed
+
+
+def search_nice_ng12_guidelines(query: str, top_n: int = 5, mode: str = "vector") -> dict:
     """
     Search the local NICE NG12 vector database for relevant guideline excerpts.
 
@@ -21,10 +330,17 @@ def search_nice_ng12_guidelines(query: str, top_n: int = 5) -> dict:
         query (str): A natural-language query describing patient symptoms
             or clinical criteria (e.g., "unexplained hemoptysis in smoker").
         top_n (int): Maximum number of results to return (default: 5).
+        mode (str): "vector" for semantic search (default), "lexical" for
+            BM25 keyword matching only (fast, no embedding call; best for
+            exact terms such as "haemoptysis", "dyspepsia" or "PSA"), or
+            "hybrid" to fuse both rankings.
 
     Returns:
         dict: Structured result with "results" list containing {document, metadata}
-        pairs, or empty list if no matches found.
+        pairs, or empty list if no matches found. Overlapping chunks from one
+        page are merged (their ids are listed in metadata "chunk_ids") and long
+        excerpts are trimmed to the passages relevant to the query, with "…"
+        marking removed text.
         Example:
         {
             "results": [
@@ -34,22 +350,34 @@ def search_nice_ng12_guidelines(query: str, top_n: int = 5) -> dict:
         }
     """
 
+    key = (normalize_query(query), top_n, mode)
+    return _search_flights.do(key, lambda: _search(query, top_n, mode))
+
+
+def _search(query: str, top_n: int, mode: str) -> dict:
+    """One uncoalesced run of `search_nice_ng12_guidelines`."""
     try:
-        # 1. Embed the query using Vertex AI
-        query_embedding = embedding_model.get_embeddings([query])[0].values
-
-        # 2. Load persistent ChromaDB
-        client = chromadb.PersistentClient(path=str(VECTOR_STORE_DIR))
-        collection = client.get_collection("ng12")
-
-        # 3. Vector search
-        results = collection.query(
-            query_embeddings=[query_embedding],
-            n_results=top_n,
-            include=["documents", "metadatas"]
-        )
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}', expected one of {SEARCH_MODES}")
+
+        if mode == "lexical":
+            # 1-2. Keyword search only: answered locally without any network call
+            results = lexical_query([query], n_results=top_n)
+        else:
+            # 1. Embed the query (cached by normalized text, provider call on a miss)
+            query_embedding = embed_queries([query])[0]
 
-        # 4. Return structured results with both documents and metadata
+            # 2. Vector search against the long-lived collection handle, fused
+            #    with the BM25 ranking in hybrid mode
+            if mode == "hybrid":
+                results = _hybrid_query(query, query_embedding, top_n)
+            else:
+                results = get_retriever().query(
+                    query_embeddings=[query_embedding],
+                    n_results=top_n,
+                )
+
+        # 3. Return structured results with both documents and metadata
         documents = results.get("documents", [[]])[0]
         metadatas = results.get("metadatas", [[]])[0]
 
@@ -62,7 +390,74 @@ def search_nice_ng12_guidelines(query: str, top_n: int = 5) -> dict:
             for doc, meta in zip(documents, metadatas)
         ]
 
-        return {"results": result_list}
+        # 4. Merge overlapping chunks and trim to the context token budget
+        return {"results": pack_context(result_list, query)}
     except Exception as e:
         logger.exception("Error searching NG12 guidelines: %s", e)
-        return {"error": "error occured"}
\ No newline at end of file
+        return {"error": "error occured"}
+
+
+def search_nice_ng12_guidelines_batch(
+    queries: list[str],
+    top_n: Optional[list[int]] = None,
+    deduplicate: bool = True,
+) -> dict:
+    """
+    Search the NICE NG12 vector database for several queries in one call.
+
+    All queries are embedded together and answered by a single multi-query
+    vector search, so use this instead of repeated
+    `search_nice_ng12_guidelines` calls when a patient has several symptoms.
+
+    Args:
+        queries (list[str]): Natural-language queries, e.g. one per symptom
+            ("unexplained hemoptysis", "persistent hoarseness").
+        top_n (list[int], optional): Maximum results per query, aligned with
+            `queries`. Missing entries default to 5.
+        deduplicate (bool): If True, a chunk (by `chunk_id`) is returned only
+            for the first query that retrieves it (default: True).
+
+    Returns:
+        dict: {"results": [{"query": <query>, "results": [{document, metadata}, ...]}, ...]}
+        with one entry per query, in the order given.
+    """
+    try:
+        if not queries:
+            return {"results": []}
+
+        limits = list(top_n or [])
+        limits = [
+            limits[i] if i < len(limits) and limits[i] else DEFAULT_TOP_N
+            for i in range(len(queries))
+        ]
+
+        # 1. One embedding request for every uncached query
+        query_embeddings = embed_queries(list(queries))
+
+        # 2. One multi-query vector search sized for the largest request
+        results = get_retriever().query(
+            query_embeddings=query_embeddings,
+            n_results=max(limits),
+        )
+        documents = results.get("documents") or [[] for _ in queries]
+        metadatas = results.get("metadatas") or [[] for _ in queries]
+
+        # 3. Group per query, skipping chunks already returned for an earlier query
+        seen = set()
+        grouped = []
+        for query, limit, docs, metas in zip(queries, limits, documents, metadatas):
+            hits = []
+            for doc, meta in zip(docs, metas):
+                if len(hits) >= limit:
+                    break
+                key = (meta or {}).get("chunk_id") or doc
+                if deduplicate and key in seen:
+                    continue
+                seen.add(key)
+                hits.append({"document": doc, "metadata": meta})
+            grouped.append({"query": query, "results": pack_context(hits, query)})
+
+        return {"results": grouped}
+    except Exception as e:
+        logger.exception("Error batch searching NG12 guidelines: %s", e)
+        return {"error": "error occured"}
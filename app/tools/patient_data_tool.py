@@ -1,20 +1,34 @@
-import json
 import logging
+import threading
 from pathlib import Path
 
-DATA_PATH = Path(__file__).parent / "patients.json"
+from app.config import PATIENT_DATA_PATH, PATIENT_STORE_CHECK_INTERVAL
+from app.metrics import span
+from app.patient_store import PatientStore
 
-_PATIENTS: list[dict] | None = None
+DATA_PATH = Path(PATIENT_DATA_PATH) if PATIENT_DATA_PATH else Path(__file__).parent / "patients.json"
+
+_STORE: PatientStore | None = None
+_STORE_LOCK = threading.Lock()
 
 logger = logging.getLogger(__name__)
 
 
+def get_patient_store() -> PatientStore:
+    """Return the shared patient store for DATA_PATH, creating it on first use."""
+    global _STORE
+    store = _STORE
+    if store is None or store.path != Path(DATA_PATH):
+        with _STORE_LOCK:
+            if _STORE is None or _STORE.path != Path(DATA_PATH):
+                _STORE = PatientStore(DATA_PATH, check_interval=PATIENT_STORE_CHECK_INTERVAL)
+            store = _STORE
+    return store
+
+
 def load_patients() -> list[dict]:
-    global _PATIENTS
-    if _PATIENTS is None:
-        with open(DATA_PATH, encoding="utf-8") as f:
-            _PATIENTS = json.load(f)
-    return _PATIENTS
+    """Return every patient record (materializes the whole file; prefer get_patient_data)."""
+    return list(get_patient_store().iter_records())
 
 
 def get_patient_data(patient_id: str) -> dict:
@@ -35,11 +49,11 @@ def get_patient_data(patient_id: str) -> dict:
               }
     """
     try:
-        patients = load_patients()
-
-        for p in patients:
-            if p.get("patient_id") == patient_id:
-                return p
+        with span("patient_lookup", "patient_store") as attributes:
+            patient = get_patient_store().get(patient_id)
+            attributes["found"] = patient is not None
+        if patient is not None:
+            return patient
 
         return {
             "patient_id": patient_id,
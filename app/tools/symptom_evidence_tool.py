@@ -0,0 +1,104 @@
+import logging
+import threading
+from pathlib import Path
+
+from app.config import SYMPTOM_INDEX_PATH
+from app.metrics import span
+from app.prescreen import symptom_terms
+from app.symptom_index import SymptomEvidenceIndex
+from app.tools.nice_guideline_tool import (
+    DEFAULT_TOP_N,
+    get_embedding_provider,
+    pack_context,
+    search_nice_ng12_guidelines_batch,
+)
+
+logger = logging.getLogger(__name__)
+
+_index: SymptomEvidenceIndex | None = None
+_index_version = None
+_index_lock = threading.Lock()
+
+
+def get_symptom_index() -> SymptomEvidenceIndex | None:
+    """
+    Return the symptom evidence index, reloading it when ingestion rewrites the file.
+
+    Returns None if ingestion has not written one yet, or if it was built
+    with a different embedding model than the one in use.
+    """
+    global _index, _index_version
+    path = Path(SYMPTOM_INDEX_PATH)
+    try:
+        st = path.stat()
+        version = (str(path), st.st_mtime_ns, st.st_size)
+    except OSError:
+        version = None
+    if version == _index_version:
+        return _index
+    with _index_lock:
+        if version != _index_version:
+            index = SymptomEvidenceIndex.load(path) if version is not None else None
+            if index is not None and index.model_id != get_embedding_provider().model_id:
+                logger.warning(
+                    "Symptom index %s was built with %s, not %s; using live search",
+                    path, index.model_id, get_embedding_provider().model_id,
+                )
+                index = None
+            _index, _index_version = index, version
+        return _index
+
+
+def get_symptom_evidence(symptoms: list[str], top_n: int = DEFAULT_TOP_N) -> dict:
+    """
+    Get NICE NG12 guideline excerpts for all of a patient's symptoms in one call.
+
+    Symptoms are normalized (e.g. "persistent cough" -> "cough",
+    "visible haematuria" -> "visible hematuria") and answered from an index
+    precomputed at ingestion; only symptoms the index has never seen are
+    searched live.
+
+    Args:
+        symptoms (list[str]): The patient's symptoms as recorded, e.g.
+            ["unexplained hemoptysis", "fatigue"].
+        top_n (int): Maximum guideline excerpts per symptom (default: 5).
+
+    Returns:
+        dict: {"results": [{"symptom": <normalized symptom>, "source": "index" or "live",
+        "results": [{document, metadata}, ...]}, ...]}, one entry per symptom.
+    """
+    try:
+        terms = sorted(symptom_terms(symptoms))
+        if not terms:
+            return {"results": []}
+
+        # 1. In-memory lookup of every symptom the index knows
+        with span("symptom_lookup", "symptom_index", symptoms=len(terms)) as attributes:
+            index = get_symptom_index()
+            found = {}
+            if index is not None:
+                for term in terms:
+                    hits = index.lookup(term, top_n)
+                    if hits is not None:
+                        found[term] = pack_context(hits, term)
+            unseen = [term for term in terms if term not in found]
+            attributes["unseen"] = len(unseen)
+
+        # 2. One live batch search for the rest
+        live = {}
+        if unseen:
+            searched = search_nice_ng12_guidelines_batch(unseen, top_n=[top_n] * len(unseen), deduplicate=False)
+            if "error" in searched:
+                return searched
+            live = {group["query"]: group["results"] for group in searched["results"]}
+
+        return {
+            "results": [
+                {"symptom": term, "source": "index" if term in found else "live",
+                 "results": found[term] if term in found else live.get(term, [])}
+                for term in terms
+            ]
+        }
+    except Exception as e:
+        logger.exception("Error looking up symptom evidence for %s: %s", symptoms, e)
+        return {"error": "error occured"}
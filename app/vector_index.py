@@ -0,0 +1,92 @@
+"""In-process exact vector search over the NG12 collection using NumPy."""
+
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class NumpyVectorIndex:
+    """
+    Exact cosine top-k search over a small, fully loaded collection.
+
+    All embeddings are held as one C-contiguous, L2-normalized float32
+    matrix, so a query is a single matrix product followed by
+    `argpartition`. Query results use the same nested-list layout as
+    `chromadb.Collection.query`, which lets the retriever swap engines
+    without touching the tool code. Distances are squared L2 between
+    normalized vectors (2 - 2 * cosine), matching Chroma's default "l2"
+    space for the unit-length Vertex embeddings in the NG12 store.
+    """
+
+    def __init__(self, ids, embeddings, documents, metadatas):
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.ndim != 2:
+            matrix = matrix.reshape(len(ids), -1)
+        self.ids = list(ids)
+        self.documents = list(documents)
+        self.metadatas = list(metadatas)
+        self.matrix = np.ascontiguousarray(_normalize_rows(matrix), dtype=np.float32)
+
+    @classmethod
+    def from_collection(cls, collection) -> "NumpyVectorIndex":
+        """Load every embedding, document and metadata entry from a Chroma collection."""
+        data = collection.get(include=["embeddings", "documents", "metadatas"])
+        index = cls(
+            ids=data["ids"],
+            embeddings=data["embeddings"],
+            documents=data["documents"],
+            metadatas=data["metadatas"],
+        )
+        logger.info("Loaded %d NG12 vectors into the in-process index", len(index))
+        return index
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dimension(self) -> int:
+        return self.matrix.shape[1]
+
+    def _scores(self, queries: np.ndarray) -> np.ndarray:
+        """Cosine similarity of each normalized query with every row, shape (n_queries, len(self))."""
+        return queries @ self.matrix.T
+
+    def search(self, query_embeddings, n_results: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Return (indices, scores) of the top `n_results` rows for each query.
+
+        Both arrays have shape (n_queries, k) and are ordered best first.
+        """
+        queries = _normalize_rows(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+        scores = self._scores(queries)
+        k = max(0, min(n_results, len(self)))
+        if k == 0:
+            empty = np.empty((len(queries), 0))
+            return empty.astype(np.intp), empty
+        if k < len(self):
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(len(self)), (len(queries), k))
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+    def query(self, query_embeddings, n_results: int, include=("documents", "metadatas")) -> dict:
+        """Chroma-compatible query: returns ids plus the requested fields, one list per query."""
+        indices, scores = self.search(query_embeddings, n_results)
+        results = {"ids": [[self.ids[i] for i in row] for row in indices]}
+        if "documents" in include:
+            results["documents"] = [[self.documents[i] for i in row] for row in indices]
+        if "metadatas" in include:
+            results["metadatas"] = [[self.metadatas[i] for i in row] for row in indices]
+        if "distances" in include:
+            results["distances"] = (2.0 - 2.0 * scores).tolist()
+        return results
@@ -0,0 +1,225 @@
+"""
+Read-only, memory-mapped snapshot of the NG12 vectors.
+
+Ingestion exports the collection as a few flat files: the L2-normalized
+vectors as a `.npy` matrix (float32, or quantized to float16 / int8 with
+one scale per row), the documents as one UTF-8 blob with an offsets
+array, and a JSON sidecar with ids and metadata. `SnapshotVectorIndex`
+maps those files instead of reading them, so opening it is nearly free
+and every uvicorn worker on a host shares the same page-cache pages
+rather than holding its own copy of the store.
+"""
+
+import json
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+from app.vector_index import NumpyVectorIndex, _normalize_rows
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+META_FILE = "meta.json"
+SNAPSHOT_DTYPES = ("float32", "float16", "int8")
+# Rows dequantized at a time while scoring, bounding the temporary float32 copy.
+SCORE_BLOCK_ROWS = 8192
+
+
+def quantize(matrix: np.ndarray, dtype: str) -> tuple[np.ndarray, np.ndarray | None]:
+    """
+    Store normalized float32 rows as `dtype`.
+
+    int8 uses symmetric per-row scaling (value = code * scale), so each
+    row keeps its own full 8-bit range.
+
+    Returns:
+        (data, scales); scales is None unless dtype is "int8".
+    """
+    if dtype not in SNAPSHOT_DTYPES:
+        raise ValueError(f"Unknown snapshot dtype '{dtype}', expected one of {SNAPSHOT_DTYPES}")
+    if dtype == "float32":
+        return np.ascontiguousarray(matrix, dtype=np.float32), None
+    if dtype == "float16":
+        return matrix.astype(np.float16), None
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def dequantize(data: np.ndarray, scales: np.ndarray | None) -> np.ndarray:
+    matrix = np.asarray(data, dtype=np.float32)
+    return matrix * np.asarray(scales)[:, None] if scales is not None else matrix
+
+
+def quantization_recall(matrix: np.ndarray, dtype: str, k: int = 5, queries: np.ndarray | None = None) -> float:
+    """
+    Recall@k of searching `dtype`-quantized rows against exact float32 search.
+
+    Args:
+        matrix: Normalized float32 rows.
+        dtype: One of `SNAPSHOT_DTYPES`.
+        k: Results compared per query.
+        queries: Normalized query vectors; defaults to the rows themselves.
+    """
+    queries = matrix if queries is None else queries
+    k = min(k, len(matrix))
+    if not k or not len(queries):
+        return 1.0
+    exact = np.argpartition(-(queries @ matrix.T), k - 1, axis=1)[:, :k]
+    approx_matrix = dequantize(*quantize(matrix, dtype))
+    approx = np.argpartition(-(queries @ approx_matrix.T), k - 1, axis=1)[:, :k]
+    found = sum(len(set(a) & set(e)) for a, e in zip(approx.tolist(), exact.tolist()))
+    return found / (k * len(queries))
+
+
+def write_snapshot(directory, ids, embeddings, documents, metadatas, dtype: str = "float32",
+                   model_id: str | None = None, recall_k: int = 5) -> dict:
+    """
+    Write a snapshot of the given vectors to `directory` and return its metadata.
+
+    Data files carry a generation suffix and `meta.json` is replaced last,
+    atomically, so a reader never sees a half-written snapshot; files of
+    older generations are removed afterwards (workers that still map them
+    keep a valid mapping). The recall@`recall_k` of every dtype against
+    float32 search over the collection's own vectors is recorded as
+    "recall".
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+    matrix = np.ascontiguousarray(_normalize_rows(matrix), dtype=np.float32)
+    data, scales = quantize(matrix, dtype)
+
+    generation = uuid.uuid4().hex[:12]
+    files = {"vectors": f"vectors-{generation}.npy", "offsets": f"offsets-{generation}.npy",
+             "documents": f"documents-{generation}.bin"}
+    np.save(directory / files["vectors"], data)
+    if scales is not None:
+        files["scales"] = f"scales-{generation}.npy"
+        np.save(directory / files["scales"], scales)
+    blobs = [(doc or "").encode("utf-8") for doc in documents]
+    np.save(directory / files["offsets"], np.cumsum([0] + [len(b) for b in blobs], dtype=np.int64))
+    with open(directory / files["documents"], "wb") as f:
+        for blob in blobs:
+            f.write(blob)
+
+    meta = {
+        "version": FORMAT_VERSION,
+        "generation": generation,
+        "created_at": time.time(),
+        "model_id": model_id,
+        "dtype": dtype,
+        "count": len(ids),
+        "dimension": int(matrix.shape[1]) if len(ids) else 0,
+        "bytes": int(data.nbytes),
+        "recall": {f"{d}@{recall_k}": round(quantization_recall(matrix, d, k=recall_k), 4) for d in SNAPSHOT_DTYPES},
+        "files": files,
+        "ids": list(ids),
+        "metadatas": list(metadatas),
+    }
+    tmp_path = directory / (META_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, directory / META_FILE)
+
+    current = set(files.values())
+    for path in directory.glob("*-*.*"):
+        if path.name not in current and path.suffix in (".npy", ".bin"):
+            try:
+                path.unlink()
+            except OSError:
+                logger.warning("Unable to remove old snapshot file %s", path)
+    return meta
+
+
+def export_collection(collection, directory, dtype: str = "float32", model_id: str | None = None) -> dict:
+    """Write a snapshot of every vector, document and metadata entry of a Chroma collection."""
+    data = collection.get(include=["embeddings", "documents", "metadatas"])
+    return write_snapshot(directory, data["ids"], data["embeddings"], data["documents"], data["metadatas"],
+                          dtype=dtype, model_id=model_id)
+
+
+class _MappedDocuments:
+    """Read-only sequence of documents decoded on access from the mapped blob."""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        return self._blob[start:end].tobytes().decode("utf-8")
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+class SnapshotVectorIndex(NumpyVectorIndex):
+    """
+    `NumpyVectorIndex` over a memory-mapped snapshot (see `write_snapshot`).
+
+    Vectors and documents stay in the mapped files; quantized rows are
+    scored a block at a time. Also answers Chroma-style `get` calls, so it
+    can stand in for the collection (e.g. to build the BM25 index).
+
+    Args:
+        directory: Snapshot directory containing `meta.json`.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        with open(self.directory / META_FILE, encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot version in {self.directory}")
+        files = self.meta["files"]
+        self.ids = self.meta["ids"]
+        self.metadatas = self.meta["metadatas"]
+        self.matrix = np.load(self.directory / files["vectors"], mmap_mode="r")
+        self.scales = np.load(self.directory / files["scales"], mmap_mode="r") if "scales" in files else None
+        offsets = np.load(self.directory / files["offsets"], mmap_mode="r")
+        blob_path = self.directory / files["documents"]
+        blob = np.memmap(blob_path, dtype=np.uint8, mode="r") if blob_path.stat().st_size else np.empty(0, np.uint8)
+        self.documents = _MappedDocuments(blob, offsets)
+        logger.info(
+            "Mapped NG12 snapshot %s: %d %s vectors from %s",
+            self.meta["generation"], len(self.ids), self.meta["dtype"], self.directory,
+        )
+
+    @property
+    def dtype(self) -> str:
+        return self.meta["dtype"]
+
+    @property
+    def dimension(self) -> int:
+        return self.meta["dimension"]
+
+    def _scores(self, queries: np.ndarray) -> np.ndarray:
+        if self.matrix.dtype == np.float32:
+            return queries @ self.matrix.T
+        scores = np.empty((len(queries), len(self)), dtype=np.float32)
+        for start in range(0, len(self), SCORE_BLOCK_ROWS):
+            end = start + SCORE_BLOCK_ROWS
+            block = dequantize(self.matrix[start:end], None if self.scales is None else self.scales[start:end])
+            scores[:, start:end] = queries @ block.T
+        return scores
+
+    def get(self, include=("documents", "metadatas"), **_) -> dict:
+        """Chroma-compatible `get` of the whole snapshot."""
+        data = {"ids": list(self.ids)}
+        if "documents" in include:
+            data["documents"] = list(self.documents)
+        if "metadatas" in include:
+            data["metadatas"] = list(self.metadatas)
+        if "embeddings" in include:
+            data["embeddings"] = dequantize(self.matrix, self.scales)
+        return data
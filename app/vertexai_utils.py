@@ -1,14 +1,33 @@
 """Vertex AI initialization utilities for NG12 Cancer Risk Assessor."""
 
-import vertexai
 import os
+import threading
 from app.config import GCP_PROJECT, GCP_REGION
 
+_initialized = False
+_lock = threading.Lock()
+
 
 def init_vertexai():
-    """Initialize Vertex AI with GCP project and region settings."""
-    os.environ["GOOGLE_GENAI_USE_VERTEXAI"] = "True"
-    os.environ["GOOGLE_CLOUD_PROJECT"] = GCP_PROJECT
-    os.environ["GOOGLE_CLOUD_LOCATION"] = GCP_REGION
+    """
+    Initialize Vertex AI with GCP project and region settings.
+
+    Runs once per process, on first use: importing `vertexai` is slow, so
+    nothing calls this at import time. Later calls return immediately.
+    """
+    global _initialized
+    if _initialized:
+        return
+    with _lock:
+        if _initialized:
+            return
+        import vertexai
+
+        if not GCP_PROJECT:
+            raise RuntimeError("GOOGLE_CLOUD_PROJECT is not set; it is required to use Vertex AI")
+        os.environ["GOOGLE_GENAI_USE_VERTEXAI"] = "True"
+        os.environ["GOOGLE_CLOUD_PROJECT"] = GCP_PROJECT
+        os.environ["GOOGLE_CLOUD_LOCATION"] = GCP_REGION
 
-    vertexai.init(project=GCP_PROJECT, location=GCP_REGION)
+        vertexai.init(project=GCP_PROJECT, location=GCP_REGION)
+        _initialized = True
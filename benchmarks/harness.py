@@ -0,0 +1,152 @@
+"""Timing helpers, result files and baseline comparison for the benchmark suite."""
+
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+FORMAT_VERSION = 1
+
+
+def summarize(samples_s: list[float]) -> dict:
+    """Latency statistics in milliseconds for a list of durations in seconds."""
+    samples = sorted(s * 1000 for s in samples_s)
+    if not samples:
+        return {"n": 0}
+
+    def percentile(p):
+        index = min(len(samples) - 1, max(0, round(p / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    return {
+        "n": len(samples),
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "p50_ms": round(percentile(50), 4),
+        "p95_ms": round(percentile(95), 4),
+        "max_ms": round(samples[-1], 4),
+    }
+
+
+def measure(fn, repeat: int, warmup: int = 0) -> dict:
+    """Call `fn()` `warmup` times untimed, then `repeat` times timed; return `summarize` stats."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def throughput(items: int, seconds: float) -> dict:
+    return {
+        "items": items,
+        "seconds": round(seconds, 4),
+        "items_per_sec": round(items / seconds, 2) if seconds else None,
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, timeout=10,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def make_report(results: dict, options: dict) -> dict:
+    return {
+        "version": FORMAT_VERSION,
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "options": options,
+        },
+        "results": results,
+    }
+
+
+def write_report(report: dict, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+
+
+def load_report(path) -> dict:
+    report = json.loads(Path(path).read_text(encoding="utf-8"))
+    if report.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported benchmark report version in {path}")
+    return report
+
+
+def _flatten(results: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def _direction(metric: str) -> int:
+    """+1 if higher is better, -1 if lower is better, 0 if the metric is not compared."""
+    leaf = metric.rsplit(".", 1)[-1]
+    if leaf.endswith("_per_sec"):
+        return 1
+    if leaf in ("mean_ms", "p50_ms", "p95_ms") or leaf.endswith("_seconds"):
+        return -1
+    return 0
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.2) -> list[dict]:
+    """
+    Compare two reports metric by metric.
+
+    Latencies (`mean_ms`, `p50_ms`, `p95_ms`, `*_seconds`) regress when they
+    grow, throughputs (`*_per_sec`) when they shrink, by more than
+    `threshold` (a fraction: 0.2 = 20%). Metrics present in only one report
+    are ignored.
+
+    Returns:
+        list of {"metric", "baseline", "current", "change", "regression"}.
+    """
+    base = _flatten(baseline["results"])
+    curr = _flatten(current["results"])
+    rows = []
+    for metric in sorted(base.keys() & curr.keys()):
+        direction = _direction(metric)
+        if not direction or not base[metric]:
+            continue
+        change = (curr[metric] - base[metric]) / abs(base[metric])
+        rows.append({
+            "metric": metric,
+            "baseline": base[metric],
+            "current": curr[metric],
+            "change": round(change, 4),
+            "regression": -direction * change > threshold,
+        })
+    return rows
+
+
+def format_comparison(rows: list[dict]) -> str:
+    lines = [f"{'metric':<56}{'baseline':>12}{'current':>12}{'change':>9}"]
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        lines.append(
+            f"{row['metric']:<56}{row['baseline']:>12.4g}{row['current']:>12.4g}"
+            f"{row['change']:>+9.1%}{flag}"
+        )
+    regressions = sum(row["regression"] for row in rows)
+    lines.append(f"{regressions} regression(s) in {len(rows)} compared metrics")
+    return "\n".join(lines)
@@ -0,0 +1,420 @@
+"""
+Benchmark suite for retrieval, patient lookup, ingestion, app startup and the HTTP API.
+
+Everything runs locally: Vertex AI embeddings and the ADK models are
+replaced by the stand-ins in `benchmarks.stubs`, and the checked-in vector
+store is copied to a scratch directory before it is opened.
+
+Usage:
+    python -m benchmarks.run                       # all benchmarks, JSON to stdout
+    python -m benchmarks.run --only search http -o results.json
+    python -m benchmarks.run --save-baseline       # write benchmarks/baseline.json
+    python -m benchmarks.run --compare benchmarks/baseline.json
+    python -m benchmarks.run compare baseline.json results.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from pathlib import Path
+
+# Keep runs hermetic before any app module reads its configuration.
+os.environ.setdefault("GOOGLE_CLOUD_PROJECT", "benchmark")
+os.environ.setdefault("EMBEDDING_CACHE_PATH", "")
+
+from benchmarks.harness import (  # noqa: E402
+    compare,
+    format_comparison,
+    load_report,
+    make_report,
+    measure,
+    summarize,
+    throughput,
+    write_report,
+)
+
+BENCH_DIR = Path(__file__).resolve().parent
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+
+QUERIES = [
+    "unexplained haemoptysis in a smoker aged over 40",
+    "urgent referral criteria for dyspepsia",
+    "dysphagia oesophageal cancer referral",
+    "iron-deficiency anaemia colorectal cancer FIT",
+    "visible haematuria bladder cancer age 45",
+    "persistent hoarseness laryngeal cancer",
+    "breast lump aged 30 and over",
+    "PSA test prostate cancer lower urinary tract symptoms",
+    "chest X-ray for cough and fatigue",
+    "postmenopausal bleeding endometrial cancer",
+    "unexplained weight loss upper abdominal pain",
+    "rectal bleeding change in bowel habit",
+    "skin lesion melanoma weighted checklist",
+    "childhood cancer unexplained bruising",
+    "testicular swelling or mass",
+    "abdominal mass ovarian cancer CA125",
+]
+
+_SYMPTOMS = [
+    "persistent cough", "fatigue", "unexplained hemoptysis", "weight loss", "dysphagia",
+    "dyspepsia", "sore throat", "hoarseness", "breast lump", "visible haematuria",
+]
+
+
+# --------------------------------------------------------------------------- search
+
+
+def bench_search(args, workdir: Path) -> dict:
+    """search_nice_ng12_guidelines latency: cold (fresh store handle and cache) and warm."""
+    import chromadb
+
+    import app.tools.nice_guideline_tool as ng
+    from app.config import BM25_INDEX_PATH, VECTOR_COLLECTION_NAME, VECTOR_STORE_DIR
+    from app.embedding_cache import EmbeddingCache
+    from app.vector_snapshot import SnapshotVectorIndex, export_collection
+    from benchmarks.stubs import LocalVertexEmbeddings
+
+    store = workdir / "chroma"
+    shutil.copytree(VECTOR_STORE_DIR, store)
+    if Path(BM25_INDEX_PATH).exists():
+        shutil.copy(BM25_INDEX_PATH, workdir / "bm25.json")
+        ng.BM25_INDEX_PATH = str(workdir / "bm25.json")
+    else:
+        ng.BM25_INDEX_PATH = str(workdir / "missing-bm25.json")
+
+    collection = chromadb.PersistentClient(path=str(store)).get_collection(VECTOR_COLLECTION_NAME)
+    sample = collection.get(limit=1, include=["embeddings"])
+    snapshot_dir = workdir / "snapshot"
+    snapshot = export_collection(collection, snapshot_dir, dtype=args.snapshot_dtype)
+    provider = LocalVertexEmbeddings(dimension=len(sample["embeddings"][0]), latency_ms=args.vertex_latency_ms)
+    ng._embedding_provider = provider
+
+    def fresh(engine):
+        previous = ng._retriever
+        if previous is not None:
+            previous.close()
+        ng.set_retriever(ng.GuidelineRetriever(vector_store_dir=store, engine=engine, snapshot_dir=snapshot_dir))
+        ng._embedding_cache = EmbeddingCache(provider.model_id, maxsize=1024, path=None)
+
+    def search(query, **kwargs):
+        result = ng.search_nice_ng12_guidelines(query, **kwargs)
+        if "error" in result:
+            raise RuntimeError(f"search failed for {query!r}")
+        return result
+
+    counter = iter(range(10**9))
+
+    def uncached_query():
+        i = next(counter)
+        return f"{QUERIES[i % len(QUERIES)]} #{i}"
+
+    results = {
+        "store": {"chunks": None, "dimension": provider.dimension},
+        "snapshot_load": measure(lambda: SnapshotVectorIndex(snapshot_dir), repeat=20),
+        "snapshot_recall": snapshot["recall"],
+    }
+    for engine in ng.GuidelineRetriever.ENGINES:
+        cold = []
+        for query in QUERIES[:args.cold_repeat]:
+            fresh(engine)
+            start = time.perf_counter()
+            search(query)
+            cold.append(time.perf_counter() - start)
+
+        fresh(engine)
+        search(QUERIES[0])
+        results[engine] = {
+            "cold": summarize(cold),
+            "warm_cached": measure(lambda: search(QUERIES[0]), repeat=args.repeat, warmup=5),
+            "warm_uncached": measure(
+                lambda: search(uncached_query()),
+                repeat=args.repeat,
+                warmup=5,
+            ),
+        }
+        if engine == "numpy":
+            results["store"]["chunks"] = len(ng.get_retriever()._index)
+
+    fresh("numpy")
+    results["lexical"] = {
+        "warm": measure(lambda: search(QUERIES[1], mode="lexical"), repeat=args.repeat, warmup=5),
+    }
+    results["hybrid"] = {
+        "warm_cached": measure(lambda: search(QUERIES[1], mode="hybrid"), repeat=args.repeat, warmup=5),
+    }
+    ng._retriever.close()
+    ng.set_retriever(None)
+    return results
+
+
+# --------------------------------------------------------------------------- patients
+
+
+def write_patients(path: Path, count: int) -> list[str]:
+    """Write `count` synthetic NDJSON patient records; returns their ids."""
+    ids = []
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            patient_id = f"PT-{i:07d}"
+            ids.append(patient_id)
+            symptoms = json.dumps([_SYMPTOMS[i % len(_SYMPTOMS)], _SYMPTOMS[(i * 7) % len(_SYMPTOMS)]])
+            f.write(
+                f'{{"patient_id": "{patient_id}", "name": "Patient {i}", "age": {18 + i % 70}, '
+                f'"gender": "{"Female" if i % 2 else "Male"}", "smoking_history": '
+                f'"{"Never Smoked" if i % 3 else "Current Smoker"}", "symptoms": {symptoms}, '
+                f'"symptom_duration_days": {1 + i % 90}}}\n'
+            )
+    return ids
+
+
+def bench_patients(args, workdir: Path) -> dict:
+    """get_patient_data latency against synthetic NDJSON stores of each size."""
+    import app.tools.patient_data_tool as patient_tool
+
+    rng = random.Random(12)
+    original_path = patient_tool.DATA_PATH
+    results = {}
+    for size in args.patient_sizes:
+        path = workdir / f"patients_{size}.ndjson"
+        ids = write_patients(path, size)
+        patient_tool.DATA_PATH = path
+        patient_tool._STORE = None
+
+        start = time.perf_counter()
+        if patient_tool.get_patient_data(ids[0]).get("patient_id") != ids[0]:
+            raise RuntimeError("patient lookup returned the wrong record")
+        index_seconds = time.perf_counter() - start
+
+        lookups = [rng.choice(ids) for _ in range(args.repeat * 10)]
+        cursor = iter(lookups)
+        results[str(size)] = {
+            "file_mb": round(path.stat().st_size / 1e6, 2),
+            "index_seconds": round(index_seconds, 4),
+            "lookup_hit": measure(lambda: patient_tool.get_patient_data(next(cursor)), repeat=len(lookups)),
+            "lookup_miss": measure(lambda: patient_tool.get_patient_data("PT-missing"), repeat=args.repeat),
+        }
+        patient_tool._STORE = None
+        path.unlink()
+    patient_tool.DATA_PATH = original_path
+    return results
+
+
+# --------------------------------------------------------------------------- ingestion
+
+
+def bench_ingestion(args, workdir: Path) -> dict:
+    """load_and_chunk_pdf and embed_documents throughput on data/ng12.pdf."""
+    import ingestion.ingest_ng12 as ingest
+    from app.config import DATA_DIR
+    from benchmarks.stubs import LocalVertexEmbeddings
+
+    tokenizer = ingest.get_encoding().name
+    pdf_path = DATA_DIR / "ng12.pdf"
+    pages = len(ingest.PdfReader(str(pdf_path)).pages)
+    results = {"tokenizer": tokenizer, "pages": pages}
+
+    documents = []
+    for label, workers in (("workers_1", 1), ("workers_auto", None)):
+        timings = []
+        for _ in range(args.ingest_repeat):
+            start = time.perf_counter()
+            documents, _, _ = ingest.load_and_chunk_pdf(pdf_path, workers=workers)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        results[f"load_and_chunk_pdf_{label}"] = {
+            "best_seconds": round(best, 4),
+            "pages_per_sec": round(pages / best, 2),
+            "chunks": len(documents),
+        }
+
+    provider = LocalVertexEmbeddings(dimension=args.embedding_dim, latency_ms=args.vertex_latency_ms)
+    embedder = ingest.BatchEmbedder(provider.model_id, provider=provider, backoff=0)
+    start = time.perf_counter()
+    vectors = ingest.embed_documents(documents, provider.model_id, batch_size=args.embed_batch_size, embedder=embedder)
+    elapsed = time.perf_counter() - start
+    if len(vectors) != len(documents):
+        raise RuntimeError("embed_documents returned the wrong number of vectors")
+    embed = throughput(len(documents), elapsed)
+    results["embed_documents"] = {
+        "chunks": embed["items"],
+        "best_seconds": embed["seconds"],
+        "chunks_per_sec": embed["items_per_sec"],
+        "requests": embedder.stats["requests"],
+        "workers": embedder.workers,
+    }
+    return results
+
+
+# --------------------------------------------------------------------------- startup
+
+
+def bench_startup(args, workdir: Path) -> dict:
+    """Time to `import app.main` in a fresh interpreter, i.e. a replica's cold start before serving."""
+    script = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+    env = dict(os.environ, WARMUP_ON_STARTUP="false")
+    samples = []
+    for _ in range(args.cold_repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", script], cwd=BENCH_DIR.parent, env=env,
+            capture_output=True, text=True, check=True,
+        ).stdout
+        samples.append(float(out.strip().splitlines()[-1]))
+    return {"import_app_main": summarize(samples)}
+
+
+# --------------------------------------------------------------------------- http
+
+
+def bench_http(args, workdir: Path) -> dict:
+    """Per-request overhead of /chat and /assess with the ADK models and embeddings stubbed out."""
+    from fastapi.testclient import TestClient
+
+    import app.main as main
+    import app.tools.nice_guideline_tool as ng
+    from app.answer_cache import SemanticAnswerCache
+    from app.assessment_cache import AssessmentCache
+    from app.embedding_cache import EmbeddingCache
+    from benchmarks.stubs import LocalAssessApp, LocalRunner, LocalVertexEmbeddings
+
+    main.runner = LocalRunner(latency_ms=args.model_latency_ms)
+    main.assess_app = LocalAssessApp(latency_ms=args.model_latency_ms)
+    # The answer cache embeds the first /chat message of every session.
+    provider = LocalVertexEmbeddings(dimension=args.embedding_dim, latency_ms=args.vertex_latency_ms)
+    ng._embedding_provider = provider
+    ng._embedding_cache = EmbeddingCache(provider.model_id, maxsize=1024, path=None)
+    # No context manager: the lifespan would warm up the real vector store and Vertex AI.
+    client = TestClient(main.app)
+    sessions = iter(range(10**9))
+
+    def post(path, body):
+        response = client.post(path, json=body)
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} returned {response.status_code}")
+        return response
+
+    def chat(expected_cache=None, message="When should haemoptysis be referred?"):
+        response = post("/chat", {"message": message, "session_id": f"bench-{next(sessions)}"})
+        if response.headers.get("x-answer-cache") != expected_cache:
+            raise RuntimeError(f"/chat answer cache header was {response.headers.get('x-answer-cache')}")
+
+    def assess(expected_path):
+        response = post("/assess", {"patient_id": "PT-101", "user_id": "bench"})
+        if response.headers.get("x-assessment-path") != expected_path:
+            raise RuntimeError(f"/assess took the {response.headers.get('x-assessment-path')} path")
+
+    main.answer_cache = SemanticAnswerCache(maxsize=0)
+    results = {"chat": measure(chat, repeat=args.repeat, warmup=5)}
+
+    # A threshold above 1 never matches: every request embeds, misses, runs the agent and stores.
+    main.answer_cache = SemanticAnswerCache(threshold=2.0)
+    questions = iter(range(10**9))
+    results["chat_cache_miss"] = measure(
+        lambda: chat(message=f"{QUERIES[0]} #{next(questions)}"), repeat=args.repeat, warmup=5
+    )
+
+    main.answer_cache = SemanticAnswerCache()
+    chat()  # fills the cache
+    results["chat_cache_hit"] = measure(lambda: chat("hit"), repeat=args.repeat, warmup=5)
+
+    main.PRESCREEN_ENABLED = False
+    main.assessment_cache = AssessmentCache(maxsize=0)
+    results["assess_agent"] = measure(lambda: assess("agent"), repeat=args.repeat, warmup=5)
+
+    main.assessment_cache = AssessmentCache()
+    assess("agent")  # fills the cache
+    results["assess_cache"] = measure(lambda: assess("cache"), repeat=args.repeat, warmup=5)
+
+    main.PRESCREEN_ENABLED = True
+    results["assess_rules"] = measure(lambda: assess("rules"), repeat=args.repeat, warmup=5)
+    results["embedding_calls"] = provider.calls
+    return results
+
+
+BENCHMARKS = {
+    "search": bench_search,
+    "patients": bench_patients,
+    "ingestion": bench_ingestion,
+    "startup": bench_startup,
+    "http": bench_http,
+}
+
+
+def run(args) -> dict:
+    # Per-request INFO logging would dominate the timings.
+    logging.disable(logging.INFO)
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="ng12-bench-") as tmp:
+        for name in args.only or list(BENCHMARKS):
+            workdir = Path(tmp) / name
+            workdir.mkdir()
+            print(f"running {name}...", file=sys.stderr)
+            started = time.perf_counter()
+            # Progress prints from the code under test must not mix with the JSON report.
+            with redirect_stdout(sys.stderr):
+                results[name] = BENCHMARKS[name](args, workdir)
+            print(f"  {name} done in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    options = {
+        key: value for key, value in vars(args).items()
+        if key not in ("output", "compare", "save_baseline", "command", "baseline", "current")
+    }
+    return make_report(results, options)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command")
+
+    cmp_parser = sub.add_parser("compare", help="compare two saved reports")
+    cmp_parser.add_argument("baseline")
+    cmp_parser.add_argument("current")
+    cmp_parser.add_argument("--threshold", type=float, default=0.2)
+
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS))
+    parser.add_argument("-o", "--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare this run against a saved report")
+    parser.add_argument("--save-baseline", action="store_true", help=f"also write {DEFAULT_BASELINE}")
+    parser.add_argument("--threshold", type=float, default=0.2, help="regression threshold (0.2 = 20%%)")
+    parser.add_argument("--repeat", type=int, default=200, help="timed iterations per latency metric")
+    parser.add_argument("--cold-repeat", type=int, default=5, help="cold-start searches per engine")
+    parser.add_argument("--ingest-repeat", type=int, default=3)
+    parser.add_argument("--patient-sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--vertex-latency-ms", type=float, default=0.0, help="simulated embedding round trip")
+    parser.add_argument("--model-latency-ms", type=float, default=0.0, help="simulated LLM turn")
+    parser.add_argument("--embedding-dim", type=int, default=3072)
+    parser.add_argument("--snapshot-dtype", default="float32", choices=["float32", "float16", "int8"])
+    parser.add_argument("--embed-batch-size", type=int, default=32)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.command == "compare":
+        rows = compare(load_report(args.baseline), load_report(args.current), args.threshold)
+        print(format_comparison(rows))
+        return 1 if any(row["regression"] for row in rows) else 0
+
+    report = run(args)
+    if args.output:
+        write_report(report, args.output)
+    else:
+        print(json.dumps(report, indent=2, sort_keys=True))
+    if args.save_baseline:
+        write_report(report, DEFAULT_BASELINE)
+
+    if args.compare:
+        rows = compare(load_report(args.compare), report, args.threshold)
+        print(format_comparison(rows), file=sys.stderr)
+        return 1 if any(row["regression"] for row in rows) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""Local stand-ins for Vertex AI and the ADK models used by the benchmarks."""
+
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+from app.embeddings import HashingEmbeddingProvider
+
+
+class LocalVertexEmbeddings(HashingEmbeddingProvider):
+    """
+    Offline replacement for the Vertex embedding provider.
+
+    Produces hashing-trick vectors of the same dimension as the vector
+    store being queried and can simulate a per-request round trip, so
+    results measure local overhead (latency_ms=0) or a realistic mix.
+
+    Args:
+        dimension: Vector length (must match the store).
+        latency_ms: Sleep added to every `embed` call.
+    """
+
+    name = "vertex-stand-in"
+
+    def __init__(self, dimension: int, latency_ms: float = 0.0):
+        super().__init__(dimension)
+        self.latency_ms = latency_ms
+        self.calls = 0
+
+    @property
+    def model_id(self) -> str:
+        return f"vertex-stand-in-{self.dimension}"
+
+    def embed(self, texts):
+        self.calls += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return super().embed(texts)
+
+
+def canned_assessment(patient_id: str) -> str:
+    return json.dumps({
+        "patient_id": patient_id,
+        "recommendation": "urgent investigation",
+        "justification": "NG12 1.1.2 (benchmark stand-in)",
+        "references": [{"source": "NG12 PDF", "page": 9, "chunk_id": "ng12_0009_08"}],
+    })
+
+
+class LocalAssessApp:
+    """Replaces `assess_app`: streams one canned assessment after an optional delay."""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+
+    async def async_stream_query(self, user_id, message):
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        patient_id = message.rsplit(" ", 1)[-1]
+        yield {"content": {"parts": [{"text": canned_assessment(patient_id)}]}}
+
+
+class LocalRunner:
+    """Replaces the ADK `Runner` behind /chat: yields one canned NG12Response event."""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+
+    async def run_async(self, session_id, user_id, new_message, **kwargs):
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        answer = json.dumps({
+            "session_id": session_id,
+            "answer": "Refer people aged 40 and over with unexplained haemoptysis.",
+            "citations": [{
+                "source": "NG12 PDF", "page": 9, "chunk_id": "ng12_0009_08",
+                "excerpt": "1.1.1 Refer people using a suspected cancer pathway referral...",
+            }],
+        })
+        yield SimpleNamespace(
+            author="ng12_agent",
+            content=SimpleNamespace(role="model", parts=[SimpleNamespace(text=answer)]),
+        )
@@ -1,29 +1,121 @@
-import vertexai
-from vertexai.preview.language_models import TextEmbeddingModel
+import hashlib
+import os
+import random
+import shutil
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
 from pypdf import PdfReader
 import chromadb
-import tiktoken
-from app.config import DATA_DIR, VECTOR_STORE_DIR, GCP_PROJECT, GCP_REGION, EMBEDDING_MODEL_NAME
+from app.config import (
+    DATA_DIR, VECTOR_STORE_DIR, GCP_PROJECT, GCP_REGION, EMBEDDING_MODEL_NAME,
+    INGEST_EMBED_WORKERS, INGEST_EMBED_RPS, INGEST_EMBED_MAX_RETRIES, INGEST_CHECKPOINT_DIR,
+    BM25_INDEX_PATH, EMBEDDING_PROVIDER, HASHING_EMBEDDING_DIM, SYMPTOM_INDEX_PATH, SYMPTOM_INDEX_TOP_N,
+    SNAPSHOT_DIR, SNAPSHOT_DTYPE,
+)
+from app.bm25 import BM25Index
+from app.symptom_index import SymptomEvidenceIndex, symptom_vocabulary
+from app.vector_snapshot import export_collection
+from app.embeddings import create_embedding_provider
+from app.tokenizer import get_encoding
 from app.vertexai_utils import init_vertexai
 
 
-def chunk_text_tokens(text, max_tokens=1000, overlap_tokens=100):
-    """
-    Split text into chunks safely using token count for Vertex embeddings.
-    """
-    encoding = tiktoken.get_encoding("cl100k_base")  # compatible with Vertex models
+def _encode_page(page_number, text):
+    encoding = get_encoding()
     tokens = encoding.encode(text)
-    chunks = []
+    _, offsets = encoding.decode_with_offsets(tokens)
+    return page_number, text, tokens, offsets
+
+
+def _slice(page, end):
+    """Text of the page's first `end` tokens (all of it when `end` reaches the last token)."""
+    _, text, tokens, offsets = page
+    return text[:offsets[end]] if end < len(tokens) else text
+
+
+def _page_windows(page, following, max_tokens, overlap_tokens, with_token_counts):
+    page_number, text, tokens, offsets = page
+    step = max(1, max_tokens - overlap_tokens)
     start = 0
-    while start < len(tokens):
-        end = start + max_tokens
-        chunk_tokens = tokens[start:end]
-        chunk_text = encoding.decode(chunk_tokens)
-        chunks.append(chunk_text)
-        start += max_tokens - overlap_tokens
-    return chunks
+    while True:
+        end = min(start + max_tokens, len(tokens))
+        chunk = {"text": _slice(page, end)[offsets[start]:], "page_start": page_number, "page_end": page_number}
+        token_count = end - start
+        if end == len(tokens) and following is not None:
+            carry = min(overlap_tokens, max_tokens - token_count, len(following[2]))
+            if carry > 0:
+                chunk["text"] += "\n" + _slice(following, carry)
+                chunk["page_end"] = following[0]
+                token_count += carry
+        if with_token_counts:
+            chunk["token_count"] = token_count
+        yield chunk
+        if end == len(tokens):
+            return
+        start += step
+
+
+def chunk_document(pages, max_tokens=1000, overlap_tokens=100, with_token_counts=False, timer=None):
+    """
+    Split a document into token windows that restart at every page.
+
+    Each page is encoded once with the cached encoder and its windows are
+    sliced from the page text by token offset rather than decoded. The last
+    window of a page carries on into the next page (up to `overlap_tokens`,
+    within `max_tokens`), so text broken by a page break still appears
+    whole. Because windows never slide across the whole document, an edit
+    only changes the chunks of its own page (and the previous page's last
+    chunk if it touches the page's first `overlap_tokens` tokens). Pages are
+    consumed lazily, one page ahead of the chunks yielded.
+
+    Args:
+        pages: Iterable of (page_number, text) in document order.
+        max_tokens: Tokens per window.
+        overlap_tokens: Tokens shared by consecutive windows.
+        with_token_counts: Also return each window's token count.
+        timer: Optional StageTimer charged with the chunking time as "chunk".
+
+    Yields:
+        dicts with "text", "page_start", "page_end" (and "token_count").
+    """
+    timer = timer or StageTimer()
+
+    def windows(page, following):
+        start = time.perf_counter()
+        chunks = list(_page_windows(page, following, max_tokens, overlap_tokens, with_token_counts))
+        timer.add("chunk", time.perf_counter() - start, len(chunks))
+        return chunks
+
+    previous = None
+    for page_number, text in pages:
+        if not text:
+            continue
+        with timer.stage("chunk"):
+            page = _encode_page(page_number, text)
+        if previous is not None:
+            yield from windows(previous, page)
+        previous = page
+    if previous is not None:
+        yield from windows(previous, None)
 
 
+def content_chunk_id(text, model_name, occurrence=1):
+    """
+    Stable Chroma id for a chunk, derived from its text and the embedding model.
+
+    The same text always maps to the same id, so re-ingestion can tell which
+    chunks are unchanged; repeated identical chunks get an occurrence suffix.
+    """
+    digest = hashlib.sha256(f"{model_name}\x00{text}".encode("utf-8")).hexdigest()[:32]
+    return f"ng12-{digest}" if occurrence == 1 else f"ng12-{digest}-{occurrence}"
+
 
 # Helper to batch large lists
 def batch(iterable, batch_size=250):
@@ -31,84 +123,411 @@ def batch(iterable, batch_size=250):
         yield iterable[i:i + batch_size]
 
 
+def iter_batches(iterable, batch_size=250):
+    """Like `batch`, but for any iterable (including generators); yields lists."""
+    iterator = iter(iterable)
+    while True:
+        items = list(islice(iterator, batch_size))
+        if not items:
+            return
+        yield items
+
+
+class StageTimer:
+    """Accumulates wall-clock seconds and item counts per pipeline stage."""
+
+    def __init__(self):
+        self.seconds = {}
+        self.items = {}
+        self._started = time.perf_counter()
+
+    def add(self, name, seconds, items=0):
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+        self.items[name] = self.items.get(name, 0) + items
+
+    @contextmanager
+    def stage(self, name, items=0):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start, items)
+
+    def timed(self, name, iterable):
+        """Yield from `iterable`, charging the time spent producing each item to `name`."""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(name, time.perf_counter() - start)
+                return
+            self.add(name, time.perf_counter() - start, 1)
+            yield item
+
+    def report(self):
+        total = time.perf_counter() - self._started
+        lines = [f"{'stage':<12}{'seconds':>10}{'items':>8}"]
+        for name, seconds in self.seconds.items():
+            lines.append(f"{name:<12}{seconds:>10.2f}{self.items.get(name, 0):>8}")
+        lines.append(f"{'total':<12}{total:>10.2f}")
+        return "\n".join(lines)
+
+
+class RateLimiter:
+    """Spaces calls at least 1 / `rate` seconds apart across threads; a rate of 0 disables it."""
+
+    def __init__(self, rate=0.0):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class EmbeddingCheckpoint:
+    """
+    On-disk store of embeddings computed during an ingestion run.
 
-def main():
-    init_vertexai()
+    Every finished batch is written as one `.npz` file holding the chunk
+    keys and a float32 matrix, so an interrupted run reloads what it had
+    already paid for and only embeds the rest. Keys are per document
+    (model + text), which keeps the checkpoint valid even when a resumed
+    run groups the remaining chunks into different batches.
 
-    pdf_path = DATA_DIR / "ng12.pdf"
+    Args:
+        directory: Checkpoint directory; None disables checkpointing.
+        model_name: Embedding model the vectors belong to.
+    """
 
-    documents, metadatas, ids = load_and_chunk_pdf(pdf_path)
+    def __init__(self, directory, model_name):
+        self.directory = Path(directory) if directory else None
+        self.model_name = model_name
+        self._vectors = {}
+        self._lock = threading.Lock()
+        if self.directory is not None and self.directory.is_dir():
+            for path in sorted(self.directory.glob("batch-*.npz")):
+                try:
+                    with np.load(path) as data:
+                        self._vectors.update(zip(data["keys"].tolist(), data["vectors"]))
+                except (OSError, ValueError, KeyError):
+                    # A batch file cut short by the interruption; it will be re-embedded.
+                    continue
+
+    def key(self, document):
+        return hashlib.sha256(f"{self.model_name}\x00{document}".encode("utf-8")).hexdigest()
+
+    def __len__(self):
+        return len(self._vectors)
+
+    def get(self, document):
+        return self._vectors.get(self.key(document))
+
+    def save(self, documents, vectors):
+        keys = [self.key(d) for d in documents]
+        matrix = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            self._vectors.update(zip(keys, matrix))
+        if self.directory is None:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        name = hashlib.sha256("".join(keys).encode("ascii")).hexdigest()[:32]
+        path = self.directory / f"batch-{name}.npz"
+        tmp_path = self.directory / f"batch-{name}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, keys=np.array(keys), vectors=matrix)
+        os.replace(tmp_path, path)
+
+    def clear(self):
+        with self._lock:
+            self._vectors.clear()
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class BatchEmbedder:
+    """
+    Embeds document batches concurrently with rate limiting, retries and checkpointing.
+
+    Args:
+        model_name: Vertex embedding model name.
+        workers: Batches in flight at once.
+        requests_per_second: Cap on embedding requests per second (0 = unlimited).
+        max_retries: Retries per batch after the first failed attempt.
+        backoff: Base delay in seconds for exponential backoff with jitter.
+        checkpoint: Optional EmbeddingCheckpoint for resuming interrupted runs.
+        provider: EmbeddingProvider to call; defaults to the one selected by
+            EMBEDDING_PROVIDER.
+    """
 
-    print(f"Total chunks: {len(documents)}")
-    if documents:
-        print(f"Max chunk length (words): {max(len(c.split()) for c in documents)}")
+    def __init__(
+        self,
+        model_name,
+        workers=INGEST_EMBED_WORKERS,
+        requests_per_second=INGEST_EMBED_RPS,
+        max_retries=INGEST_EMBED_MAX_RETRIES,
+        backoff=1.0,
+        checkpoint=None,
+        provider=None,
+    ):
+        self.model_name = model_name
+        self.provider = provider or create_embedding_provider(
+            EMBEDDING_PROVIDER, model_name, dimension=HASHING_EMBEDDING_DIM
+        )
+        self.workers = max(1, workers)
+        self.limiter = RateLimiter(requests_per_second)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.checkpoint = checkpoint if checkpoint is not None else EmbeddingCheckpoint(None, model_name)
+        self.stats = {"requests": 0, "retries": 0, "resumed": 0}
+        self._lock = threading.Lock()
+
+    def _request(self, documents):
+        for attempt in range(self.max_retries + 1):
+            self.limiter.wait()
+            try:
+                with self._lock:
+                    self.stats["requests"] += 1
+                return self.provider.embed(documents)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff * (2 ** attempt) * (0.5 + random.random())
+                print(f"Embedding batch failed ({e}); retrying in {delay:.1f}s...")
+                with self._lock:
+                    self.stats["retries"] += 1
+                time.sleep(delay)
+
+    def embed_batch(self, documents):
+        """Return one vector per document, embedding only those missing from the checkpoint."""
+        vectors = [self.checkpoint.get(d) for d in documents]
+        missing = [d for d, v in zip(documents, vectors) if v is None]
+        with self._lock:
+            self.stats["resumed"] += len(documents) - len(missing)
+        if missing:
+            print(f"Embedding batch of {len(missing)} chunks...")
+            fresh = self._request(missing)
+            self.checkpoint.save(missing, fresh)
+            fresh = iter(fresh)
+            vectors = [next(fresh) if v is None else v for v in vectors]
+        return [list(map(float, v)) for v in vectors]
+
+    def map(self, batches):
+        """
+        Embed an iterable of document lists, yielding vectors per batch in input order.
+
+        At most `workers` batches are in flight, so a streaming input is
+        consumed only as fast as embeddings complete.
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = deque()
+            for documents in batches:
+                pending.append(executor.submit(self.embed_batch, documents))
+                if len(pending) >= self.workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
 
-    embeddings = embed_documents(documents, EMBEDDING_MODEL_NAME)
 
-    persist_to_chroma(
-        documents=documents,
-        embeddings=embeddings,
-        metadatas=metadatas,
-        ids=ids,
+def main():
+    provider = create_embedding_provider(EMBEDDING_PROVIDER, EMBEDDING_MODEL_NAME, dimension=HASHING_EMBEDDING_DIM)
+    if provider.name == "vertex":
+        init_vertexai()
+    print(f"Embedding provider: {provider.name} ({provider.model_id}) -> {VECTOR_STORE_DIR}")
+
+    pdf_path = DATA_DIR / "ng12.pdf"
+    timer = StageTimer()
+    checkpoint = EmbeddingCheckpoint(INGEST_CHECKPOINT_DIR, provider.model_id)
+    if len(checkpoint):
+        print(f"Resuming with {len(checkpoint)} checkpointed embeddings")
+
+    # Pages are extracted in a process pool and chunked as they arrive; chunks
+    # stream into embedding and persistence so the first batches are stored
+    # while later pages are still being parsed. Only new or changed chunks
+    # are embedded.
+    chunks = iter_pdf_chunks(pdf_path, timer=timer, model_name=provider.model_id)
+    counts = sync_to_chroma(
+        chunks,
+        model_name=provider.model_id,
         vector_store_dir=VECTOR_STORE_DIR,
         collection_name="ng12",
+        timer=timer,
+        embedder=BatchEmbedder(provider.model_id, checkpoint=checkpoint, provider=provider),
+    )
+    # Everything is persisted in Chroma now, so the checkpoint is no longer needed.
+    checkpoint.clear()
+
+    with timer.stage("bm25"):
+        indexed = persist_bm25_index(VECTOR_STORE_DIR, collection_name="ng12", path=BM25_INDEX_PATH)
+    print(f"BM25 index: {indexed} chunks -> {BM25_INDEX_PATH}")
+
+    with timer.stage("symptom_index"):
+        terms = persist_symptom_index(provider, VECTOR_STORE_DIR, collection_name="ng12", path=SYMPTOM_INDEX_PATH)
+    print(f"Symptom evidence index: {terms} symptoms -> {SYMPTOM_INDEX_PATH}")
+
+    with timer.stage("snapshot"):
+        snapshot = persist_snapshot(VECTOR_STORE_DIR, collection_name="ng12", directory=SNAPSHOT_DIR,
+                                    dtype=SNAPSHOT_DTYPE, model_id=provider.model_id)
+    recall = ", ".join(f"{name} {value:.4f}" for name, value in snapshot["recall"].items())
+    print(
+        f"Snapshot: {snapshot['count']} {snapshot['dtype']} vectors ({snapshot['bytes'] / 1e6:.1f} MB) "
+        f"-> {SNAPSHOT_DIR}; recall vs float32 search: {recall}"
     )
 
+    print(
+        "Chunks added: {added}, updated: {updated}, deleted: {deleted}, skipped: {skipped}".format(**counts)
+    )
+    print(timer.report())
     print("NG12 ingestion complete.")
 
 
+_WORKER_READER = None
 
-def load_and_chunk_pdf(pdf_path):
-    """Read PDF at `pdf_path` and return (documents, metadatas, ids)."""
-    reader = PdfReader(str(pdf_path))
 
-    documents = []
-    metadatas = []
-    ids = []
+def _init_pdf_worker(pdf_path):
+    """Process-pool initializer: open the PDF once per worker."""
+    global _WORKER_READER
+    _WORKER_READER = PdfReader(str(pdf_path))
 
-    chunk_id = 0
 
-    for page_num, page in enumerate(reader.pages):
-        text = page.extract_text()
-        if not text:
-            continue
+def _extract_page(page_index):
+    """Extract one page's text in a worker."""
+    return page_index, _WORKER_READER.pages[page_index].extract_text() or ""
+
+
+def iter_page_texts(pdf_path, workers=None):
+    """
+    Yield (page_index, text) for every page of `pdf_path`, in page order.
+
+    With more than one worker, text extraction runs in a process pool;
+    results are still yielded in page order as soon as each page (and all
+    pages before it) is ready.
+    """
+    workers = workers if workers is not None else os.cpu_count() or 1
+    page_count = len(PdfReader(str(pdf_path)).pages)
 
-        page_chunks = chunk_text_tokens(text)
+    if workers <= 1 or page_count <= 1:
+        _init_pdf_worker(pdf_path)
+        for page_index in range(page_count):
+            yield _extract_page(page_index)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=min(workers, page_count),
+        initializer=_init_pdf_worker,
+        initargs=(str(pdf_path),),
+    ) as executor:
+        yield from executor.map(_extract_page, range(page_count), chunksize=4)
+
+
+def iter_pdf_chunks(pdf_path, workers=None, timer=None, model_name=EMBEDDING_MODEL_NAME):
+    """
+    Yield (document, metadata, id) for each chunk of the PDF.
+
+    Pages are extracted (in parallel) and chunked as they arrive (see
+    `chunk_document`), so only about one page of text is held at a time.
+    `page` and `page_start` are the page a chunk starts on and `page_end`
+    the page it runs into. Ids are content hashes (see `content_chunk_id`).
+    `chunk_id` is `ng12_<page>_<n>`, where n is the page's index in the
+    document plus the window's index within the page: it depends only on
+    the chunk's own page, so the ids cited by `app.prescreen.RULES` survive
+    edits elsewhere, and it is identical whatever the number of workers.
+    """
+    timer = timer or StageTimer()
+    pages = (
+        (page_index + 1, text)
+        for page_index, text in timer.timed("extract", iter_page_texts(pdf_path, workers=workers))
+    )
 
-        for chunk in page_chunks:
-            documents.append(chunk)
-            metadatas.append({
+    occurrences = {}
+    windows = {}
+    for chunk in chunk_document(pages, with_token_counts=True, timer=timer):
+        text = chunk["text"]
+        page = chunk["page_start"]
+        occurrences[text] = occurrences.get(text, 0) + 1
+        windows[page] = windows.get(page, -1) + 1
+        yield (
+            text,
+            {
                 "source": "NG12 PDF",
-                "page": page_num + 1,
-                "chunk_id": f"ng12_{page_num+1:04d}_{chunk_id:02d}"
-            })
-            ids.append(f"chunk-{chunk_id}")
-            chunk_id += 1
+                "page": page,
+                "page_start": page,
+                "page_end": chunk["page_end"],
+                "token_count": chunk["token_count"],
+                "chunk_id": f"ng12_{page:04d}_{page - 1 + windows[page]:02d}"
+            },
+            content_chunk_id(text, model_name, occurrences[text]),
+        )
+
+
+def load_and_chunk_pdf(pdf_path, workers=None):
+    """Read PDF at `pdf_path` and return (documents, metadatas, ids)."""
+    documents = []
+    metadatas = []
+    ids = []
+
+    for document, metadata, chunk_id in iter_pdf_chunks(pdf_path, workers=workers):
+        documents.append(document)
+        metadatas.append(metadata)
+        ids.append(chunk_id)
 
     return documents, metadatas, ids
 
 
-def embed_documents(documents, model_name, batch_size=250):
+def embed_documents(documents, model_name, batch_size=250, embedder=None):
     """Return a list of embedding vectors (lists) for `documents`."""
     if not documents:
         return []
 
-    embedding_model = TextEmbeddingModel.from_pretrained(model_name)
+    embedder = embedder or BatchEmbedder(model_name)
     all_vectors = []
-
-    for doc_batch in batch(documents, batch_size=batch_size):
-        print(f"Embedding batch of {len(doc_batch)} chunks...")
-        batch_embeddings = embedding_model.get_embeddings(doc_batch)
-        all_vectors.extend([e.values for e in batch_embeddings])
+    for vectors in embedder.map(batch(documents, batch_size=batch_size)):
+        all_vectors.extend(vectors)
 
     return all_vectors
 
 
+def embed_stream(chunks, model_name, batch_size=250, timer=None, embedder=None):
+    """
+    Embed a stream of (document, metadata, id) chunks batch by batch.
+
+    Batches are embedded concurrently by `embedder` and yielded as
+    (documents, embeddings, metadatas, ids) in input order.
+    """
+    timer = timer or StageTimer()
+    embedder = embedder or BatchEmbedder(model_name)
+    chunk_batches = deque()
+
+    def documents_of():
+        for chunk_batch in iter_batches(chunks, batch_size=batch_size):
+            chunk_batches.append([list(x) for x in zip(*chunk_batch)])
+            yield chunk_batches[-1][0]
+
+    results = embedder.map(documents_of())
+    while True:
+        start = time.perf_counter()
+        embeddings = next(results, None)
+        if embeddings is None:
+            return
+        documents, metadatas, ids = chunk_batches.popleft()
+        timer.add("embed", time.perf_counter() - start, len(documents))
+        yield documents, embeddings, metadatas, ids
+
+
 def persist_to_chroma(documents, embeddings, metadatas, ids, vector_store_dir, collection_name="ng12"):
     client = chromadb.PersistentClient(path=str(vector_store_dir))
     collection = client.get_or_create_collection(collection_name)
 
-    collection.add(
+    collection.upsert(
         documents=documents,
         embeddings=embeddings,
         metadatas=metadatas,
@@ -116,6 +535,114 @@ def persist_to_chroma(documents, embeddings, metadatas, ids, vector_store_dir, c
     )
 
 
+def persist_stream(batches, vector_store_dir, collection_name="ng12", timer=None):
+    """Upsert each embedded batch into Chroma as it arrives; returns the number of chunks stored."""
+    timer = timer or StageTimer()
+    client = chromadb.PersistentClient(path=str(vector_store_dir))
+    collection = client.get_or_create_collection(collection_name)
+
+    total = 0
+    for documents, embeddings, metadatas, ids in batches:
+        with timer.stage("persist", items=len(documents)):
+            collection.upsert(
+                documents=documents,
+                embeddings=embeddings,
+                metadatas=metadatas,
+                ids=ids,
+            )
+        total += len(documents)
+    return total
+
+
+def sync_to_chroma(
+    chunks, model_name, vector_store_dir, collection_name="ng12", batch_size=250, timer=None, embedder=None
+):
+    """
+    Bring the collection in line with `chunks` without re-embedding unchanged text.
+
+    Chunks whose content-hash id is already stored are skipped, or get a
+    metadata-only update if their page/chunk_id moved. New chunks are
+    embedded and upserted in streaming batches, and ids no longer produced
+    by the source are deleted.
+
+    Returns:
+        dict with "added", "updated", "deleted" and "skipped" counts.
+    """
+    timer = timer or StageTimer()
+    client = chromadb.PersistentClient(path=str(vector_store_dir))
+    collection = client.get_or_create_collection(collection_name)
+
+    with timer.stage("diff"):
+        existing = collection.get(include=["metadatas"])
+        stored = dict(zip(existing["ids"], existing["metadatas"]))
+
+    counts = {"added": 0, "updated": 0, "deleted": 0, "skipped": 0}
+    seen = set()
+    updates = {}
+
+    def new_chunks():
+        for document, metadata, chunk_id in chunks:
+            seen.add(chunk_id)
+            if chunk_id not in stored:
+                yield document, metadata, chunk_id
+            elif stored[chunk_id] != metadata:
+                updates[chunk_id] = metadata
+            else:
+                counts["skipped"] += 1
+
+    for documents, embeddings, metadatas, ids in embed_stream(new_chunks(), model_name, batch_size, timer, embedder):
+        with timer.stage("persist", items=len(documents)):
+            collection.upsert(documents=documents, embeddings=embeddings, metadatas=metadatas, ids=ids)
+        counts["added"] += len(documents)
+
+    with timer.stage("persist"):
+        if updates:
+            collection.update(ids=list(updates), metadatas=list(updates.values()))
+            counts["updated"] = len(updates)
+
+        stale = [chunk_id for chunk_id in stored if chunk_id not in seen]
+        if stale:
+            collection.delete(ids=stale)
+            counts["deleted"] = len(stale)
+
+    return counts
+
+
+def persist_bm25_index(vector_store_dir, collection_name="ng12", path=BM25_INDEX_PATH):
+    """Build the BM25 index over every chunk in the collection and write it to `path`."""
+    client = chromadb.PersistentClient(path=str(vector_store_dir))
+    collection = client.get_or_create_collection(collection_name)
+    index = BM25Index.from_collection(collection)
+    index.save(path)
+    return len(index)
+
+
+def persist_symptom_index(provider, vector_store_dir, collection_name="ng12", path=SYMPTOM_INDEX_PATH,
+                          patients=None, n_results=SYMPTOM_INDEX_TOP_N):
+    """
+    Embed the symptom vocabulary in bulk, rank chunks for every term and write the index to `path`.
+
+    The vocabulary is the pre-screen's canonical terms plus every symptom in
+    `patients` (default: the configured patient data file).
+    """
+    if patients is None:
+        from app.tools.patient_data_tool import load_patients
+
+        patients = load_patients()
+    client = chromadb.PersistentClient(path=str(vector_store_dir))
+    collection = client.get_or_create_collection(collection_name)
+    index = SymptomEvidenceIndex.build(symptom_vocabulary(patients), provider, collection, n_results=n_results)
+    index.save(path)
+    return len(index)
+
+
+def persist_snapshot(vector_store_dir, collection_name="ng12", directory=SNAPSHOT_DIR, dtype=SNAPSHOT_DTYPE,
+                     model_id=None):
+    """Export the collection as the memory-mapped snapshot read by RETRIEVAL_ENGINE=snapshot."""
+    client = chromadb.PersistentClient(path=str(vector_store_dir))
+    collection = client.get_or_create_collection(collection_name)
+    return export_collection(collection, directory, dtype=dtype, model_id=model_id)
+
 
 if __name__ == "__main__":
     main()
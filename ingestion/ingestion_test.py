@@ -1,6 +1,6 @@
 import chromadb
-from vertexai.preview.language_models import TextEmbeddingModel
-from app.config import VECTOR_STORE_DIR, EMBEDDING_MODEL_NAME
+from app.config import VECTOR_STORE_DIR, EMBEDDING_MODEL_NAME, EMBEDDING_PROVIDER, HASHING_EMBEDDING_DIM
+from app.embeddings import create_embedding_provider
 
 # Initialize Chroma client
 client = chromadb.PersistentClient(path=str(VECTOR_STORE_DIR))
@@ -8,14 +8,15 @@ print(client.list_collections())
 
 collection = client.get_collection("ng12")
 print(f"Items in collection: {collection.count()}")
-# Create embedding model
-embedding_model = TextEmbeddingModel.from_pretrained(EMBEDDING_MODEL_NAME)
+# Create embedding provider (EMBEDDING_PROVIDER=hashing runs fully offline)
+provider = create_embedding_provider(EMBEDDING_PROVIDER, EMBEDDING_MODEL_NAME, dimension=HASHING_EMBEDDING_DIM)
+print(f"Embedding provider: {provider.name} ({provider.model_id})")
 
 # Sample query
 query = "What are the urgent referral criteria for dyspepsia?"
 
 # Get query embedding
-query_embedding = embedding_model.get_embeddings([query])[0].values
+query_embedding = provider.embed([query])[0]
 
 # Search Chroma
 results = collection.query(
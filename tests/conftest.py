@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+# Keep the suite hermetic: no real GCP project is needed and nothing is
+# written next to the checked-in vector store.
+os.environ.setdefault("GOOGLE_CLOUD_PROJECT", "test-project")
+os.environ.setdefault("EMBEDDING_CACHE_PATH", "")
+
+# Top-level SDK packages that tests replace with fakes in sys.modules.
+_FAKEABLE = ("chromadb", "vertexai", "google", "tiktoken", "pypdf")
+_PROJECT = ("app", "ingestion")
+
+
+@pytest.fixture(autouse=True)
+def _restore_sys_modules():
+    """Drop fake SDK modules (and project modules bound to them) after each test."""
+    saved = {
+        name: mod for name, mod in sys.modules.items()
+        if name.split(".")[0] in _FAKEABLE + _PROJECT
+    }
+    yield
+    for name in list(sys.modules):
+        root = name.split(".")[0]
+        is_fake = root in _FAKEABLE and getattr(sys.modules[name], "__spec__", None) is None
+        is_new_project_module = root in _PROJECT and name not in saved
+        if is_fake or is_new_project_module:
+            del sys.modules[name]
+    sys.modules.update(saved)
@@ -0,0 +1,62 @@
+from app.answer_cache import SemanticAnswerCache
+
+SCOPE = ("store-v1", "prompt-v1", 5)
+
+
+def test_lookup_returns_closest_answer_above_threshold():
+    cache = SemanticAnswerCache(maxsize=4, threshold=0.9)
+    cache.add("dyspepsia", [1.0, 0.0], SCOPE, "answer-a")
+    cache.add("haematuria", [0.0, 1.0], SCOPE, "answer-b")
+
+    answer, entry = cache.lookup([2.0, 0.3], SCOPE)
+
+    assert answer == "answer-a"
+    assert entry["question"] == "dyspepsia"
+    assert 0.9 <= entry["similarity"] < 1.0
+    assert cache.lookup([1.0, 1.0], SCOPE) is None
+
+
+def test_entries_only_match_within_their_scope():
+    cache = SemanticAnswerCache(maxsize=4, threshold=0.9)
+    cache.add("dyspepsia", [1.0, 0.0], SCOPE, "answer-a")
+
+    assert cache.lookup([1.0, 0.0], ("store-v2", "prompt-v1", 5)) is None
+    assert cache.lookup([1.0, 0.0], ("store-v1", "prompt-v1", 10)) is None
+    assert cache.lookup([1.0, 0.0], SCOPE)[0] == "answer-a"
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticAnswerCache(maxsize=2, threshold=0.99)
+    cache.add("a", [1.0, 0.0, 0.0], SCOPE, "answer-a")
+    cache.add("b", [0.0, 1.0, 0.0], SCOPE, "answer-b")
+    cache.lookup([1.0, 0.0, 0.0], SCOPE)  # "a" is now the most recently used
+
+    cache.add("c", [0.0, 0.0, 1.0], SCOPE, "answer-c")
+
+    assert cache.lookup([0.0, 1.0, 0.0], SCOPE) is None
+    assert cache.lookup([1.0, 0.0, 0.0], SCOPE)[0] == "answer-a"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_stats_report_hits_per_entry():
+    cache = SemanticAnswerCache(maxsize=4, threshold=0.9)
+    cache.add("dyspepsia", [1.0, 0.0], SCOPE, "answer-a")
+    cache.add("haematuria", [0.0, 1.0], SCOPE, "answer-b")
+    for _ in range(3):
+        cache.lookup([1.0, 0.1], SCOPE)
+    cache.lookup([0.1, 1.0], SCOPE)
+    cache.lookup([-1.0, 0.0], SCOPE)
+
+    stats = cache.stats()
+
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (4, 1, 2)
+    assert [(e["question"], e["hits"]) for e in stats["top_entries"]] == [("dyspepsia", 3), ("haematuria", 1)]
+    assert stats["top_entries"][0]["last_hit_at"] is not None
+
+
+def test_zero_size_cache_stores_nothing():
+    cache = SemanticAnswerCache(maxsize=0)
+    cache.add("dyspepsia", [1.0, 0.0], SCOPE, "answer-a")
+
+    assert len(cache) == 0
+    assert cache.lookup([1.0, 0.0], SCOPE) is None
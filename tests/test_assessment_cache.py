@@ -0,0 +1,98 @@
+import os
+import time
+
+from app.assessment_cache import AssessmentCache, record_fingerprint
+from app import prompts
+
+
+RECORD = {"patient_id": "PT-101", "age": 55, "symptoms": ["unexplained hemoptysis"]}
+
+
+def test_record_fingerprint_ignores_key_order():
+    reordered = {"symptoms": ["unexplained hemoptysis"], "age": 55, "patient_id": "PT-101"}
+
+    assert record_fingerprint(RECORD) == record_fingerprint(reordered)
+    assert record_fingerprint(RECORD) != record_fingerprint(dict(RECORD, age=56))
+
+
+def test_key_changes_with_store_version_and_prompt():
+    base = AssessmentCache.key(RECORD, "store-1", "prompt-1")
+
+    assert base == AssessmentCache.key(dict(RECORD), "store-1", "prompt-1")
+    assert base != AssessmentCache.key(RECORD, "store-2", "prompt-1")
+    assert base != AssessmentCache.key(RECORD, "store-1", "prompt-2")
+
+
+def test_entries_expire_after_ttl():
+    cache = AssessmentCache(ttl=0.05)
+    cache.set("k", "{}")
+    assert cache.get("k") == "{}"
+
+    time.sleep(0.06)
+
+    assert cache.get("k") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_size_bound_evicts_least_recently_used():
+    cache = AssessmentCache(maxsize=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_persistent_backend_survives_restart(tmp_path):
+    path = tmp_path / "assessments.sqlite3"
+    AssessmentCache(path=path).set("k", '{"recommendation": "urgent referral"}')
+
+    assert AssessmentCache(path=path).get("k") == '{"recommendation": "urgent referral"}'
+
+
+def test_persistent_backend_evicts_oldest_rows(tmp_path):
+    path = tmp_path / "assessments.sqlite3"
+    cache = AssessmentCache(maxsize=1, path=path, disk_maxsize=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.set("a", "1")  # a rewrite counts as the newest row
+    cache.set("c", "3")
+
+    reopened = AssessmentCache(path=path, disk_maxsize=2)
+    assert reopened.get("b") is None
+    assert reopened.get("a") == "1"
+    assert reopened.get("c") == "3"
+    assert len(reopened._disk) == 2
+    assert cache.stats()["disk_evictions"] == 1
+
+
+def test_persistent_backend_purges_expired_rows_on_set(tmp_path):
+    path = tmp_path / "assessments.sqlite3"
+    cache = AssessmentCache(ttl=0.05, path=path)
+    cache.set("old-1", "1")
+    cache.set("old-2", "2")
+
+    time.sleep(0.06)
+    cache.set("new", "3")
+
+    assert len(cache._disk) == 1
+    assert cache._disk.get("new") == b"3"
+
+
+def test_prompt_hash_tracks_prompt_file(tmp_path, monkeypatch):
+    prompt_file = tmp_path / "PROMPTS.md"
+    prompt_file.write_text("## ASSESSMENT_AGENT\nversion one\n", encoding="utf-8")
+    monkeypatch.setattr(prompts, "PROMPT_PATH", prompt_file)
+    monkeypatch.setattr(prompts, "_prompt_hashes", {})
+
+    first = prompts.prompt_hash("ASSESSMENT_AGENT")
+    prompt_file.write_text("## ASSESSMENT_AGENT\nversion two\n", encoding="utf-8")
+    # make sure the mtime moves even on coarse-grained filesystems
+    st = prompt_file.stat()
+    os.utime(prompt_file, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+    assert prompts.prompt_hash("ASSESSMENT_AGENT") != first
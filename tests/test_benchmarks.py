@@ -0,0 +1,68 @@
+import argparse
+import json
+
+from benchmarks.harness import compare, make_report, summarize
+from benchmarks.run import bench_http, bench_patients, main
+
+
+def test_summarize_reports_milliseconds():
+    stats = summarize([0.001, 0.002, 0.003, 0.004])
+
+    assert stats["n"] == 4
+    assert stats["mean_ms"] == 2.5
+    assert stats["max_ms"] == 4.0
+    assert summarize([]) == {"n": 0}
+
+
+def test_compare_flags_slower_latency_and_lower_throughput():
+    baseline = make_report({
+        "search": {"warm": {"p50_ms": 1.0, "n": 100}},
+        "ingest": {"chunks_per_sec": 100.0, "index_seconds": 2.0},
+    }, {})
+    current = make_report({
+        "search": {"warm": {"p50_ms": 1.5, "n": 10}},
+        "ingest": {"chunks_per_sec": 95.0, "index_seconds": 1.0},
+    }, {})
+
+    rows = {row["metric"]: row for row in compare(baseline, current, threshold=0.2)}
+
+    assert rows["search.warm.p50_ms"]["regression"]
+    assert not rows["ingest.chunks_per_sec"]["regression"]
+    assert not rows["ingest.index_seconds"]["regression"]
+    assert "search.warm.n" not in rows
+
+
+def test_compare_command_exits_non_zero_on_regression(tmp_path, capsys):
+    for name, p50 in (("base.json", 1.0), ("curr.json", 2.0)):
+        (tmp_path / name).write_text(json.dumps(make_report({"x": {"p50_ms": p50}}, {})))
+
+    assert main(["compare", str(tmp_path / "base.json"), str(tmp_path / "curr.json")]) == 1
+    assert "REGRESSION" in capsys.readouterr().out
+    assert main(["compare", str(tmp_path / "base.json"), str(tmp_path / "base.json")]) == 0
+
+
+def test_patient_benchmark_runs_on_a_small_store(tmp_path):
+    args = argparse.Namespace(patient_sizes=[50], repeat=5)
+
+    results = bench_patients(args, tmp_path)
+
+    assert results["50"]["lookup_hit"]["n"] == 50
+    assert results["50"]["index_seconds"] >= 0
+
+
+def test_http_benchmark_stays_offline_and_covers_the_answer_cache(tmp_path, monkeypatch):
+    import app.main as app_main
+    import app.tools.nice_guideline_tool as ng
+
+    for name in ("runner", "assess_app", "answer_cache", "assessment_cache", "PRESCREEN_ENABLED"):
+        monkeypatch.setattr(app_main, name, getattr(app_main, name))
+    for name in ("_embedding_provider", "_embedding_cache"):
+        monkeypatch.setattr(ng, name, getattr(ng, name))
+    args = argparse.Namespace(repeat=2, model_latency_ms=0.0, vertex_latency_ms=0.0, embedding_dim=16)
+
+    results = bench_http(args, tmp_path)
+
+    assert results["chat_cache_hit"]["n"] == 2
+    assert results["chat_cache_miss"]["n"] == 2
+    # One embedding per distinct missed question, plus the question that primes the hit case.
+    assert results["embedding_calls"] == 2 + 5 + 1
@@ -0,0 +1,47 @@
+from app.bm25 import BM25Index, reciprocal_rank_fusion, tokenize
+
+
+def make_index():
+    return BM25Index(
+        ids=["a", "b", "c"],
+        documents=[
+            "Refer people with unexplained haemoptysis for lung cancer.",
+            "Offer an urgent chest X-ray for cough and fatigue. Cough that persists.",
+            "Offer FIT testing for iron-deficiency anaemia.",
+        ],
+        metadatas=[{"page": 9}, {"page": 9}, {"page": 14}],
+    )
+
+
+def test_tokenize_folds_case_spelling_and_stopwords():
+    assert tokenize("The Haemoptysis and ANAEMIA") == ["hemoptysis", "anemia"]
+
+
+def test_search_ranks_matching_chunks_and_ignores_unknown_terms():
+    index = make_index()
+
+    assert [i for i, _ in index.search("persistent cough", 5)] == [1]
+    assert [i for i, _ in index.search("hemoptysis", 5)] == [0]
+    assert index.search("melanoma", 5) == []
+
+    results = index.query(["anemia", "x-ray"], n_results=1)
+    assert results["ids"] == [["c"], ["b"]]
+    assert results["metadatas"] == [[{"page": 14}], [{"page": 9}]]
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = make_index()
+    path = tmp_path / "bm25.json"
+    index.save(path)
+
+    loaded = BM25Index.load(path)
+
+    assert len(loaded) == 3
+    assert loaded.search("urgent cough", 3) == index.search("urgent cough", 3)
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["x", "y", "z"], ["y", "w"]], k=60)
+
+    assert [item for item, _ in fused] == ["y", "x", "w", "z"]
+    assert fused[0][1] == 1 / 62 + 1 / 61
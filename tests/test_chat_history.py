@@ -0,0 +1,70 @@
+import json
+
+import orjson
+import pytest
+from google.adk.events import Event
+from google.genai import types
+
+from app.chat_history import decode_cursor, encode_cursor, history_page, parse_fields
+
+
+def make_events():
+    call = types.Part.from_function_call(name="search_nice_ng12_guidelines", args={"query": "haemoptysis"})
+    result = types.Part.from_function_response(
+        name="search_nice_ng12_guidelines", response={"results": ["x" * 1000]}
+    )
+    return [
+        Event(id="e1", author="user", invocation_id="i", timestamp=1.0,
+              content=types.Content(role="user", parts=[types.Part.from_text(text="question")])),
+        Event(id="e2", author="ng12_agent", invocation_id="i", timestamp=2.0,
+              content=types.Content(role="model", parts=[call])),
+        # Same timestamp as e2: the cursor's id breaks the tie.
+        Event(id="e3", author="ng12_agent", invocation_id="i", timestamp=2.0,
+              content=types.Content(role="user", parts=[result])),
+        Event(id="e4", author="ng12_agent", invocation_id="i", timestamp=3.0,
+              content=types.Content(role="model", parts=[types.Part.from_text(text="answer")])),
+    ]
+
+
+def test_next_cursor_only_when_an_extra_event_was_fetched():
+    events = make_events()
+
+    items, cursor = history_page(events, 3, ("id",), compact=False)
+    last, end = history_page(events[3:], 3, ("id",), compact=False)
+
+    assert [item["id"] for item in items] == ["e1", "e2", "e3"]
+    assert decode_cursor(cursor) == (2.0, "e3")
+    assert [item["id"] for item in last] == ["e4"]
+    assert end is None
+
+
+def test_projection_and_compact_mode_drop_tool_payloads():
+    events = make_events()
+
+    full, _ = history_page(events, 10, ("author", "text", "tool_calls", "tool_results"), compact=False)
+    compact, _ = history_page(events, 10, None, compact=True)
+
+    assert full[0] == {"author": "user", "text": "question", "tool_calls": [], "tool_results": []}
+    assert full[1]["tool_calls"] == [{"name": "search_nice_ng12_guidelines", "args": {"query": "haemoptysis"}}]
+    assert full[2]["tool_results"][0]["response"] == {"results": ["x" * 1000]}
+    assert compact[2]["tool_results"] == [{"name": "search_nice_ng12_guidelines"}]
+    assert compact[1]["tool_calls"] == [{"name": "search_nice_ng12_guidelines"}]
+    assert set(compact[3]) == {"id", "author", "timestamp", "text", "tool_calls", "tool_results"}
+
+
+def test_whole_events_are_embedded_as_serialized_json():
+    events = make_events()
+
+    items, _ = history_page(events, 1, None, compact=False)
+    body = json.loads(orjson.dumps({"events": items}))
+
+    assert body["events"][0]["id"] == "e1"
+    assert body["events"][0]["content"]["parts"][0]["text"] == "question"
+
+
+def test_invalid_fields_and_cursors_are_rejected():
+    with pytest.raises(ValueError):
+        parse_fields("author,secret")
+    with pytest.raises(ValueError):
+        decode_cursor("not a cursor")
+    assert decode_cursor(encode_cursor(make_events()[2])) == (2.0, "e3")
@@ -0,0 +1,134 @@
+from app.context_packer import GAP, merge_chunks, pack_results, split_passages
+from app.tokenizer import count_tokens, get_encoding
+
+PAGE = (
+    "Lung and pleural cancers\n"
+    "1.1.1 Refer people using a suspected cancer pathway referral for lung cancer if they:\n"
+    "• have chest X-ray findings that suggest lung cancer or\n"
+    "• are aged 40 and over with unexplained haemoptysis. [2015]\n"
+    "1.1.2 Offer an urgent chest X-ray to assess for lung cancer in people aged 40 and over\n"
+    "if they have 2 or more of the following unexplained symptoms: cough, fatigue,\n"
+    "shortness of breath, chest pain, weight loss or appetite loss. [2015]\n"
+    "1.1.3 Consider a suspected cancer pathway referral for mesothelioma in people aged 40\n"
+    "and over with chest X-ray findings that suggest mesothelioma. [2015]\n"
+)
+
+
+def result(document, page=10, chunk_id="c", **meta):
+    return {"document": document, "metadata": {"source": "NG12", "page": page, "chunk_id": chunk_id, **meta}}
+
+
+def test_split_keeps_bullets_and_year_markers_with_their_recommendation():
+    passages = split_passages(PAGE)
+
+    assert passages[0] == "Lung and pleural cancers"
+    assert passages[1].startswith("1.1.1 ") and passages[1].endswith("haemoptysis. [2015]")
+    assert passages[2].startswith("1.1.2 ")
+    assert passages[3].startswith("1.1.3 ")
+    assert len(passages) == 4
+
+
+def test_overlapping_chunks_from_one_page_merge_into_one_result():
+    first, second = PAGE[:400], PAGE[250:]
+
+    merged, folded = merge_chunks([result(second, chunk_id="c2"), result(first, chunk_id="c1")])
+
+    assert folded == 1
+    assert merged[0]["document"] == PAGE
+    assert merged[0]["metadata"]["chunk_id"] == "c1"
+    assert merged[0]["metadata"]["chunk_ids"] == ["c1", "c2"]
+    assert merged[0]["metadata"]["page"] == 10
+
+
+def test_chunks_from_distant_pages_are_not_merged():
+    merged, folded = merge_chunks([result(PAGE[:400], page=10), result(PAGE[250:], page=12)])
+
+    assert folded == 0
+    assert len(merged) == 2
+
+
+def test_window_running_into_the_next_page_merges_with_that_page():
+    carried = result("Page nine text.\n" + PAGE[:120], page=9, chunk_id="ng12_0009_08", page_start=9, page_end=10)
+    next_page = result(PAGE, page=10, chunk_id="ng12_0010_09", page_start=10, page_end=10)
+
+    merged, folded = merge_chunks([next_page, carried])
+
+    assert folded == 1
+    assert merged[0]["document"] == "Page nine text.\n" + PAGE
+    assert merged[0]["metadata"]["chunk_ids"] == ["ng12_0009_08", "ng12_0010_09"]
+    assert (merged[0]["metadata"]["page"], merged[0]["metadata"]["page_end"]) == (9, 10)
+
+
+def test_adjacent_pages_merge_in_document_order_and_bridge_earlier_results():
+    results = [result("Page 11.", page=11, chunk_id="ng12_0011_10"), result("Page 9.", page=9, chunk_id="ng12_0009_08"),
+               result("Page 10.", page=10, chunk_id="ng12_0010_09"), result("Page 30.", page=30, chunk_id="ng12_0030_29")]
+
+    merged, folded = merge_chunks(results)
+
+    assert folded == 2
+    assert [r["document"] for r in merged] == ["Page 9.\nPage 10.\nPage 11.", "Page 30."]
+    assert merged[0]["metadata"]["chunk_ids"] == ["ng12_0009_08", "ng12_0010_09", "ng12_0011_10"]
+    assert (merged[0]["metadata"]["page"], merged[0]["metadata"]["page_end"]) == (9, 11)
+
+
+def test_under_budget_results_are_returned_unchanged():
+    results = [result("Section A: refer if ...", chunk_id="a"), result("Section B: urgent ...", page=2, chunk_id="b")]
+
+    packed, report = pack_results(results, "chest pain", budget=2000)
+
+    assert packed == results
+    assert report["tokens_saved"] == 0
+
+
+def test_trimming_keeps_the_most_relevant_passages_and_their_citation():
+    other_page = PAGE.replace("1.1.", "1.2.").replace("lung", "oesophageal")
+    other = result(other_page, page=12, chunk_id="o")
+
+    budget = sum(count_tokens(split_passages(page)[1]) + count_tokens(GAP) for page in (PAGE, other_page))
+    packed, report = pack_results([result(PAGE, chunk_id="l"), other], "unexplained haemoptysis", budget=budget)
+
+    text = packed[0]["document"]
+    assert "aged 40 and over with unexplained haemoptysis. [2015]" in text
+    assert "mesothelioma" not in text
+    assert text.startswith(GAP.lstrip("\n"))
+    assert packed[0]["metadata"] == {"source": "NG12", "page": 10, "chunk_id": "l"}
+    assert [r["metadata"]["chunk_id"] for r in packed] == ["l", "o"]
+    assert report["tokens_out"] <= budget
+    assert report["tokens_saved"] == report["tokens_in"] - report["tokens_out"] > 0
+    assert report["tokens_out"] == sum(count_tokens(r["document"]) for r in packed)
+    assert report["encoding"] == get_encoding().name
+
+
+def test_results_without_query_words_keep_their_leading_passage():
+    other = result(PAGE.replace("1.1.", "1.2."), page=12, chunk_id="o")
+    budget = count_tokens(PAGE)
+
+    packed, _ = pack_results([result(PAGE, chunk_id="l"), other], "trouble swallowing food", budget=budget)
+
+    assert [r["metadata"]["chunk_id"] for r in packed] == ["l", "o"]
+    assert all(r["document"].startswith("Lung and pleural cancers") for r in packed)
+
+
+def test_passage_longer_than_the_budget_is_truncated_not_dropped():
+    long_passage = "Refer people with unexplained haemoptysis " + "and persistent symptoms " * 200 + "today."
+
+    packed, report = pack_results([result(long_passage, chunk_id="l")], "haemoptysis", budget=100)
+
+    assert len(packed) == 1
+    assert packed[0]["document"].startswith("Refer people with unexplained haemoptysis")
+    assert packed[0]["document"].endswith("…")
+    assert report["tokens_out"] <= 100
+
+
+def test_stored_token_counts_are_used_for_untouched_chunks():
+    _, report = pack_results([result("Refer.", token_count=321)], "refer", budget=1000)
+
+    assert report["tokens_in"] == report["tokens_out"] == 321
+
+
+def test_zero_budget_only_merges():
+    packed, report = pack_results([result(PAGE[:400], chunk_id="c1"), result(PAGE[250:], chunk_id="c2")],
+                                  "haemoptysis", budget=0)
+
+    assert [r["document"] for r in packed] == [PAGE]
+    assert report["chunks_merged"] == 1
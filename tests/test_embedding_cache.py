@@ -0,0 +1,69 @@
+from app.embedding_cache import EmbeddingCache, normalize_query
+
+
+class CountingEmbedder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(t)), 0.5] for t in texts]
+
+
+def test_normalize_query_folds_case_and_whitespace():
+    assert normalize_query("  Unexplained   Hemoptysis\tin smoker ") == "unexplained hemoptysis in smoker"
+
+
+def test_repeated_query_is_served_from_memory():
+    cache = EmbeddingCache("model-a", maxsize=4)
+    embed = CountingEmbedder()
+
+    first = cache.get_or_compute(["unexplained hemoptysis in smoker"], embed)
+    second = cache.get_or_compute(["Unexplained  hemoptysis in SMOKER"], embed)
+
+    assert first == second
+    assert len(embed.calls) == 1
+    stats = cache.stats()
+    assert stats["misses"] == 1
+    assert stats["memory_hits"] == 1
+
+
+def test_only_misses_are_embedded_in_one_batch():
+    cache = EmbeddingCache("model-a")
+    embed = CountingEmbedder()
+    cache.get_or_compute(["dyspepsia"], embed)
+
+    vectors = cache.get_or_compute(["dyspepsia", "haematuria", "HAEMATURIA"], embed)
+
+    assert embed.calls[-1] == ["haematuria"]
+    assert vectors[1] == vectors[2]
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = tmp_path / "embedding_cache.sqlite3"
+    embed = CountingEmbedder()
+    EmbeddingCache("model-a", path=path).get_or_compute(["dysphagia"], embed)
+
+    restarted = EmbeddingCache("model-a", path=path)
+    vectors = restarted.get_or_compute(["dysphagia"], embed)
+
+    assert vectors == [[9.0, 0.5]]
+    assert len(embed.calls) == 1
+    assert restarted.stats()["disk_hits"] == 1
+
+
+def test_model_name_is_part_of_the_key(tmp_path):
+    path = tmp_path / "embedding_cache.sqlite3"
+    embed = CountingEmbedder()
+    EmbeddingCache("model-a", path=path).get_or_compute(["dysphagia"], embed)
+    EmbeddingCache("model-b", path=path).get_or_compute(["dysphagia"], embed)
+
+    assert len(embed.calls) == 2
+
+
+def test_memory_tier_is_bounded():
+    cache = EmbeddingCache("model-a", maxsize=2)
+    embed = CountingEmbedder()
+    cache.get_or_compute(["a", "b", "c"], embed)
+
+    assert cache.stats()["memory_entries"] == 2
@@ -0,0 +1,76 @@
+import math
+import sys
+import types
+
+import pytest
+
+from app.embeddings import (
+    EmbeddingProvider,
+    HashingEmbeddingProvider,
+    VertexEmbeddingProvider,
+    create_embedding_provider,
+)
+
+
+def test_hashing_provider_is_deterministic_normalized_and_fixed_size():
+    provider = HashingEmbeddingProvider(dimension=128)
+
+    first, second, empty = provider.embed(["Unexplained haemoptysis", "unexplained  HAEMOPTYSIS", ""])
+
+    assert len(first) == 128
+    assert first == second
+    assert math.isclose(sum(v * v for v in first), 1.0)
+    assert empty == [0.0] * 128
+    assert provider.model_id == "hashing-128"
+
+
+def test_hashing_provider_ranks_overlapping_text_higher():
+    provider = HashingEmbeddingProvider(dimension=256)
+    query, related, unrelated = provider.embed(
+        ["persistent hoarseness", "refer for persistent unexplained hoarseness", "FIT for anaemia"]
+    )
+
+    def cosine(a, b):
+        return sum(x * y for x, y in zip(a, b))
+
+    assert cosine(query, related) > cosine(query, unrelated)
+
+
+def test_vertex_provider_loads_model_lazily(monkeypatch):
+    loaded = []
+
+    class FakeModel:
+        @staticmethod
+        def from_pretrained(name):
+            loaded.append(name)
+            return types.SimpleNamespace(
+                get_embeddings=lambda texts: [types.SimpleNamespace(values=[float(len(t))]) for t in texts]
+            )
+
+    lm = types.ModuleType("vertexai.preview.language_models")
+    lm.TextEmbeddingModel = FakeModel
+    monkeypatch.setitem(sys.modules, "vertexai.preview.language_models", lm)
+
+    provider = create_embedding_provider("vertex", "gemini-embedding-001")
+    assert isinstance(provider, VertexEmbeddingProvider)
+    assert loaded == []
+
+    assert provider.embed(["ab", "abc"]) == [[2.0], [3.0]]
+    provider.embed(["a"])
+    assert loaded == ["gemini-embedding-001"]
+
+
+def test_incomplete_provider_fails_at_construction():
+    class NoEmbed(EmbeddingProvider):
+        model_id = "no-embed"
+
+    with pytest.raises(TypeError, match="embed"):
+        NoEmbed()
+    with pytest.raises(TypeError):
+        EmbeddingProvider()
+
+
+def test_create_embedding_provider_rejects_unknown_names():
+    assert isinstance(create_embedding_provider("hashing", "ignored", dimension=8), HashingEmbeddingProvider)
+    with pytest.raises(ValueError):
+        create_embedding_provider("openai", "ignored")
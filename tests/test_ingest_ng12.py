@@ -1,7 +1,23 @@
+import functools
 import importlib
 import sys
+import threading
+import time
 import types
 
+import numpy as np
+import pytest
+
+from app.tokenizer import get_encoding
+
+
+@pytest.fixture(autouse=True)
+def _fresh_encoding():
+    """The shared encoder cache must not keep a fake tiktoken encoding across tests."""
+    get_encoding.cache_clear()
+    yield
+    get_encoding.cache_clear()
+
 
 def make_fake_modules():
     # chromadb fake
@@ -9,12 +25,32 @@ def make_fake_modules():
 
     class FakeCollection:
         def __init__(self):
-            self.add_called = False
-            self.add_kwargs = None
-
-        def add(self, **kwargs):
-            self.add_called = True
-            self.add_kwargs = kwargs
+            self.upsert_called = False
+            self.upsert_kwargs = None
+            self.records = {}
+            self.deleted = []
+
+        def upsert(self, **kwargs):
+            self.upsert_called = True
+            self.upsert_kwargs = kwargs
+            for doc, meta, id_ in zip(kwargs["documents"], kwargs["metadatas"], kwargs["ids"]):
+                self.records[id_] = (doc, meta)
+
+        def get(self, include=None):
+            return {
+                "ids": list(self.records),
+                "documents": [doc for doc, _ in self.records.values()],
+                "metadatas": [meta for _, meta in self.records.values()],
+            }
+
+        def update(self, ids, metadatas):
+            for id_, meta in zip(ids, metadatas):
+                self.records[id_] = (self.records[id_][0], meta)
+
+        def delete(self, ids):
+            self.deleted.extend(ids)
+            for id_ in ids:
+                del self.records[id_]
 
     class FakeClient:
         def __init__(self, path=None):
@@ -59,6 +95,9 @@ def make_fake_modules():
         def decode(self, tokens):
             return "".join(tokens)
 
+        def decode_with_offsets(self, tokens):
+            return "".join(tokens), list(range(len(tokens)))
+
     def get_encoding(name):
         return FakeEncoding()
 
@@ -89,7 +128,7 @@ def make_fake_modules():
     sys.modules["pypdf"] = pypdf
 
 
-def test_persist_to_chroma_calls_collection_add(tmp_path):
+def test_persist_to_chroma_calls_collection_upsert(tmp_path):
     make_fake_modules()
 
     # import module after fakes in place
@@ -105,14 +144,14 @@ def test_persist_to_chroma_calls_collection_add(tmp_path):
     # Call persist_to_chroma
     mod.persist_to_chroma(docs, embs, metas, ids, vector_store_dir=tmp_path, collection_name="testcol")
 
-    # Verify that the underlying fake collection got add called
+    # Verify that the underlying fake collection got upsert called
     chromadb_mod = sys.modules["chromadb"]
     last_col = getattr(chromadb_mod, "_last_collection")
-    assert last_col.add_called
-    assert last_col.add_kwargs["documents"] == docs
-    assert last_col.add_kwargs["embeddings"] == embs
-    assert last_col.add_kwargs["metadatas"] == metas
-    assert last_col.add_kwargs["ids"] == ids
+    assert last_col.upsert_called
+    assert last_col.upsert_kwargs["documents"] == docs
+    assert last_col.upsert_kwargs["embeddings"] == embs
+    assert last_col.upsert_kwargs["metadatas"] == metas
+    assert last_col.upsert_kwargs["ids"] == ids
 
 
 def test_embed_documents_uses_model_and_returns_vectors():
@@ -125,3 +164,354 @@ def test_embed_documents_uses_model_and_returns_vectors():
 
     # Each vector is [len(doc)] per FakeTextEmbeddingModel
     assert vectors == [[5], [6]]
+
+
+def test_load_and_chunk_pdf_numbers_chunks_in_page_order():
+    make_fake_modules()
+    import ingestion.ingest_ng12 as mod
+    importlib.reload(mod)
+
+    documents, metadatas, ids = mod.load_and_chunk_pdf("fake.pdf", workers=1)
+
+    # FakePdfReader has one page of text and one empty page
+    assert documents == ["one two three"]
+    assert metadatas == [{
+        "source": "NG12 PDF",
+        "page": 1,
+        "page_start": 1,
+        "page_end": 1,
+        "token_count": 13,
+        "chunk_id": "ng12_0001_00",
+    }]
+    assert ids == [mod.content_chunk_id("one two three", mod.EMBEDDING_MODEL_NAME)]
+
+
+def test_content_chunk_id_is_stable_and_model_specific():
+    make_fake_modules()
+    import ingestion.ingest_ng12 as mod
+    importlib.reload(mod)
+
+    first = mod.content_chunk_id("some text", "model-a")
+    assert first == mod.content_chunk_id("some text", "model-a")
+    assert first != mod.content_chunk_id("some text", "model-b")
+    assert first != mod.content_chunk_id("other text", "model-a")
+    assert mod.content_chunk_id("some text", "model-a", occurrence=2) == f"{first}-2"
+
+
+def test_streaming_pipeline_embeds_and_persists_batches_and_times_stages(tmp_path):
+    make_fake_modules()
+    import ingestion.ingest_ng12 as mod
+    importlib.reload(mod)
+
+    chunks = (
+        (f"doc {i}", {"page": 1, "chunk_id": f"ng12_0001_{i:02d}"}, f"chunk-{i}")
+        for i in range(5)
+    )
+    timer = mod.StageTimer()
+
+    batches = mod.embed_stream(chunks, "fake-model", batch_size=2, timer=timer)
+    total = mod.persist_stream(batches, vector_store_dir=tmp_path, timer=timer)
+
+    assert total == 5
+    last_add = sys.modules["chromadb"]._last_collection.upsert_kwargs
+    assert last_add["ids"] == ["chunk-4"]
+    assert last_add["embeddings"] == [[5]]
+    assert timer.items == {"embed": 5, "persist": 5}
+    assert "embed" in timer.report()
+
+
+def test_iter_batches_accepts_generators():
+    make_fake_modules()
+    import ingestion.ingest_ng12 as mod
+    importlib.reload(mod)
+
+    assert list(mod.iter_batches((i for i in range(5)), batch_size=2)) == [[0, 1], [2, 3], [4]]
+
+
+
+def test_sync_to_chroma_only_embeds_new_chunks_and_deletes_stale(tmp_path):
+    make_fake_modules()
+    import ingestion.ingest_ng12 as mod
+    importlib.reload(mod)
+
+    embedded = []
+    real_embed_stream = mod.embed_stream
+
+    def counting_embed_stream(chunks, *args, **kwargs):
+        for batch in real_embed_stream(chunks, *args, **kwargs):
+            embedded.extend(batch[0])
+            yield batch
+
+    mod.embed_stream = counting_embed_stream
+
+    def chunks(texts):
+        return [
+            (text, {"page": 1, "chunk_id": f"ng12_0001_{i:02d}"}, mod.content_chunk_id(text, "fake-model"))
+            for i, text in enumerate(texts)
+        ]
+
+    first = mod.sync_to_chroma(chunks(["a", "b", "c"]), "fake-model", tmp_path)
+    assert first == {"added": 3, "updated": 0, "deleted": 0, "skipped": 0}
+    collection = sys.modules["chromadb"]._last_collection
+
+    # Re-running on the same collection: "b" dropped, "d" added, "c" moved to a new chunk_id.
+    sys.modules["chromadb"].PersistentClient = lambda path=None: types.SimpleNamespace(
+        get_or_create_collection=lambda name: collection
+    )
+    embedded.clear()
+    second = mod.sync_to_chroma(chunks(["a", "c", "d"]), "fake-model", tmp_path)
+
+    assert second == {"added": 1, "updated": 1, "deleted": 1, "skipped": 1}
+    assert embedded == ["d"]
+    assert collection.deleted == [mod.content_chunk_id("b", "fake-model")]
+    assert collection.records[mod.content_chunk_id("c", "fake-model")][1]["chunk_id"] == "ng12_0001_01"
+
+    third = mod.sync_to_chroma(chunks(["a", "c", "d"]), "fake-model", tmp_path)
+    assert third == {"added": 0, "updated": 0, "deleted": 0, "skipped": 3}
+
+
+class LocalEmbeddingModel:
+    """Deterministic in-process stand-in for the Vertex embedding model."""
+
+    def __init__(self, fail_on=(), delay=0.0):
+        self.fail_on = set(fail_on)
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def get_embeddings(self, docs):
+        with self._lock:
+            self.calls.append(list(docs))
+            call = len(self.calls)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            if call in self.fail_on:
+                raise RuntimeError("quota exceeded")
+            return [types.SimpleNamespace(values=[float(len(d)), 0.5]) for d in docs]
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def load_ingest_module():
+    make_fake_modules()
+    import ingestion.ingest_ng12 as mod
+    importlib.reload(mod)
+    return mod
+
+
+def local_provider(model):
+    from app.embeddings import VertexEmbeddingProvider
+
+    return VertexEmbeddingProvider("fake-model", model=model)
+
+
+def test_batch_embedder_runs_batches_concurrently_in_order():
+    model = LocalEmbeddingModel(delay=0.05)
+    mod = load_ingest_module()
+
+    embedder = mod.BatchEmbedder("fake-model", workers=3, backoff=0, provider=local_provider(model))
+    docs = [f"doc {'x' * i}" for i in range(12)]
+    vectors = mod.embed_documents(docs, "fake-model", batch_size=2, embedder=embedder)
+
+    assert vectors == [[float(len(d)), 0.5] for d in docs]
+    assert model.max_active == 3
+    assert embedder.stats["requests"] == 6
+
+
+def test_batch_embedder_retries_failed_batches_with_backoff():
+    model = LocalEmbeddingModel(fail_on={1, 2})
+    mod = load_ingest_module()
+
+    embedder = mod.BatchEmbedder(
+        "fake-model", workers=1, max_retries=2, backoff=0, provider=local_provider(model)
+    )
+    assert mod.embed_documents(["abc"], "fake-model", embedder=embedder) == [[3.0, 0.5]]
+    assert embedder.stats == {"requests": 3, "retries": 2, "resumed": 0}
+
+
+def test_rate_limiter_spaces_requests():
+    mod = load_ingest_module()
+
+    limiter = mod.RateLimiter(50)
+    start = time.monotonic()
+    for _ in range(5):
+        limiter.wait()
+    assert time.monotonic() - start >= 0.075
+
+
+def test_interrupted_run_resumes_from_float32_checkpoint(tmp_path):
+    docs = [f"chunk {i}" for i in range(6)]
+    failing = LocalEmbeddingModel(fail_on={2})
+    mod = load_ingest_module()
+
+    checkpoint = mod.EmbeddingCheckpoint(tmp_path, "fake-model")
+    embedder = mod.BatchEmbedder(
+        "fake-model", workers=1, max_retries=0, checkpoint=checkpoint, provider=local_provider(failing)
+    )
+    with pytest.raises(RuntimeError):
+        mod.embed_documents(docs, "fake-model", batch_size=2, embedder=embedder)
+
+    files = list(tmp_path.glob("batch-*.npz"))
+    assert len(files) == 1
+    with np.load(files[0]) as data:
+        assert data["vectors"].dtype == np.float32
+        assert data["vectors"].shape == (2, 2)
+
+    # A new run (fresh process state) only embeds what the checkpoint lacks,
+    # even though the remaining chunks are grouped into different batches.
+    model = LocalEmbeddingModel()
+    resumed = mod.EmbeddingCheckpoint(tmp_path, "fake-model")
+    assert len(resumed) == 2
+    embedder = mod.BatchEmbedder("fake-model", workers=2, checkpoint=resumed, provider=local_provider(model))
+    vectors = mod.embed_documents(docs, "fake-model", batch_size=3, embedder=embedder)
+
+    assert vectors == [[float(len(d)), 0.5] for d in docs]
+    assert sorted(d for call in model.calls for d in call) == docs[2:]
+    assert embedder.stats["resumed"] == 2
+
+    resumed.clear()
+    assert not tmp_path.exists()
+
+
+
+def test_chunk_document_encodes_each_page_once_and_restarts_windows_per_page():
+    make_fake_modules()
+    import ingestion.ingest_ng12 as mod
+    importlib.reload(mod)
+
+    encoding = mod.get_encoding()
+    calls = []
+    original_encode = encoding.encode
+    encoding.encode = lambda text: calls.append(text) or original_encode(text)
+
+    pages = [(1, "aaaa"), (2, ""), (3, "bbbbbbbbb"), (4, "cc")]
+    chunks = list(mod.chunk_document(pages, max_tokens=6, overlap_tokens=2, with_token_counts=True))
+
+    # The empty page contributes nothing; a page's last window carries into the next page.
+    assert calls == ["aaaa", "bbbbbbbbb", "cc"]
+    assert chunks == [
+        {"text": "aaaa\nbb", "page_start": 1, "page_end": 3, "token_count": 6},
+        {"text": "bbbbbb", "page_start": 3, "page_end": 3, "token_count": 6},
+        {"text": "bbbbb\nc", "page_start": 3, "page_end": 4, "token_count": 6},
+        {"text": "cc", "page_start": 4, "page_end": 4, "token_count": 2},
+    ]
+    assert mod.get_encoding() is encoding
+    assert list(mod.chunk_document([(1, "")])) == []
+
+
+def test_chunk_document_streams_pages():
+    make_fake_modules()
+    import ingestion.ingest_ng12 as mod
+    importlib.reload(mod)
+
+    pulled = []
+
+    def pages():
+        for page in range(1, 100):
+            pulled.append(page)
+            yield page, f"page {page}"
+
+    first = next(mod.chunk_document(pages()))
+
+    assert first["page_start"] == 1
+    assert pulled == [1, 2]
+
+
+def test_page_edit_only_changes_chunks_of_that_page():
+    make_fake_modules()
+    import ingestion.ingest_ng12 as mod
+    importlib.reload(mod)
+
+    def ingest(pages):
+        mod.iter_page_texts = lambda pdf_path, workers=None: iter(pages)
+        mod.chunk_document = functools.partial(real_chunk_document, max_tokens=30, overlap_tokens=5)
+        return {chunk_id: (meta["chunk_id"], meta["page"]) for _, meta, chunk_id in mod.iter_pdf_chunks("fake.pdf")}
+
+    real_chunk_document = mod.chunk_document
+    # (page_index, text) as extracted; page 3 is index 2.
+    pages = [(i, f"page {i + 1} " + "x" * (40 + i)) for i in range(11)]
+    edited = list(pages)
+    edited[2] = (2, pages[2][1] + " One more sentence.")
+
+    before = ingest(pages)
+    after = ingest(edited)
+
+    assert len(after) == len(before) + 1
+    assert {page for _, page in set(before.values()) ^ set(after.values())} == {3}
+    assert {(before.get(k) or after[k])[1] for k in before.keys() ^ after.keys()} == {3}
+    assert [v for v in before.values() if v[1] > 3] == [v for v in after.values() if v[1] > 3]
+
+
+def test_persist_bm25_index_writes_index_of_collection(tmp_path):
+    make_fake_modules()
+    import ingestion.ingest_ng12 as mod
+    importlib.reload(mod)
+
+    mod.persist_to_chroma(
+        ["Refer for haemoptysis", "Offer FIT testing"],
+        [[1], [2]],
+        [{"page": 9}, {"page": 14}],
+        ["id-1", "id-2"],
+        vector_store_dir=tmp_path,
+    )
+    collection = sys.modules["chromadb"]._last_collection
+    sys.modules["chromadb"].PersistentClient = lambda path=None: types.SimpleNamespace(
+        get_or_create_collection=lambda name: collection
+    )
+
+    path = tmp_path / "bm25.json"
+    assert mod.persist_bm25_index(tmp_path, path=path) == 2
+
+    from app.bm25 import BM25Index
+    index = BM25Index.load(path)
+    assert index.query(["hemoptysis"], n_results=5)["ids"] == [["id-1"]]
+
+
+def test_ingestion_embeds_offline_with_hashing_provider(tmp_path):
+    make_fake_modules()
+    import ingestion.ingest_ng12 as mod
+    importlib.reload(mod)
+    from app.embeddings import HashingEmbeddingProvider
+
+    def no_vertex(name):
+        raise AssertionError("offline ingestion must not load a Vertex model")
+
+    sys.modules["vertexai.preview.language_models"].TextEmbeddingModel.from_pretrained = staticmethod(no_vertex)
+
+    provider = HashingEmbeddingProvider(dimension=32)
+    chunks = mod.iter_pdf_chunks("fake.pdf", workers=1, model_name=provider.model_id)
+    embedder = mod.BatchEmbedder(provider.model_id, provider=provider)
+    counts = mod.sync_to_chroma(chunks, provider.model_id, tmp_path, embedder=embedder)
+
+    assert counts["added"] == 1
+    stored = sys.modules["chromadb"]._last_collection.upsert_kwargs
+    assert len(stored["embeddings"][0]) == 32
+    assert stored["ids"] == [mod.content_chunk_id("one two three", "hashing-32")]
+
+
+def test_chunking_falls_back_to_whitespace_tokens_offline(caplog):
+    make_fake_modules()
+
+    def offline(name):
+        raise ConnectionError("openaipublic.blob.core.windows.net unreachable")
+
+    sys.modules["tiktoken"].get_encoding = offline
+    import ingestion.ingest_ng12 as mod
+    importlib.reload(mod)
+
+    from app.tokenizer import RegexEncoding
+
+    from app.tokenizer import count_tokens
+
+    assert isinstance(mod.get_encoding(), RegexEncoding)
+    documents, metadatas, _ = mod.load_and_chunk_pdf("fake.pdf", workers=1)
+    assert documents == ["one two three"]
+    assert metadatas[0]["token_count"] == 3
+    # Ingestion and context packing share one encoder, so the fallback is reported once.
+    assert count_tokens("one two three") == 3
+    assert sum("falling back" in r.getMessage() for r in caplog.records) == 1
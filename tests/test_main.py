@@ -0,0 +1,457 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.answer_cache import SemanticAnswerCache
+from app.assessment_cache import AssessmentCache
+from app.metrics import TTFB_SECONDS
+
+
+class FakeAssessApp:
+    """Stands in for the ADK assessment app; replies with a canned assessment."""
+
+    def __init__(self, fail_for=(), delay=0.0):
+        self.fail_for = set(fail_for)
+        self.delay = delay
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+
+    async def async_stream_query(self, user_id, message):
+        patient_id = message.rsplit(" ", 1)[-1]
+        self.calls += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if patient_id in self.fail_for:
+                raise RuntimeError("model unavailable")
+            body = {
+                "patient_id": patient_id,
+                "recommendation": "urgent referral",
+                "justification": "NG12 1.1.1",
+                "references": [],
+            }
+            yield {"content": {"parts": [{"text": json.dumps(body)}]}}
+        finally:
+            self.active -= 1
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # Send every case to the (fake) agent unless a test opts back into the rules.
+    monkeypatch.setattr(main, "PRESCREEN_ENABLED", False)
+    monkeypatch.setattr(main, "assessment_cache", AssessmentCache())
+    monkeypatch.setattr(main, "answer_cache", SemanticAnswerCache(maxsize=0))
+    # No context manager: the lifespan (which warms up the real vector store and agents) is not run.
+    return TestClient(main.app)
+
+
+def test_assess_streams_agent_text(client, monkeypatch):
+    monkeypatch.setattr(main, "assess_app", FakeAssessApp())
+
+    res = client.post("/assess", json={"patient_id": "PT-101", "user_id": "u1"})
+
+    assert res.status_code == 200
+    assert res.json()["patient_id"] == "PT-101"
+
+
+def test_assess_batch_streams_one_line_per_patient(client, monkeypatch):
+    fake = FakeAssessApp(fail_for={"PT-102"}, delay=0.01)
+    monkeypatch.setattr(main, "assess_app", fake)
+    monkeypatch.setattr(main, "ASSESS_BATCH_MAX_CONCURRENCY", 2)
+
+    ids = ["PT-101", "PT-102", "PT-103", "PT-104", "PT-105"]
+    res = client.post("/assess/batch", json={"patient_ids": ids, "user_id": "u1", "max_concurrency": 10})
+
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("application/x-ndjson")
+    assert res.headers["x-batch-id"]
+    lines = [json.loads(line) for line in res.text.splitlines()]
+    assert sorted(line["patient_id"] for line in lines) == sorted(ids)
+
+    by_id = {line["patient_id"]: line for line in lines}
+    assert by_id["PT-102"]["status"] == "error"
+    assert "model unavailable" in by_id["PT-102"]["error"]
+    assert by_id["PT-101"]["status"] == "ok"
+    assert by_id["PT-101"]["assessment"]["recommendation"] == "urgent referral"
+    assert all(line["elapsed_ms"] >= 0 for line in lines)
+    assert fake.max_active <= 2
+
+
+def test_assess_uses_rules_for_clear_cut_cases(client, monkeypatch):
+    monkeypatch.setattr(main, "PRESCREEN_ENABLED", True)
+    monkeypatch.setattr(main, "current_assess_app", None)  # the agent must not be called
+    monkeypatch.setattr(main, "get_patient_data", lambda pid: {
+        "patient_id": pid, "age": 55, "gender": "Male", "smoking_history": "Current Smoker",
+        "symptoms": ["unexplained hemoptysis"], "symptom_duration_days": 14,
+    })
+
+    res = client.post("/assess", json={"patient_id": "PT-101", "user_id": "u1"})
+
+    assert res.headers["x-assessment-path"] == "rules"
+    body = res.json()
+    assert body["recommendation"] == "urgent referral"
+    assert body["references"][0]["chunk_id"] == "ng12_0009_08"
+
+
+def test_assess_sends_ambiguous_cases_to_agent(client, monkeypatch):
+    monkeypatch.setattr(main, "PRESCREEN_ENABLED", True)
+    monkeypatch.setattr(main, "assess_app", FakeAssessApp())
+    monkeypatch.setattr(main, "get_patient_data", lambda pid: {
+        "patient_id": pid, "age": 18, "gender": "Female", "smoking_history": "Never Smoked",
+        "symptoms": ["fatigue"], "symptom_duration_days": 30,
+    })
+
+    res = client.post("/assess", json={"patient_id": "PT-106", "user_id": "u1"})
+
+    assert res.headers["x-assessment-path"] == "agent"
+    assert res.json()["justification"] == "NG12 1.1.1"
+
+
+def test_repeated_assess_is_served_from_cache_until_record_changes(client, monkeypatch):
+    fake = FakeAssessApp()
+    monkeypatch.setattr(main, "assess_app", fake)
+    record = {"patient_id": "PT-106", "age": 18, "symptoms": ["fatigue"]}
+    monkeypatch.setattr(main, "get_patient_data", lambda pid: dict(record))
+    body = {"patient_id": "PT-106", "user_id": "u1"}
+
+    first = client.post("/assess", json=body)
+    second = client.post("/assess", json=body)
+
+    assert first.headers["x-assessment-path"] == "agent"
+    assert second.headers["x-assessment-path"] == "cache"
+    assert second.json() == first.json()
+    assert fake.calls == 1
+
+    record["symptoms"] = ["fatigue", "weight loss"]
+    third = client.post("/assess", json=body)
+    assert third.headers["x-assessment-path"] == "agent"
+    assert fake.calls == 2
+
+
+def test_prompt_change_invalidates_cached_assessment(client, monkeypatch):
+    fake = FakeAssessApp()
+    monkeypatch.setattr(main, "assess_app", fake)
+    monkeypatch.setattr(main, "get_patient_data", lambda pid: {"patient_id": pid, "age": 18})
+    body = {"patient_id": "PT-106", "user_id": "u1"}
+
+    monkeypatch.setattr(main, "prompt_hash", lambda section: "prompt-v1")
+    client.post("/assess", json=body)
+    monkeypatch.setattr(main, "prompt_hash", lambda section: "prompt-v2")
+    res = client.post("/assess", json=body)
+
+    assert res.headers["x-assessment-path"] == "agent"
+    assert fake.calls == 2
+
+
+def test_identical_assessments_in_flight_share_one_agent_run(client, monkeypatch):
+    fake = FakeAssessApp(delay=0.05)
+    monkeypatch.setattr(main, "assess_app", fake)
+    monkeypatch.setattr(main, "get_patient_data", lambda pid: {"patient_id": pid, "age": 55})
+
+    res = client.post("/assess/batch", json={"patient_ids": ["PT-7", "PT-7", "PT-7", "PT-8"], "user_id": "u1"})
+
+    lines = [json.loads(line) for line in res.text.splitlines()]
+    assert [line["status"] for line in lines] == ["ok"] * 4
+    assert sorted(line["assessment"]["patient_id"] for line in lines) == ["PT-7", "PT-7", "PT-7", "PT-8"]
+    assert fake.calls == 2
+    assert main.assessment_flights.stats()["in_flight"] == 0
+
+
+def test_failed_shared_assessment_reaches_every_waiter_and_is_retried(client, monkeypatch):
+    fake = FakeAssessApp(fail_for={"PT-9"}, delay=0.05)
+    monkeypatch.setattr(main, "assess_app", fake)
+    monkeypatch.setattr(main, "get_patient_data", lambda pid: {"patient_id": pid, "age": 55})
+
+    first = client.post("/assess/batch", json={"patient_ids": ["PT-9", "PT-9"], "user_id": "u1"})
+    fake.fail_for.clear()
+    retry = client.post("/assess", json={"patient_id": "PT-9", "user_id": "u1"})
+
+    assert [json.loads(line)["status"] for line in first.text.splitlines()] == ["error", "error"]
+    assert retry.json()["patient_id"] == "PT-9"
+    assert fake.calls == 2
+
+
+def test_assess_batch_cancellation_reports_remaining_patients(monkeypatch):
+    monkeypatch.setattr(main, "PRESCREEN_ENABLED", False)
+    monkeypatch.setattr(main, "assess_app", FakeAssessApp(delay=10))
+
+    async def run():
+        tasks = []
+        semaphore = asyncio.Semaphore(1)
+        for pid in ("PT-1", "PT-2"):
+            tasks.append(asyncio.create_task(main._assess_for_batch(pid, "u1", semaphore)))
+        await asyncio.sleep(0.01)
+        main._assessment_batches["b1"] = tasks
+        result = await main.cancel_assessment_batch("b1")
+        lines = await asyncio.gather(*tasks)
+        main._assessment_batches.pop("b1")
+        return result, lines
+
+    result, lines = asyncio.run(run())
+
+    assert result["cancelled"] == 2
+    assert [line.status for line in lines] == ["cancelled", "cancelled"]
+
+
+def test_cancel_unknown_batch(client):
+    res = client.delete("/assess/batch/does-not-exist")
+
+    assert res.json() == {"error": "batch not found or already finished"}
+
+
+def test_metrics_endpoint_reports_request_latency(client):
+    client.get("/health")
+
+    res = client.get("/metrics")
+
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/plain")
+    assert 'ng12_http_request_duration_seconds_count{endpoint="/health",method="GET",status="200"}' in res.text
+    assert "# TYPE ng12_stage_duration_seconds histogram" in res.text
+
+
+def test_traced_request_can_be_fetched_as_json(client, monkeypatch):
+    monkeypatch.setattr(main, "assess_app", FakeAssessApp())
+
+    res = client.post("/assess", json={"patient_id": "PT-101", "user_id": "u1"}, headers={"X-Trace": "1"})
+    trace_id = res.headers["x-trace-id"]
+    trace = client.get(f"/traces/{trace_id}").json()
+
+    assert trace["endpoint"] == "/assess"
+    assert trace["status"] == 200
+    assert any(s["stage"] == "patient_lookup" for s in trace["spans"])
+    assert "x-trace-id" not in client.get("/health").headers
+    assert client.get("/traces/unknown").json() == {"error": "trace not found"}
+
+
+def test_lifespan_warms_up_in_background_and_reports_readiness(monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(main, "startup_report", main.StartupReport())
+    monkeypatch.setattr(main, "WARMUP_ON_STARTUP", True)
+    monkeypatch.setattr(main, "warm_up_steps", lambda retriever: {"slow": lambda: release.wait(5)})
+
+    with TestClient(main.app) as client:
+        assert client.get("/health").json() == {"status": "ok"}
+        pending = client.get("/ready")
+        release.set()
+        for _ in range(100):
+            if main.startup_report.ready:
+                break
+            time.sleep(0.01)
+        done = client.get("/ready")
+
+    assert pending.status_code == 503
+    assert pending.json()["warmup"] == "running"
+    assert done.status_code == 200
+    assert done.json()["steps"]["slow"]["status"] == "ok"
+    assert "lifespan" in done.json()["phases"]
+
+
+def test_history_of_unknown_or_evicted_session_is_not_found(client):
+    res = client.get("/chat/never-created/history")
+
+    assert res.json() == {"error": "session not found or session service error"}
+
+
+class FakeStreamingRunner:
+    """Stands in for the ADK runner: one tool call, then the answer (streamed in two chunks when asked to)."""
+
+    def __init__(self, fail=False, citations=()):
+        self.fail = fail
+        self.citations = list(citations)
+        self.run_config = None
+        self.calls = 0
+
+    async def run_async(self, session_id, user_id, new_message, run_config=None):
+        from google.adk.events import Event
+        from google.genai import types
+
+        self.run_config = run_config
+        self.calls += 1
+        call = types.Part.from_function_call(name="search_nice_ng12_guidelines", args={"query": "haemoptysis"})
+        yield Event(author="ng12_agent", invocation_id="i", content=types.Content(role="model", parts=[call]))
+        result = types.Part.from_function_response(name="search_nice_ng12_guidelines", response={"results": []})
+        yield Event(author="ng12_agent", invocation_id="i", content=types.Content(role="user", parts=[result]))
+        if self.fail:
+            raise RuntimeError("model unavailable")
+        answer = json.dumps({"session_id": session_id, "answer": "Refer urgently.", "citations": self.citations})
+        for chunk in (answer[:20], answer[20:]) if run_config is not None else ():
+            yield Event(
+                author="ng12_agent", invocation_id="i", partial=True,
+                content=types.Content(role="model", parts=[types.Part.from_text(text=chunk)]),
+            )
+        yield Event(
+            author="ng12_agent", invocation_id="i",
+            content=types.Content(role="model", parts=[types.Part.from_text(text=answer)]),
+        )
+
+
+def test_chat_stream_sends_tool_progress_partial_text_and_final_response(client, monkeypatch):
+    runner = FakeStreamingRunner()
+    monkeypatch.setattr(main, "runner", runner)
+
+    res = client.post("/chat/stream", json={"message": "haemoptysis?", "session_id": "stream-1"})
+
+    assert res.headers["content-type"].startswith("application/x-ndjson")
+    events = [json.loads(line) for line in res.text.splitlines()]
+    assert [e["type"] for e in events] == ["tool_call", "tool_result", "text", "text", "final"]
+    assert events[0]["args"] == {"query": "haemoptysis"}
+    assert events[1]["status"] == "ok"
+    assert json.loads(events[2]["text"] + events[3]["text"])["answer"] == "Refer urgently."
+    assert events[4]["response"]["session_id"] == "stream-1"
+    assert runner.run_config.streaming_mode.value == "sse"
+
+
+def test_chat_stream_speaks_sse_and_reports_errors(client, monkeypatch):
+    monkeypatch.setattr(main, "runner", FakeStreamingRunner(fail=True))
+    before = TTFB_SECONDS.count(endpoint="/chat/stream", method="POST")
+
+    res = client.post(
+        "/chat/stream", json={"message": "haemoptysis?", "session_id": "stream-2"},
+        headers={"Accept": "text/event-stream"},
+    )
+
+    assert res.headers["content-type"].startswith("text/event-stream")
+    blocks = [block for block in res.text.split("\n\n") if block]
+    assert [block.splitlines()[0] for block in blocks] == ["event: tool_call", "event: tool_result", "event: error"]
+    assert json.loads(blocks[-1].splitlines()[1][len("data: "):]) == {"type": "error", "error": "Internal Error"}
+    assert TTFB_SECONDS.count(endpoint="/chat/stream", method="POST") == before + 1
+
+
+@pytest.fixture
+def answer_cache(monkeypatch):
+    """Enable the answer cache with fixed embeddings: the two dyspepsia questions are near-duplicates."""
+    vectors = {
+        "2WW criteria for dyspepsia": [1.0, 0.0, 0.0],
+        "urgent referral rules for dyspepsia": [0.98, 0.2, 0.0],
+        "when to refer haematuria": [0.0, 0.0, 1.0],
+    }
+    version = {"value": "v1"}
+
+    class FakeRetriever:
+        def store_version(self):
+            return version["value"]
+
+    cache = SemanticAnswerCache(maxsize=8, threshold=0.95)
+    monkeypatch.setattr(main, "answer_cache", cache)
+    monkeypatch.setattr(main, "embed_queries", lambda queries: [vectors[q] for q in queries])
+    monkeypatch.setattr(main, "get_retriever", lambda: FakeRetriever())
+    monkeypatch.setattr(main, "prompt_hash", lambda section: "prompt-v1")
+    return cache, version
+
+
+CITATION = {"source": "NG12", "page": 9, "chunk_id": "p9", "excerpt": "1.3.1 ..."}
+
+
+def test_paraphrased_first_question_is_answered_from_cache(client, monkeypatch, answer_cache):
+    cache, _ = answer_cache
+    runner = FakeStreamingRunner(citations=[CITATION])
+    monkeypatch.setattr(main, "runner", runner)
+
+    first = client.post("/chat", json={"message": "2WW criteria for dyspepsia", "session_id": "cache-1"})
+    second = client.post("/chat", json={"message": "urgent referral rules for dyspepsia", "session_id": "cache-2"})
+    other = client.post("/chat", json={"message": "when to refer haematuria", "session_id": "cache-3"})
+
+    assert runner.calls == 2
+    assert "x-answer-cache" not in first.headers
+    assert second.headers["x-answer-cache"] == "hit"
+    assert second.json() == dict(first.json(), session_id="cache-2")
+    assert other.json()["session_id"] == "cache-3"
+    history = client.get("/chat/cache-2/history", params={"fields": "author,text"}).json()["events"]
+    assert [e["author"] for e in history] == ["user", "ng12_agent"]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+    assert stats["top_entries"][0]["question"] == "2WW criteria for dyspepsia"
+    assert stats["top_entries"][0]["hits"] == 1
+
+
+def test_answer_cache_embeds_each_question_once(client, monkeypatch, answer_cache):
+    cache, _ = answer_cache
+    embedded = []
+    vectors = {"2WW criteria for dyspepsia": [1.0, 0.0, 0.0]}
+
+    def embed_queries(queries):
+        embedded.extend(queries)
+        return [vectors[q] for q in queries]
+
+    monkeypatch.setattr(main, "embed_queries", embed_queries)
+    monkeypatch.setattr(main, "runner", FakeStreamingRunner(citations=[CITATION]))
+
+    client.post("/chat", json={"message": "2WW criteria for dyspepsia", "session_id": "cache-once"})
+
+    # The lookup vector is reused to store the agent's answer.
+    assert embedded == ["2WW criteria for dyspepsia"]
+    assert len(cache) == 1
+
+
+def test_answer_cache_is_skipped_for_follow_ups_and_new_store_versions(client, monkeypatch, answer_cache):
+    _, version = answer_cache
+    runner = FakeStreamingRunner(citations=[CITATION])
+    monkeypatch.setattr(main, "runner", runner)
+    client.post("/chat", json={"message": "2WW criteria for dyspepsia", "session_id": "cache-4"})
+    hit = client.post("/chat", json={"message": "2WW criteria for dyspepsia", "session_id": "cache-5"})
+
+    # cache-5 now has a turn, so its next message goes to the agent, in context.
+    follow_up = client.post("/chat", json={"message": "2WW criteria for dyspepsia", "session_id": "cache-5"})
+    version["value"] = "v2"
+    client.post("/chat", json={"message": "2WW criteria for dyspepsia", "session_id": "cache-6"})
+
+    assert hit.headers["x-answer-cache"] == "hit"
+    assert "x-answer-cache" not in follow_up.headers
+    assert runner.calls == 3
+
+
+def test_answers_without_citations_are_not_cached(client, monkeypatch, answer_cache):
+    cache, _ = answer_cache
+    monkeypatch.setattr(main, "runner", FakeStreamingRunner())
+
+    client.post("/chat/stream", json={"message": "2WW criteria for dyspepsia", "session_id": "cache-6"})
+
+    assert len(cache) == 0
+
+
+def test_chat_stream_serves_cached_answer_as_one_final_event(client, monkeypatch, answer_cache):
+    monkeypatch.setattr(main, "runner", FakeStreamingRunner(citations=[CITATION]))
+    client.post("/chat/stream", json={"message": "2WW criteria for dyspepsia", "session_id": "cache-7"})
+
+    res = client.post("/chat/stream", json={"message": "urgent referral rules for dyspepsia", "session_id": "cache-8"})
+
+    events = [json.loads(line) for line in res.text.splitlines()]
+    assert [e["type"] for e in events] == ["final"]
+    assert events[0]["cached"] is True
+    assert events[0]["response"]["session_id"] == "cache-8"
+    assert events[0]["response"]["citations"] == [CITATION]
+
+
+def test_history_is_paginated_and_projected(client):
+    from google.adk.events import Event
+    from google.genai import types
+
+    async def fill():
+        service = main.ng12_session_service
+        session = await service.create_session(app_name=main.ng12_app.name, user_id="hist-1", session_id="hist-1")
+        for i in range(5):
+            await service.append_event(session, Event(
+                author="user", invocation_id=f"i{i}",
+                content=types.Content(role="user", parts=[types.Part.from_text(text=f"message {i}")]),
+            ))
+
+    asyncio.run(fill())
+
+    first = client.get("/chat/hist-1/history", params={"limit": 3, "fields": "author,text"}).json()
+    second = client.get(
+        "/chat/hist-1/history", params={"limit": 3, "fields": "author,text", "cursor": first["next_cursor"]}
+    ).json()
+
+    assert [e["text"] for e in first["events"]] == ["message 0", "message 1", "message 2"]
+    assert "state" in first and "state" not in second
+    assert [e["text"] for e in second["events"]] == ["message 3", "message 4"]
+    assert second["next_cursor"] is None
+    assert client.get("/chat/hist-1/history", params={"fields": "nope"}).json()["error"].startswith("Unknown")
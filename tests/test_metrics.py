@@ -0,0 +1,118 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app.instrumentation import InstrumentationPlugin
+from app.metrics import (
+    MetricsRegistry,
+    STAGE_SECONDS,
+    LLM_TOKENS,
+    Trace,
+    TraceStore,
+    current_agent,
+    current_endpoint,
+    current_trace,
+    span,
+)
+
+
+def test_registry_renders_prometheus_text():
+    registry = MetricsRegistry()
+    hits = registry.counter("hits_total", "Hits.", ("route",))
+    latency = registry.histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+
+    hits.inc(route='/a"b')
+    hits.inc(2, route='/a"b')
+    latency.observe(0.05, route="/a")
+    latency.observe(0.5, route="/a")
+    text = registry.render()
+
+    assert "# TYPE hits_total counter" in text
+    assert 'hits_total{route="/a\\"b"} 3' in text
+    assert "# TYPE latency_seconds histogram" in text
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{route="/a",le="1"} 2' in text
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 2' in text
+    assert 'latency_seconds_count{route="/a"} 2' in text
+    assert 'latency_seconds_sum{route="/a"} 0.55' in text
+
+    with pytest.raises(ValueError):
+        registry.counter("hits_total", "Again.")
+
+
+def test_span_is_tagged_and_added_to_current_trace():
+    trace = Trace("/chat")
+    tokens = (current_endpoint.set("/chat"), current_agent.set("ng12_agent"), current_trace.set(trace))
+    try:
+        with span("vector_query", "numpy", n_results=5) as attributes:
+            attributes["hits"] = 5
+        with pytest.raises(RuntimeError):
+            with span("embedding", "test-model"):
+                raise RuntimeError("quota")
+    finally:
+        current_trace.reset(tokens[2])
+        current_agent.reset(tokens[1])
+        current_endpoint.reset(tokens[0])
+
+    assert STAGE_SECONDS.count(
+        stage="vector_query", name="numpy", endpoint="/chat", agent="ng12_agent", status="ok"
+    ) >= 1
+    assert STAGE_SECONDS.count(
+        stage="embedding", name="test-model", endpoint="/chat", agent="ng12_agent", status="error"
+    ) >= 1
+    spans = trace.to_dict()["spans"]
+    assert [(s["stage"], s["status"]) for s in spans] == [("vector_query", "ok"), ("embedding", "error")]
+    assert spans[0]["agent"] == "ng12_agent"
+    assert spans[0]["attributes"] == {"n_results": 5, "hits": 5}
+
+
+def test_trace_store_keeps_recent_traces_and_exports_json(tmp_path):
+    store = TraceStore(maxsize=2, export_dir=tmp_path)
+    traces = [Trace("/assess") for _ in range(3)]
+    for trace in traces:
+        trace.finish(200)
+        store.add(trace)
+
+    assert store.get(traces[0].trace_id) is None
+    assert store.get(traces[2].trace_id)["status"] == 200
+    exported = json.loads((tmp_path / f"{traces[0].trace_id}.json").read_text())
+    assert exported["endpoint"] == "/assess"
+
+
+def test_plugin_records_llm_turns_tokens_and_tool_calls():
+    plugin = InstrumentationPlugin()
+    trace = Trace("/assess")
+    context = SimpleNamespace(invocation_id="inv-1", agent_name="assess_agent", function_call_id="call-1")
+    usage = SimpleNamespace(prompt_token_count=120, candidates_token_count=30)
+    before = LLM_TOKENS.value(kind="prompt", endpoint="/assess", agent="assess_agent")
+
+    async def run():
+        current_endpoint.set("/assess")
+        current_trace.set(trace)
+        await plugin.before_model_callback(
+            callback_context=context, llm_request=SimpleNamespace(model="gemini-test")
+        )
+        await plugin.after_model_callback(
+            callback_context=context, llm_response=SimpleNamespace(partial=True, usage_metadata=None)
+        )
+        await plugin.after_model_callback(
+            callback_context=context, llm_response=SimpleNamespace(partial=False, usage_metadata=usage)
+        )
+        tool = SimpleNamespace(name="get_patient_data")
+        await plugin.before_tool_callback(tool=tool, tool_args={}, tool_context=context)
+        await plugin.after_tool_callback(
+            tool=tool, tool_args={}, tool_context=context, result={"error": "error occured"}
+        )
+
+    asyncio.run(run())
+
+    spans = trace.to_dict()["spans"]
+    assert [(s["stage"], s["name"], s["status"]) for s in spans] == [
+        ("llm_turn", "gemini-test", "ok"),
+        ("tool_call", "get_patient_data", "error"),
+    ]
+    assert spans[0]["attributes"] == {"prompt_tokens": 120, "completion_tokens": 30}
+    assert all(s["agent"] == "assess_agent" for s in spans)
+    assert LLM_TOKENS.value(kind="prompt", endpoint="/assess", agent="assess_agent") == before + 120
@@ -1,6 +1,11 @@
 import importlib
 import sys
+import threading
+import time
 import types
+from concurrent.futures import ThreadPoolExecutor
+
+from app.embeddings import HashingEmbeddingProvider, VertexEmbeddingProvider
 
 
 def make_fake_modules():
@@ -44,6 +49,7 @@ def make_fake_modules():
     lm.TextEmbeddingModel = FakeTextEmbeddingModel
     preview.language_models = lm
     vertexai.preview = preview
+    vertexai.init = lambda project=None, location=None: None
 
     # Fake google adk and vertexai.agent_engines
     google = types.ModuleType("google")
@@ -113,3 +119,364 @@ def test_search_returns_empty_results_when_no_matches(monkeypatch):
 
     assert isinstance(res, dict)
     assert res["results"] == []
+
+
+def test_search_reuses_client_across_calls(monkeypatch):
+    chromadb_mod, lm_mod = make_fake_modules()
+
+    opened = []
+
+    def fake_client_factory(path=None):
+        opened.append(path)
+        return chromadb_mod._BaseClient(path=path, docs=["Section A"], metas=[{"page": 1}])
+
+    chromadb_mod.PersistentClient = fake_client_factory
+
+    import app.tools.nice_guideline_tool as ng
+    importlib.reload(ng)
+
+    retriever = ng.GuidelineRetriever(vector_store_dir="unused")
+    monkeypatch.setattr(retriever, "store_version", lambda: "v1")
+    ng.set_retriever(retriever)
+
+    for _ in range(3):
+        res = ng.search_nice_ng12_guidelines("chest pain")
+        assert res["results"][0]["document"] == "Section A"
+
+    assert opened == ["unused"]
+
+
+def test_retriever_reopens_when_store_changes(monkeypatch):
+    chromadb_mod, lm_mod = make_fake_modules()
+
+    opened = []
+
+    def fake_client_factory(path=None):
+        opened.append(path)
+        return chromadb_mod._BaseClient(path=path, docs=[f"v{len(opened)}"], metas=[{"page": 1}])
+
+    chromadb_mod.PersistentClient = fake_client_factory
+
+    import app.tools.nice_guideline_tool as ng
+    importlib.reload(ng)
+
+    version = {"value": "v1"}
+    retriever = ng.GuidelineRetriever(vector_store_dir="unused")
+    monkeypatch.setattr(retriever, "store_version", lambda: version["value"])
+    ng.set_retriever(retriever)
+
+    assert ng.search_nice_ng12_guidelines("q")["results"][0]["document"] == "v1"
+
+    version["value"] = "v2"
+    assert ng.search_nice_ng12_guidelines("q")["results"][0]["document"] == "v2"
+    assert len(opened) == 2
+
+
+def test_repeated_search_skips_embedding_round_trip(monkeypatch):
+    chromadb_mod, lm_mod = make_fake_modules()
+
+    def fake_client_factory(path=None):
+        return chromadb_mod._BaseClient(path=path, docs=["Section A"], metas=[{"page": 1}])
+
+    chromadb_mod.PersistentClient = fake_client_factory
+
+    import app.tools.nice_guideline_tool as ng
+    importlib.reload(ng)
+
+    calls = []
+    model = lm_mod.TextEmbeddingModel.from_pretrained("fake")
+    original = model.get_embeddings
+
+    def counting_get_embeddings(docs):
+        calls.append(docs)
+        return original(docs)
+
+    model.get_embeddings = counting_get_embeddings
+    monkeypatch.setattr(ng, "_embedding_provider", VertexEmbeddingProvider("fake", model=model))
+
+    ng.search_nice_ng12_guidelines("unexplained hemoptysis in smoker")
+    ng.search_nice_ng12_guidelines("Unexplained hemoptysis in smoker ")
+
+    assert len(calls) == 1
+    assert ng.get_embedding_cache().stats()["memory_hits"] == 1
+
+
+def test_numpy_engine_serves_searches_from_loaded_collection(monkeypatch):
+    chromadb_mod, lm_mod = make_fake_modules()
+
+    class LoadableCollection:
+        def get(self, include=None):
+            return {
+                "ids": ["chunk-0", "chunk-1"],
+                "embeddings": [[1.0], [-1.0]],
+                "documents": ["Section A", "Section B"],
+                "metadatas": [{"page": 1}, {"page": 2}],
+            }
+
+        def query(self, **kwargs):
+            raise AssertionError("numpy engine must not query Chroma")
+
+    class LoadableClient:
+        def __init__(self, path=None):
+            self.path = path
+
+        def get_collection(self, name):
+            return LoadableCollection()
+
+    chromadb_mod.PersistentClient = LoadableClient
+
+    import app.tools.nice_guideline_tool as ng
+    importlib.reload(ng)
+
+    ng.set_retriever(ng.GuidelineRetriever(vector_store_dir="unused", engine="numpy"))
+
+    res = ng.search_nice_ng12_guidelines("cough", top_n=1)
+
+    assert res == {"results": [{"document": "Section A", "metadata": {"page": 1}}]}
+
+
+def test_batch_search_embeds_and_queries_once_and_groups_results(monkeypatch):
+    chromadb_mod, lm_mod = make_fake_modules()
+
+    query_calls = []
+
+    class MultiQueryCollection:
+        def query(self, query_embeddings=None, n_results=3, include=None):
+            query_calls.append((query_embeddings, n_results))
+            docs, metas = [], []
+            for emb in query_embeddings:
+                # fake embeddings are [len(query)]; derive distinct chunks from that
+                base = int(emb[0])
+                docs.append([f"doc {base + i}" for i in range(n_results)])
+                metas.append([{"chunk_id": f"c{base + i}"} for i in range(n_results)])
+            return {"documents": docs, "metadatas": metas}
+
+    class MultiQueryClient:
+        def __init__(self, path=None):
+            pass
+
+        def get_collection(self, name):
+            return MultiQueryCollection()
+
+    chromadb_mod.PersistentClient = MultiQueryClient
+
+    import app.tools.nice_guideline_tool as ng
+    importlib.reload(ng)
+
+    embed_calls = []
+    model = lm_mod.TextEmbeddingModel.from_pretrained("fake")
+    original = model.get_embeddings
+    model.get_embeddings = lambda docs: embed_calls.append(docs) or original(docs)
+    monkeypatch.setattr(ng, "_embedding_provider", VertexEmbeddingProvider("fake", model=model))
+
+    # "abcd" -> chunks c4, c5, c6; "abcde" -> c5, c6, c7 (c5/c6 overlap)
+    res = ng.search_nice_ng12_guidelines_batch(["abcd", "abcde"], top_n=[1, 2])
+
+    assert embed_calls == [["abcd", "abcde"]]
+    assert len(query_calls) == 1
+    assert query_calls[0][1] == 2
+    assert [g["query"] for g in res["results"]] == ["abcd", "abcde"]
+    assert [r["metadata"]["chunk_id"] for r in res["results"][0]["results"]] == ["c4"]
+    assert [r["metadata"]["chunk_id"] for r in res["results"][1]["results"]] == ["c5", "c6"]
+
+    res = ng.search_nice_ng12_guidelines_batch(["abcd", "abcd"], top_n=[2, 2], deduplicate=True)
+    assert [r["metadata"]["chunk_id"] for r in res["results"][1]["results"]] == []
+
+    res = ng.search_nice_ng12_guidelines_batch(["abcd", "abcd"], deduplicate=False)
+    assert len(res["results"][1]["results"]) == 5
+
+
+def test_batch_search_with_no_queries_returns_empty_results():
+    make_fake_modules()
+    import app.tools.nice_guideline_tool as ng
+    importlib.reload(ng)
+
+    assert ng.search_nice_ng12_guidelines_batch([]) == {"results": []}
+
+
+def _write_bm25_index(path):
+    from app.bm25 import BM25Index
+
+    BM25Index(
+        ids=["c-lung", "c-oes", "c-prostate"],
+        documents=[
+            "Refer people aged 40 and over with unexplained haemoptysis.",
+            "Refer people with dysphagia or dyspepsia and weight loss.",
+            "Consider a PSA test for lower urinary tract symptoms.",
+        ],
+        metadatas=[{"chunk_id": "lung"}, {"chunk_id": "oes"}, {"chunk_id": "prostate"}],
+    ).save(path)
+
+
+def test_lexical_mode_answers_without_embedding_or_vector_store(monkeypatch, tmp_path):
+    chromadb_mod, lm_mod = make_fake_modules()
+
+    def no_client(path=None):
+        raise AssertionError("lexical search must not open the vector store")
+
+    chromadb_mod.PersistentClient = no_client
+
+    import app.tools.nice_guideline_tool as ng
+    importlib.reload(ng)
+
+    def no_embeddings(texts):
+        raise AssertionError("lexical search must not embed the query")
+
+    model = types.SimpleNamespace(get_embeddings=no_embeddings)
+    monkeypatch.setattr(ng, "_embedding_provider", VertexEmbeddingProvider("fake", model=model))
+    _write_bm25_index(tmp_path / "bm25.json")
+    monkeypatch.setattr(ng, "BM25_INDEX_PATH", str(tmp_path / "bm25.json"))
+
+    res = ng.search_nice_ng12_guidelines("Hemoptysis", mode="lexical")
+    assert [r["metadata"]["chunk_id"] for r in res["results"]] == ["lung"]
+
+    res = ng.search_nice_ng12_guidelines("PSA", top_n=1, mode="lexical")
+    assert [r["metadata"]["chunk_id"] for r in res["results"]] == ["prostate"]
+
+    assert ng.search_nice_ng12_guidelines("PSA", mode="fuzzy") == {"error": "error occured"}
+
+
+def test_lexical_mode_builds_index_from_collection_when_file_missing(monkeypatch, tmp_path):
+    chromadb_mod, lm_mod = make_fake_modules()
+
+    class DocumentCollection:
+        def get(self, include=None):
+            return {
+                "ids": ["c1", "c2"],
+                "documents": ["urgent chest x-ray", "dysphagia referral"],
+                "metadatas": [{"page": 9}, {"page": 11}],
+            }
+
+    chromadb_mod.PersistentClient = lambda path=None: types.SimpleNamespace(
+        get_collection=lambda name: DocumentCollection()
+    )
+
+    import app.tools.nice_guideline_tool as ng
+    importlib.reload(ng)
+    monkeypatch.setattr(ng, "BM25_INDEX_PATH", str(tmp_path / "missing.json"))
+
+    res = ng.search_nice_ng12_guidelines("dysphagia", mode="lexical")
+    assert res == {"results": [{"document": "dysphagia referral", "metadata": {"page": 11}}]}
+
+
+def test_hybrid_mode_fuses_vector_and_lexical_rankings(monkeypatch, tmp_path):
+    chromadb_mod, lm_mod = make_fake_modules()
+
+    class RankedCollection:
+        def query(self, query_embeddings=None, n_results=3, include=None):
+            # Vector ranking: prostate first, then lung, oesophageal not retrieved.
+            return {
+                "ids": [["c-prostate", "c-lung"]],
+                "documents": [["Consider a PSA test", "Refer ... haemoptysis"]],
+                "metadatas": [[{"chunk_id": "prostate"}, {"chunk_id": "lung"}]],
+            }
+
+    chromadb_mod.PersistentClient = lambda path=None: types.SimpleNamespace(
+        get_collection=lambda name: RankedCollection()
+    )
+
+    import app.tools.nice_guideline_tool as ng
+    importlib.reload(ng)
+    _write_bm25_index(tmp_path / "bm25.json")
+    monkeypatch.setattr(ng, "BM25_INDEX_PATH", str(tmp_path / "bm25.json"))
+
+    res = ng.search_nice_ng12_guidelines("haemoptysis dysphagia", top_n=3, mode="hybrid")
+
+    # "lung" is ranked by both lists and wins; lexical-only "oes" is still included.
+    assert [r["metadata"]["chunk_id"] for r in res["results"]] == ["lung", "prostate", "oes"]
+
+
+def test_hashing_provider_serves_offline_searches(monkeypatch):
+    chromadb_mod, lm_mod = make_fake_modules()
+
+    def offline_model(name):
+        raise AssertionError("the hashing provider must not load a Vertex model")
+
+    lm_mod.TextEmbeddingModel.from_pretrained = staticmethod(offline_model)
+
+    provider = HashingEmbeddingProvider(dimension=64)
+    documents = ["urgent chest x-ray for cough", "dysphagia referral", "PSA test"]
+
+    class HashedCollection:
+        def get(self, include=None):
+            return {
+                "ids": ["c0", "c1", "c2"],
+                "embeddings": provider.embed(documents),
+                "documents": documents,
+                "metadatas": [{"page": 9}, {"page": 11}, {"page": 20}],
+            }
+
+    chromadb_mod.PersistentClient = lambda path=None: types.SimpleNamespace(
+        get_collection=lambda name: HashedCollection()
+    )
+
+    import app.tools.nice_guideline_tool as ng
+    importlib.reload(ng)
+    monkeypatch.setattr(ng, "EMBEDDING_PROVIDER", "hashing")
+    monkeypatch.setattr(ng, "HASHING_EMBEDDING_DIM", 64)
+    ng.set_retriever(ng.GuidelineRetriever(vector_store_dir="unused", engine="numpy"))
+
+    res = ng.search_nice_ng12_guidelines("dysphagia referral", top_n=1)
+
+    assert res == {"results": [{"document": "dysphagia referral", "metadata": {"page": 11}}]}
+    assert ng.get_embedding_cache().model_name == "hashing-64"
+
+
+def test_search_merges_overlapping_chunks_and_counts_saved_tokens(monkeypatch):
+    chromadb_mod, lm_mod = make_fake_modules()
+
+    page = " ".join(f"1.1.{i} Refer people aged {40 + i} and over with unexplained haemoptysis. [2015]" for i in range(6))
+    docs = [page[:300], page[150:]]
+    metas = [{"page": 8, "source": "NG12 PDF", "chunk_id": "p8-0"}, {"page": 8, "source": "NG12 PDF", "chunk_id": "p8-1"}]
+
+    def fake_client_factory(path=None):
+        return chromadb_mod._BaseClient(path=path, docs=docs, metas=metas)
+
+    chromadb_mod.PersistentClient = fake_client_factory
+
+    import app.tools.nice_guideline_tool as ng
+    importlib.reload(ng)
+    from app.metrics import CONTEXT_TOKENS
+    from app.tokenizer import get_encoding
+    encoding = get_encoding().name
+
+    def saved_tokens():
+        return (CONTEXT_TOKENS.value(stage="retrieved", encoding=encoding)
+                - CONTEXT_TOKENS.value(stage="packed", encoding=encoding))
+
+    before = saved_tokens()
+
+    res = ng.search_nice_ng12_guidelines("haemoptysis")
+
+    assert len(res["results"]) == 1
+    assert res["results"][0]["document"] == page
+    assert res["results"][0]["metadata"]["chunk_ids"] == ["p8-0", "p8-1"]
+    assert saved_tokens() - before > 0
+
+
+def test_identical_concurrent_searches_run_once(monkeypatch):
+    make_fake_modules()
+    import app.tools.nice_guideline_tool as ng
+    importlib.reload(ng)
+    release = threading.Event()
+    calls = []
+
+    def slow_search(query, top_n, mode):
+        calls.append((query, top_n, mode))
+        release.wait(5)
+        return {"results": [{"document": "1.1.1 ...", "metadata": {"page": 8}}]}
+
+    monkeypatch.setattr(ng, "_search", slow_search)
+
+    with ThreadPoolExecutor(3) as pool:
+        first = pool.submit(ng.search_nice_ng12_guidelines, "Unexplained  haemoptysis")
+        while not ng.get_search_flights().stats()["in_flight"]:
+            time.sleep(0.001)
+        same = pool.submit(ng.search_nice_ng12_guidelines, "unexplained haemoptysis")
+        other = pool.submit(ng.search_nice_ng12_guidelines, "unexplained haemoptysis", top_n=3)
+        while ng.get_search_flights().stats()["shared"] < 1 or len(calls) < 2:
+            time.sleep(0.001)
+        release.set()
+
+    assert first.result() == same.result() == other.result()
+    assert len(calls) == 2
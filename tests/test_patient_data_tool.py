@@ -6,9 +6,17 @@ import pytest
 from app.tools import patient_data_tool as pdt
 
 
-def test_get_existing_patient_returns_record(monkeypatch):
+def _use_patients(monkeypatch, tmp_path, records):
+    file_path = tmp_path / "patients.json"
+    file_path.write_text(json.dumps(records), encoding="utf-8")
+    monkeypatch.setattr(pdt, "DATA_PATH", file_path)
+    monkeypatch.setattr(pdt, "_STORE", None)
+    return file_path
+
+
+def test_get_existing_patient_returns_record(monkeypatch, tmp_path):
     sample = [{"patient_id": "PT-101", "name": "Alice"}]
-    monkeypatch.setattr(pdt, "_PATIENTS", sample)
+    _use_patients(monkeypatch, tmp_path, sample)
 
     result = pdt.get_patient_data("PT-101")
 
@@ -16,9 +24,9 @@ def test_get_existing_patient_returns_record(monkeypatch):
     assert result["name"] == "Alice"
 
 
-def test_get_missing_patient_returns_not_found(monkeypatch):
+def test_get_missing_patient_returns_not_found(monkeypatch, tmp_path):
     sample = [{"patient_id": "PT-200", "name": "Bob"}]
-    monkeypatch.setattr(pdt, "_PATIENTS", sample)
+    _use_patients(monkeypatch, tmp_path, sample)
 
     result = pdt.get_patient_data("PT-999")
 
@@ -33,7 +41,7 @@ def test_load_patients_reads_file(tmp_path, monkeypatch):
 
     # Point the module to the temp file and clear cache
     monkeypatch.setattr(pdt, "DATA_PATH", file_path)
-    monkeypatch.setattr(pdt, "_PATIENTS", None)
+    monkeypatch.setattr(pdt, "_STORE", None)
 
     loaded = pdt.load_patients()
 
@@ -0,0 +1,113 @@
+import json
+import os
+import threading
+
+from app.patient_store import PatientStore
+
+
+def _write_ndjson(path, records):
+    path.write_text("".join(json.dumps(r) + "\n" for r in records), encoding="utf-8")
+
+
+def _bump_mtime(path, seconds=10):
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + seconds * 1_000_000_000))
+
+
+def test_json_array_is_indexed_by_patient_id(tmp_path):
+    path = tmp_path / "patients.json"
+    path.write_text(json.dumps([{"patient_id": f"PT-{i}", "age": i} for i in range(100)]), encoding="utf-8")
+
+    store = PatientStore(path)
+
+    assert store.get("PT-42") == {"patient_id": "PT-42", "age": 42}
+    assert store.get("PT-999") is None
+    assert len(store) == 100
+    assert store.stats()["format"] == "json"
+
+
+def test_ndjson_records_are_read_by_offset(tmp_path):
+    path = tmp_path / "patients.ndjson"
+    records = [{"patient_id": f"PT-{i}", "symptoms": ["cough"] * (i % 5), "note": "x" * 5000 * (i == 3)} for i in range(20)]
+    _write_ndjson(path, records)
+
+    store = PatientStore(path)
+
+    assert store.get("PT-3") == records[3]
+    assert store.get("PT-19") == records[19]
+    assert store.get("PT-20") is None
+    assert store.stats()["format"] == "ndjson"
+    assert list(store.iter_records()) == records
+
+
+def test_store_reloads_when_file_changes(tmp_path):
+    path = tmp_path / "patients.ndjson"
+    _write_ndjson(path, [{"patient_id": "PT-1", "age": 30}])
+    store = PatientStore(path, check_interval=0)
+    assert store.get("PT-1")["age"] == 30
+
+    replacement = tmp_path / "patients.tmp"
+    _write_ndjson(replacement, [{"patient_id": "PT-1", "age": 31}, {"patient_id": "PT-2", "age": 50}])
+    os.replace(replacement, path)
+    _bump_mtime(path)
+
+    # The change is noticed by a lookup, which still answers from the old index.
+    assert store.get("PT-1")["age"] == 30
+    store.wait_for_reload(5)
+    assert store.get("PT-1")["age"] == 31
+    assert store.get("PT-2")["age"] == 50
+    assert store.reloads == 2
+
+
+def test_store_keeps_serving_previous_index_if_reload_fails(tmp_path):
+    path = tmp_path / "patients.json"
+    path.write_text(json.dumps([{"patient_id": "PT-1"}]), encoding="utf-8")
+    store = PatientStore(path, check_interval=0)
+    assert store.get("PT-1") is not None
+
+    path.write_text("[{\"patient_id\": ", encoding="utf-8")
+    _bump_mtime(path)
+
+    assert store.get("PT-1") == {"patient_id": "PT-1"}
+    store.wait_for_reload(5)
+    assert store.get("PT-1") == {"patient_id": "PT-1"}
+
+
+def test_in_place_rewrite_is_detected_on_read(tmp_path):
+    path = tmp_path / "patients.ndjson"
+    _write_ndjson(path, [{"patient_id": "PT-1"}, {"patient_id": "PT-2"}])
+    store = PatientStore(path, check_interval=3600)
+    assert store.get("PT-2") == {"patient_id": "PT-2"}
+
+    # Same size, different order: offsets now point at the wrong records.
+    with open(path, "r+b") as f:
+        f.write(b'{"patient_id": "PT-2"}\n{"patient_id": "PT-1"}\n')
+
+    assert store.get("PT-2") == {"patient_id": "PT-2"}
+
+
+def test_readers_are_not_blocked_by_a_slow_rebuild(tmp_path, monkeypatch):
+    path = tmp_path / "patients.ndjson"
+    _write_ndjson(path, [{"patient_id": "PT-1", "age": 30}])
+    store = PatientStore(path, check_interval=0)
+    assert store.get("PT-1")["age"] == 30
+
+    release = threading.Event()
+    build = store._build
+
+    def slow_build(stat):
+        release.wait(5)
+        return build(stat)
+
+    monkeypatch.setattr(store, "_build", slow_build)
+    replacement = tmp_path / "patients.tmp"
+    _write_ndjson(replacement, [{"patient_id": "PT-1", "age": 31}])
+    os.replace(replacement, path)
+    _bump_mtime(path)
+
+    assert store.get("PT-1")["age"] == 30
+    assert store.get("PT-1")["age"] == 30
+    release.set()
+    store.wait_for_reload(5)
+    assert store.get("PT-1")["age"] == 31
+    assert store.reloads == 2
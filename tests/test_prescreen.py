@@ -0,0 +1,157 @@
+import json
+import re
+from pathlib import Path
+
+import pytest
+
+from app.prescreen import (
+    CONSIDER_REFERRAL,
+    NO_URGENT_ACTION,
+    RULES,
+    URGENT_INVESTIGATION,
+    URGENT_REFERRAL,
+    PatientFacts,
+    PreScreener,
+    symptom_terms,
+)
+
+PATIENTS = {
+    p["patient_id"]: p
+    for p in json.loads((Path(__file__).resolve().parent.parent / "app" / "tools" / "patients.json").read_text())
+}
+
+
+def test_symptom_terms_fold_spelling_variants():
+    assert symptom_terms(["Unexplained haemoptysis"]) == {"hemoptysis"}
+    assert symptom_terms(["iron-deficiency anaemia"]) == {"iron-deficiency anemia"}
+    assert "visible hematuria" not in symptom_terms(["non-visible haematuria"])
+
+
+def test_symptom_terms_skip_negated_mentions():
+    assert symptom_terms(["no haemoptysis"]) == frozenset()
+    assert symptom_terms(["denies chest pain, reports cough"]) == {"cough"}
+    assert symptom_terms(["cough but no fever"]) == {"cough"}
+    assert symptom_terms(["no night sweats", "fatigue"]) == {"fatigue"}
+
+
+def test_negated_red_flag_does_not_trigger_referral():
+    record = dict(PATIENTS["PT-101"], symptoms=["no haemoptysis", "persistent cough"])
+
+    decision = PreScreener().assess(record)
+
+    assert decision["recommendation"] == URGENT_INVESTIGATION
+    assert "1.1.1" not in decision["justification"]
+
+
+def test_facts_detect_smoking_history():
+    assert PatientFacts.from_record({"smoking_history": "Ex-Smoker"}).ever_smoked is True
+    assert PatientFacts.from_record({"smoking_history": "Never Smoked"}).ever_smoked is False
+    assert PatientFacts.from_record({}).ever_smoked is None
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("Current Smoker", True),
+        ("ex smoker", True),
+        ("Former-Smoker", True),
+        ("Never-smoker", False),
+        ("never-smoked", False),
+        ("Non-smoker", False),
+        ("Unknown", None),
+        ("not recorded", None),
+        ("", None),
+    ],
+)
+def test_facts_read_only_explicit_smoking_phrases(value, expected):
+    assert PatientFacts.from_record({"smoking_history": value}).ever_smoked is expected
+
+
+@pytest.mark.parametrize("smoking_history", ["Unknown", "Never-smoker"])
+def test_single_lung_symptom_without_known_smoking_goes_to_agent(smoking_history):
+    record = dict(PATIENTS["PT-101"], age=50, symptoms=["fatigue"], smoking_history=smoking_history)
+
+    assert PreScreener().assess(record) is None
+
+
+def test_explained_symptoms_do_not_match_unexplained_criteria():
+    assert "cough" not in symptom_terms(["explained cough due to asthma"])
+    assert "fatigue" not in symptom_terms(["fatigue secondary to anaemia"])
+    assert symptom_terms(["unexplained cough", "fatigue due to anaemia, weight loss"]) >= {
+        "cough", "weight loss"
+    }
+
+    record = dict(PATIENTS["PT-101"], symptoms=["explained cough due to asthma"])
+    assert PreScreener().assess(record) is None
+
+    record = dict(PATIENTS["PT-102"], symptoms=["cough due to asthma", "sore throat"])
+    assert PreScreener().assess(record) is None
+
+
+@pytest.mark.parametrize(
+    "patient_id, expected, chunk_id",
+    [
+        ("PT-101", URGENT_REFERRAL, "ng12_0009_08"),
+        ("PT-102", NO_URGENT_ACTION, "ng12_0009_08"),
+        ("PT-103", URGENT_INVESTIGATION, "ng12_0009_08"),
+        ("PT-104", URGENT_REFERRAL, "ng12_0011_10"),
+        ("PT-107", CONSIDER_REFERRAL, "ng12_0024_23"),
+        ("PT-108", URGENT_REFERRAL, "ng12_0016_15"),
+        ("PT-110", URGENT_REFERRAL, "ng12_0021_20"),
+    ],
+)
+def test_clear_cut_patients_are_decided_by_rules(patient_id, expected, chunk_id):
+    decision = PreScreener().assess(PATIENTS[patient_id])
+
+    assert decision["patient_id"] == patient_id
+    assert decision["recommendation"] == expected
+    assert chunk_id in [ref["chunk_id"] for ref in decision["references"]]
+    assert decision["justification"]
+
+
+@pytest.mark.parametrize("patient_id", ["PT-106", "PT-109"])
+def test_ambiguous_patients_go_to_agent(patient_id):
+    assert PreScreener().assess(PATIENTS[patient_id]) is None
+
+
+def test_referral_outranks_investigation():
+    record = dict(PATIENTS["PT-101"], symptoms=["unexplained hemoptysis", "cough", "fatigue"])
+
+    decision = PreScreener().assess(record)
+
+    assert decision["recommendation"] == URGENT_REFERRAL
+    assert "1.1.2" not in decision["justification"]
+
+
+def test_missing_patient_and_errors():
+    screener = PreScreener()
+
+    not_found = screener.assess({"patient_id": "PT-999", "found": False})
+    assert not_found["recommendation"] == NO_URGENT_ACTION
+    assert not_found["references"] == []
+    assert screener.assess({"error": "error occured"}) is None
+
+
+def test_stats_count_paths_taken():
+    screener = PreScreener()
+    screener.assess(PATIENTS["PT-101"])
+    screener.assess(PATIENTS["PT-106"])
+
+    stats = screener.stats()
+    assert stats["rules"] == 1
+    assert stats["agent"] == 1
+    assert stats["rules_share"] == 0.5
+    assert stats["rule_hits"] == {"lung_haemoptysis_40": 1}
+
+
+def test_rule_references_cite_the_stored_recommendation_chunks():
+    # The BM25 index is written by ingestion from the same chunks as the vector store.
+    store = json.loads((Path(__file__).resolve().parent.parent / "vector_store" / "bm25_ng12.json").read_text())
+    chunks = {meta["chunk_id"]: (meta["page"], doc) for meta, doc in zip(store["metadatas"], store["documents"])}
+
+    for rule in RULES:
+        section = re.search(r"\b1\.\d+\.\d+\b", rule.justification).group()
+        for ref in rule.references:
+            assert ref["chunk_id"] in chunks, rule.name
+            assert chunks[ref["chunk_id"]][0] == ref["page"], rule.name
+        assert any(section in chunks[ref["chunk_id"]][1] for ref in rule.references), rule.name
@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+from google.adk.events import Event
+from google.genai import types
+
+from app.session_store import (
+    BoundedInMemorySessionService,
+    BoundedSqliteSessionService,
+    create_session_service,
+)
+
+APP = "ng12_test_app"
+
+
+def message(text: str) -> Event:
+    return Event(
+        author="user",
+        invocation_id="inv",
+        content=types.Content(role="user", parts=[types.Part.from_text(text=text)]),
+    )
+
+
+async def open_session(service, session_id: str, text: str = "hello"):
+    session = await service.create_session(app_name=APP, user_id=session_id, session_id=session_id)
+    await service.append_event(session, message(text))
+    return session
+
+
+async def alive(service, *session_ids) -> list[str]:
+    found = []
+    for sid in session_ids:
+        if await service.get_session(app_name=APP, user_id=sid, session_id=sid) is not None:
+            found.append(sid)
+    return found
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_service(request, tmp_path):
+    def make(**limits):
+        if request.param == "memory":
+            return BoundedInMemorySessionService(**limits)
+        return BoundedSqliteSessionService(tmp_path / "sessions.sqlite3", enforce_interval=0, **limits)
+
+    return make
+
+
+def test_least_recently_written_session_is_evicted_over_count_cap(make_service):
+    service = make_service(max_sessions=2, max_bytes=0, idle_ttl=0)
+
+    async def run():
+        a = await open_session(service, "a")
+        await asyncio.sleep(0.01)
+        await open_session(service, "b")
+        await asyncio.sleep(0.01)
+        await service.append_event(a, message("a again"))  # "b" is now the oldest
+        await asyncio.sleep(0.01)
+        await open_session(service, "c")
+        return await alive(service, "a", "b", "c")
+
+    assert asyncio.run(run()) == ["a", "c"]
+    assert service.stats()["evictions"]["max_sessions"] == 1
+    assert service.stats()["sessions"] == 2
+
+
+def test_byte_cap_evicts_oldest_but_never_the_session_being_written(make_service):
+    service = make_service(max_sessions=0, max_bytes=1500, idle_ttl=0)
+
+    async def run():
+        await open_session(service, "a", "x" * 600)
+        await asyncio.sleep(0.01)
+        await open_session(service, "b", "y" * 600)
+        await asyncio.sleep(0.01)
+        await open_session(service, "c", "z" * 3000)  # over the cap on its own
+        return await alive(service, "a", "b", "c")
+
+    assert asyncio.run(run()) == ["c"]
+    assert service.stats()["evictions"]["max_bytes"] == 2
+
+
+def test_idle_sessions_expire(make_service):
+    service = make_service(max_sessions=0, max_bytes=0, idle_ttl=0.05)
+
+    async def run():
+        await open_session(service, "old")
+        await asyncio.sleep(0.1)
+        return await alive(service, "old")
+
+    assert asyncio.run(run()) == []
+    assert service.stats()["evictions"]["idle"] == 1
+
+
+def test_list_events_pages_after_a_cursor_with_timestamp_ties(make_service):
+    service = make_service(max_sessions=0, max_bytes=0, idle_ttl=0)
+
+    async def run():
+        session = await service.create_session(app_name=APP, user_id="p", session_id="p")
+        for i, ts in enumerate([1.0, 2.0, 2.0, 2.0, 3.0]):
+            event = message(f"m{i}")
+            event.id, event.timestamp = f"e{i}", ts
+            await service.append_event(session, event)
+        first = await service.list_events(app_name=APP, user_id="p", session_id="p", limit=2)
+        after = (first[-1].timestamp, first[-1].id)
+        rest = await service.list_events(app_name=APP, user_id="p", session_id="p", after=after, limit=10)
+        missing = await service.list_events(app_name=APP, user_id="nobody", session_id="nobody")
+        return [e.id for e in first], [e.id for e in rest], missing
+
+    first, rest, missing = asyncio.run(run())
+
+    assert first == ["e0", "e1"]
+    assert rest == ["e2", "e3", "e4"]
+    assert missing is None
+
+
+def test_sqlite_sessions_survive_a_new_service_instance(tmp_path):
+    path = tmp_path / "sessions.sqlite3"
+
+    async def run():
+        await open_session(BoundedSqliteSessionService(path), "s1", "persist me")
+        session = await BoundedSqliteSessionService(path).get_session(app_name=APP, user_id="s1", session_id="s1")
+        return session.events[0].content.parts[0].text
+
+    assert asyncio.run(run()) == "persist me"
+
+
+def test_create_session_service_validates_kind():
+    assert isinstance(create_session_service("memory", max_sessions=1), BoundedInMemorySessionService)
+    with pytest.raises(ValueError):
+        create_session_service("redis")
+    with pytest.raises(ValueError):
+        create_session_service("sqlite", path="")
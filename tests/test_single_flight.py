@@ -0,0 +1,134 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.single_flight import AsyncStreamFlight, SingleFlight
+
+
+def run_concurrently(flight, key, fn, release, callers=4):
+    """Start `callers` identical calls while the first one is held by `release`, then let it finish."""
+    with ThreadPoolExecutor(callers) as pool:
+        futures = [pool.submit(flight.do, key, fn)]
+        while not flight.stats()["in_flight"]:
+            pass
+        futures += [pool.submit(flight.do, key, fn) for _ in range(callers - 1)]
+        while flight.stats()["shared"] < callers - 1:
+            pass
+        release.set()
+    return futures
+
+
+def test_concurrent_calls_share_one_execution_and_get_their_own_copy():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def search():
+        calls.append(1)
+        release.wait(5)
+        return {"results": [{"document": "1.1.1 ..."}]}
+
+    futures = run_concurrently(flight, ("haemoptysis", 5), search, release)
+    results = [f.result() for f in futures]
+
+    assert len(calls) == 1
+    assert all(r == results[0] for r in results)
+    assert len({id(r) for r in results}) == len(results)
+    assert flight.stats() == {"executions": 1, "shared": 3, "in_flight": 0}
+
+
+def test_failure_reaches_every_waiter_without_poisoning_the_key():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def failing():
+        release.wait(5)
+        raise RuntimeError("embedding service unavailable")
+
+    futures = run_concurrently(flight, "k", failing, release)
+    for future in futures:
+        with pytest.raises(RuntimeError, match="unavailable"):
+            future.result()
+
+    assert flight.do("k", lambda: "ok") == "ok"
+    assert flight.stats()["executions"] == 2
+
+
+def test_stream_parts_fan_out_to_every_caller():
+    flight = AsyncStreamFlight()
+    runs = []
+
+    async def produce():
+        runs.append(1)
+        for part in ("a", "b", "c"):
+            await asyncio.sleep(0.01)
+            yield part
+
+    async def consume():
+        return "".join([part async for part in flight.stream("p1", produce)])
+
+    async def main():
+        first = asyncio.create_task(consume())
+        await asyncio.sleep(0.015)  # join mid-stream: the parts so far are replayed
+        return await asyncio.gather(first, consume())
+
+    assert asyncio.run(main()) == ["abc", "abc"]
+    assert runs == [1]
+    assert flight.stats() == {"executions": 1, "shared": 1, "in_flight": 0}
+
+
+def test_stream_error_reaches_every_caller_and_next_call_runs_again():
+    flight = AsyncStreamFlight()
+    runs = []
+
+    async def produce():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        yield "partial"
+        if len(runs) == 1:
+            raise RuntimeError("model unavailable")
+
+    async def consume():
+        parts = []
+        try:
+            async for part in flight.stream("p1", produce):
+                parts.append(part)
+        except RuntimeError as e:
+            parts.append(str(e))
+        return parts
+
+    async def main():
+        shared = await asyncio.gather(consume(), consume())
+        return shared, await consume()
+
+    shared, retry = asyncio.run(main())
+
+    assert shared == [["partial", "model unavailable"]] * 2
+    assert retry == ["partial"]
+    assert runs == [1, 1]
+
+
+def test_stream_is_cancelled_when_the_last_caller_leaves():
+    flight = AsyncStreamFlight()
+
+    async def main():
+        stopped = asyncio.Event()
+
+        async def produce():
+            try:
+                yield "first"
+                await asyncio.sleep(10)
+                yield "never"
+            except asyncio.CancelledError:
+                stopped.set()
+                raise
+
+        stream = flight.stream("p1", produce)
+        assert await stream.__anext__() == "first"
+        await stream.aclose()
+        await asyncio.wait_for(stopped.wait(), 1)
+        return flight.stats()["in_flight"]
+
+    assert asyncio.run(main()) == 0
@@ -0,0 +1,67 @@
+import threading
+
+from app.startup import StartupReport
+
+
+def test_warm_up_runs_every_step_and_reports_failures():
+    report = StartupReport()
+    calls = []
+
+    def broken():
+        raise RuntimeError("no credentials")
+
+    ok = report.warm_up({"first": lambda: calls.append("first"), "broken": broken, "last": lambda: calls.append("last")})
+
+    assert not ok
+    assert calls == ["first", "last"]
+    data = report.to_dict()
+    assert data["warmup"] == "failed"
+    assert not data["ready"]
+    assert data["steps"]["broken"]["error"] == "RuntimeError: no credentials"
+    assert data["steps"]["first"]["status"] == "ok"
+    assert "warmup" in data["phases"]
+
+
+def test_ready_once_warm_up_is_done_or_disabled():
+    report = StartupReport()
+    assert not report.ready
+
+    report.warm_up({"noop": lambda: None})
+    assert report.ready
+
+    disabled = StartupReport()
+    disabled.disable_warm_up()
+    assert disabled.ready
+
+
+def test_failed_steps_are_retried_until_the_replica_is_ready():
+    report = StartupReport()
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("Vertex AI unavailable")
+
+    ok = report.warm_up({"vertexai": flaky, "bm25_index": lambda: None}, retry_interval=0.001)
+
+    assert ok
+    assert report.ready
+    assert report.steps["vertexai"] == {"status": "ok", "seconds": report.steps["vertexai"]["seconds"], "attempts": 3}
+    assert report.steps["bm25_index"]["attempts"] == 1
+
+
+def test_stopping_ends_retries():
+    report = StartupReport()
+
+    def broken():
+        raise RuntimeError("no credentials")
+
+    worker = threading.Thread(target=report.warm_up, args=({"broken": broken}, 60.0))
+    worker.start()
+    report.stop_warm_up()
+    worker.join(5)
+
+    assert not worker.is_alive()
+    assert report.to_dict()["warmup"] == "failed"
+    assert not report.ready
@@ -0,0 +1,100 @@
+import pytest
+
+import app.tools.symptom_evidence_tool as tool
+from app.embeddings import HashingEmbeddingProvider
+from app.symptom_index import SymptomEvidenceIndex, symptom_vocabulary
+from app.vector_index import NumpyVectorIndex
+
+DOCUMENTS = [
+    "1.1.1 Refer people aged 40 and over with unexplained hemoptysis.",
+    "1.2.1 Refer people with dysphagia for urgent direct access upper gastrointestinal endoscopy.",
+    "1.6.4 Refer people aged 45 and over with unexplained visible hematuria.",
+]
+
+
+class CountingProvider(HashingEmbeddingProvider):
+    def __init__(self):
+        super().__init__(dimension=256)
+        self.calls = []
+
+    def embed(self, texts):
+        self.calls.append(list(texts))
+        return super().embed(texts)
+
+
+@pytest.fixture
+def provider():
+    return CountingProvider()
+
+
+@pytest.fixture
+def collection(provider):
+    return NumpyVectorIndex(
+        ["c0", "c1", "c2"],
+        HashingEmbeddingProvider(dimension=256).embed(DOCUMENTS),
+        DOCUMENTS,
+        [{"page": 9, "chunk_id": "c0"}, {"page": 11, "chunk_id": "c1"}, {"page": 20, "chunk_id": "c2"}],
+    )
+
+
+def test_vocabulary_normalizes_patient_symptoms():
+    patients = [{"symptoms": ["Persistent cough", "unexplained haemoptysis"]}, {"symptoms": ["night sweats"]}]
+
+    vocabulary = symptom_vocabulary(patients)
+
+    assert {"cough", "hemoptysis", "night sweats", "dysphagia"} <= set(vocabulary)
+    assert "persistent cough" not in vocabulary
+    assert vocabulary == sorted(vocabulary)
+
+
+def test_build_embeds_vocabulary_in_one_request_and_round_trips(provider, collection, tmp_path):
+    index = SymptomEvidenceIndex.build(["dysphagia", "hemoptysis", "visible hematuria"], provider, collection,
+                                       n_results=2)
+    index.save(tmp_path / "symptoms.json")
+    loaded = SymptomEvidenceIndex.load(tmp_path / "symptoms.json")
+
+    assert provider.calls == [["dysphagia", "hemoptysis", "visible hematuria"]]
+    assert loaded.model_id == provider.model_id
+    assert loaded.lookup("dysphagia", 1)[0]["metadata"]["chunk_id"] == "c1"
+    assert loaded.lookup("hemoptysis", 1)[0]["document"] == DOCUMENTS[0]
+    assert len(loaded.lookup("hemoptysis", 5)) == 2
+    assert loaded.lookup("night sweats", 5) is None
+
+
+def test_tool_answers_known_symptoms_from_index_and_searches_only_unseen(provider, collection, tmp_path,
+                                                                         monkeypatch):
+    path = tmp_path / "symptoms.json"
+    SymptomEvidenceIndex.build(["dysphagia", "hemoptysis"], provider, collection).save(path)
+    monkeypatch.setattr(tool, "SYMPTOM_INDEX_PATH", str(path))
+    monkeypatch.setattr(tool, "get_embedding_provider", lambda: provider)
+    searched = []
+
+    def live_search(queries, top_n=None, deduplicate=True):
+        searched.append(list(queries))
+        return {"results": [{"query": q, "results": [{"document": "live", "metadata": {"page": 1}}]}
+                            for q in queries]}
+
+    monkeypatch.setattr(tool, "search_nice_ng12_guidelines_batch", live_search)
+
+    res = tool.get_symptom_evidence(["Difficulty swallowing", "unexplained haemoptysis", "night sweats"], top_n=1)
+
+    by_symptom = {group["symptom"]: group for group in res["results"]}
+    assert searched == [["night sweats"]]
+    assert by_symptom["dysphagia"]["source"] == "index"
+    assert by_symptom["dysphagia"]["results"][0]["metadata"]["chunk_id"] == "c1"
+    assert by_symptom["hemoptysis"]["results"][0]["metadata"]["chunk_id"] == "c0"
+    assert by_symptom["night sweats"] == {
+        "symptom": "night sweats", "source": "live", "results": [{"document": "live", "metadata": {"page": 1}}]
+    }
+
+
+def test_index_from_another_embedding_model_is_ignored(provider, collection, tmp_path, monkeypatch):
+    path = tmp_path / "symptoms.json"
+    SymptomEvidenceIndex.build(["dysphagia"], provider, collection).save(path)
+    monkeypatch.setattr(tool, "SYMPTOM_INDEX_PATH", str(path))
+    monkeypatch.setattr(tool, "get_embedding_provider", lambda: HashingEmbeddingProvider(dimension=64))
+    monkeypatch.setattr(tool, "search_nice_ng12_guidelines_batch",
+                        lambda queries, top_n=None, deduplicate=True: {"error": "error occured"})
+
+    assert tool.get_symptom_index() is None
+    assert tool.get_symptom_evidence(["dysphagia"]) == {"error": "error occured"}
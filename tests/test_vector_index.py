@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from app.vector_index import NumpyVectorIndex
+
+
+def _unit_vectors(n, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, dim))
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _index(n=50, dim=16):
+    vectors = _unit_vectors(n, dim)
+    ids = [f"chunk-{i}" for i in range(n)]
+    docs = [f"doc {i}" for i in range(n)]
+    metas = [{"page": i + 1, "chunk_id": f"ng12_{i + 1:04d}_00"} for i in range(n)]
+    return NumpyVectorIndex(ids, vectors, docs, metas), vectors
+
+
+def test_matrix_is_contiguous_normalized_float32():
+    index = NumpyVectorIndex(["a", "b"], [[3.0, 4.0], [0.0, 2.0]], ["x", "y"], [{}, {}])
+
+    assert index.matrix.dtype == np.float32
+    assert index.matrix.flags["C_CONTIGUOUS"]
+    np.testing.assert_allclose(np.linalg.norm(index.matrix, axis=1), [1.0, 1.0], rtol=1e-6)
+
+
+def test_query_returns_nearest_first_in_chroma_layout():
+    index, vectors = _index()
+
+    res = index.query([vectors[7]], n_results=3)
+
+    assert res["ids"][0][0] == "chunk-7"
+    assert res["documents"][0][0] == "doc 7"
+    assert res["metadatas"][0][0]["page"] == 8
+    assert len(res["documents"][0]) == 3
+
+
+def test_query_caps_results_at_collection_size():
+    index, vectors = _index(n=4)
+
+    res = index.query([vectors[0], vectors[1]], n_results=10, include=["documents", "distances"])
+
+    assert [len(r) for r in res["documents"]] == [4, 4]
+    assert res["distances"][0] == sorted(res["distances"][0])
+
+
+def test_parity_with_chroma(tmp_path):
+    chromadb = pytest.importorskip("chromadb")
+    index_vectors = _unit_vectors(300, 32, seed=1)
+    ids = [f"chunk-{i}" for i in range(len(index_vectors))]
+    docs = [f"doc {i}" for i in range(len(index_vectors))]
+    metas = [{"page": i // 3 + 1, "source": "NG12 PDF"} for i in range(len(index_vectors))]
+
+    client = chromadb.PersistentClient(path=str(tmp_path))
+    collection = client.get_or_create_collection("ng12")
+    collection.add(ids=ids, embeddings=index_vectors.tolist(), documents=docs, metadatas=metas)
+
+    index = NumpyVectorIndex.from_collection(collection)
+    queries = _unit_vectors(20, 32, seed=2).tolist()
+
+    expected = collection.query(query_embeddings=queries, n_results=5, include=["documents", "metadatas"])
+    actual = index.query(queries, n_results=5)
+
+    assert actual["documents"] == expected["documents"]
+    assert actual["metadatas"] == expected["metadatas"]
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from app.tools.nice_guideline_tool import GuidelineRetriever
+from app.vector_index import NumpyVectorIndex
+from app.vector_snapshot import SnapshotVectorIndex, quantization_recall, quantize, write_snapshot
+
+
+def make_collection(n=200, dim=64, seed=0):
+    rng = np.random.default_rng(seed)
+    embeddings = rng.normal(size=(n, dim)).astype(np.float32)
+    ids = [f"c{i}" for i in range(n)]
+    documents = [f"chunk {i} – haemoptysis ≥ 40" if i % 7 else "" for i in range(n)]
+    metadatas = [{"page": i // 4, "chunk_id": f"c{i}"} for i in range(n)]
+    return ids, embeddings, documents, metadatas
+
+
+def test_float32_snapshot_matches_in_memory_search(tmp_path):
+    ids, embeddings, documents, metadatas = make_collection()
+    write_snapshot(tmp_path, ids, embeddings, documents, metadatas, model_id="m")
+    snapshot = SnapshotVectorIndex(tmp_path)
+    exact = NumpyVectorIndex(ids, embeddings, documents, metadatas)
+    queries = embeddings[:10] + 0.1
+
+    got = snapshot.query(queries, 5, include=("documents", "metadatas", "distances"))
+    want = exact.query(queries, 5, include=("documents", "metadatas", "distances"))
+
+    assert isinstance(snapshot.matrix, np.memmap)
+    assert got["ids"] == want["ids"]
+    assert got["documents"] == want["documents"]
+    assert got["metadatas"] == want["metadatas"]
+    np.testing.assert_allclose(got["distances"], want["distances"], atol=1e-5)
+    assert snapshot.get(include=["documents"])["documents"] == documents
+
+
+@pytest.mark.parametrize("dtype, bytes_per_value, min_recall", [("float16", 2, 0.98), ("int8", 1, 0.9)])
+def test_quantized_snapshot_is_smaller_and_reports_recall(tmp_path, dtype, bytes_per_value, min_recall):
+    ids, embeddings, documents, metadatas = make_collection()
+
+    meta = write_snapshot(tmp_path, ids, embeddings, documents, metadatas, dtype=dtype)
+    snapshot = SnapshotVectorIndex(tmp_path)
+
+    assert snapshot.dtype == dtype
+    assert meta["bytes"] == len(ids) * 64 * bytes_per_value
+    assert meta["recall"]["float32@5"] == 1.0
+    assert meta["recall"][f"{dtype}@5"] >= min_recall
+    assert snapshot.query(embeddings[:1], 1)["ids"] == [["c0"]]
+
+
+def test_int8_quantization_keeps_per_row_scale():
+    matrix = np.array([[0.6, -0.8], [0.0, 0.0]], dtype=np.float32)
+
+    codes, scales = quantize(matrix, "int8")
+
+    assert codes.dtype == np.int8
+    assert codes[0].tolist() == [95, -127]
+    np.testing.assert_allclose(codes[0] * scales[0], matrix[0], atol=0.01)
+    assert quantization_recall(matrix, "int8", k=1) == 1.0
+
+
+def test_rewrite_replaces_generation_and_retriever_reloads(tmp_path):
+    ids, embeddings, documents, metadatas = make_collection(n=20)
+    first = write_snapshot(tmp_path, ids, embeddings, documents, metadatas)
+    retriever = GuidelineRetriever(vector_store_dir=tmp_path / "no-chroma", engine="snapshot", snapshot_dir=tmp_path)
+    before = retriever.query(embeddings[:1], n_results=1)
+    old_version = retriever.store_version()
+
+    second = write_snapshot(tmp_path, ids[:5], embeddings[:5], documents[:5], metadatas[:5], dtype="int8")
+    after = retriever.query(embeddings[:1], n_results=30)
+
+    assert before["ids"] == [["c0"]]
+    assert retriever.store_version() != old_version
+    assert len(after["ids"][0]) == 5
+    assert not list(tmp_path.glob(f"*-{first['generation']}.*"))
+    assert sorted(p.name for p in tmp_path.glob(f"*-{second['generation']}.*")) == [
+        f"documents-{second['generation']}.bin", f"offsets-{second['generation']}.npy",
+        f"scales-{second['generation']}.npy", f"vectors-{second['generation']}.npy",
+    ]